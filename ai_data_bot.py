@@ -1,4 +1,6 @@
 import os
+import asyncio
+import functools
 import logging
 from telegram import (
     Update, InlineKeyboardButton, InlineKeyboardMarkup
@@ -7,24 +9,128 @@ from telegram.ext import (
     ApplicationBuilder, CommandHandler, MessageHandler, filters,
     ContextTypes, CallbackQueryHandler
 )
-import pandas as pd
-from io import BytesIO
+from telegram.error import BadRequest
 from dotenv import load_dotenv
-from difflib import get_close_matches
-import openai
+import time
 import traceback
+from app.analytics import (
+    BUILTIN_ROLES, unique_values_text, value_counts_text,
+)
+from app.cache import DataFrameCache, file_key, sheet_key
+from app.code_analysis import CodeAnalyzer, CodeRejected
+from app.code_cache import CodeCache
+from app.columns import ColumnIndex
+from app.fastpath import answer_from_frame, answer_from_summary, parse_question
+from app.ingest import download_to_spool, ingest_csv, is_csv_document, stream_digest
+from app.config import (
+    DF_CACHE_MAX_BYTES, EXPERT_CODE_TIMEOUT, JOB_TIMEOUT, WORKER_COUNT,
+    CODE_CACHE_PATH, CODE_CACHE_TTL, CODE_CACHE_MAX_ENTRIES,
+    UPLOAD_STORE_DIR, UPLOAD_RETENTION, UPLOAD_DISK_QUOTA_BYTES,
+    CSV_STREAM_THRESHOLD_BYTES, CSV_CHUNK_ROWS, SPOOL_MAX_MEMORY_BYTES,
+    SESSION_MAX_BYTES, SESSION_USER_MAX_BYTES, SESSION_IDLE_TTL, SESSION_SPILL_DIR,
+    LLM_MODEL, OPENAI_BASE_URL, LLM_MAX_CONCURRENCY, LLM_PER_USER, LLM_MAX_RETRIES, LLM_SCHEMA_TOKEN_BUDGET,
+    LLM_STUB, LLM_STUB_PORT, LLM_STUB_DELAY, LLM_STUB_CHUNK_DELAY, LLM_PROGRESS_INTERVAL,
+    METRICS_PORT, METRICS_HOST, CONCURRENT_UPDATES, USER_QUEUE_DEPTH,
+    WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_WORKERS, WEBHOOK_MAX_CONNECTIONS,
+    OUTPUT_TABLE_FORMAT, OUTPUT_TEXT_FORMAT, PAGINATION_MAX_RESULTS, PAGINATION_MAX_BYTES, PAGINATION_TTL,
+    SEND_GLOBAL_RATE, SEND_CHAT_RATE, SEND_GROUP_PER_MINUTE, SEND_BURST, SEND_MAX_RETRIES,
+    SANDBOX_WORKERS, SANDBOX_DATA_DIR, SANDBOX_CPU_SECONDS, SANDBOX_MEMORY_BYTES, SANDBOX_RESULT_MAX_BYTES,
+    CODE_COST_BUDGET,
+)
+from app.llm import LLMClient
+from app.jobs import BUSY, COALESCED, SUPERSEDED, UserJobQueue
+from app.formats import SNIFF_BYTES, XLSX as XLSX_UPLOAD, ParseTimings, detect_format
+from app.metrics import Registry, current_handler, start_http_server
+from app.webhook import run_webhook
+from app.loader import list_sheets, load_upload, read_sheet, read_sheet_header
+from app.output import (
+    CSV, PAGES, PDF, TEXT, XLSX, AttachmentTooLarge,
+    as_table, choose_format, result_text, table_to_csv, table_to_xlsx, text_to_file, Paginator,
+)
+from app.profile import profile_dataframe
+from app.sandbox import ResourceLimitExceeded, Sandbox, SandboxError, UnsafeCode
+from app.schema_prompt import SchemaPromptBuilder
+from app.sender import MessageSender, ProgressMessage
+from app.sessions import SessionStore, UploadTooLarge
+from app.storage import UploadStore
+from app.summary import build_summary
+from app.utils import PDFTooLarge, make_pdf, split_message
+from app.workers import JobTimeout, WorkerPool
 
 # === Load secrets ===
 load_dotenv()
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 OPENAI_KEY = os.getenv('OPENAI_API_KEY')
-openai.api_key = OPENAI_KEY
 
 # === Logging ===
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 logger = logging.getLogger("AI_DATA_BOT")
+# One INFO line per Bot API call drowned everything else; latency now goes to metrics
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+df_cache = DataFrameCache(DF_CACHE_MAX_BYTES)
+# Expert code runs in pre-started processes with CPU, wall-time and memory caps
+sandbox = Sandbox(
+    SANDBOX_WORKERS, SANDBOX_DATA_DIR, cpu_limit=SANDBOX_CPU_SECONDS, wall_limit=EXPERT_CODE_TIMEOUT,
+    memory_limit=SANDBOX_MEMORY_BYTES, result_max_bytes=SANDBOX_RESULT_MAX_BYTES,
+)
+
+def drop_upload(key):
+    """
+    Free what an upload holds in memory: the parsed frame and the sandbox's copy.
+    """
+    df_cache.discard(key)
+    sandbox.discard(key)
+
+def drop_session(session):
+    """
+    Free every parsed worksheet of a session (a plain upload has just one).
+    """
+    for key in [session['key'], *session.get('sheet_state', ())]:
+        drop_upload(key)
 
-user_files = {}
+# Per-user upload sessions: bounded, idle-expiring, optionally spilling raw bytes to disk
+user_files = SessionStore(
+    SESSION_MAX_BYTES, SESSION_USER_MAX_BYTES, SESSION_IDLE_TTL, SESSION_SPILL_DIR,
+    on_evict=lambda user_id, session: drop_session(session),
+)
+worker_pool = WorkerPool(WORKER_COUNT, timeout=JOB_TIMEOUT)
+code_cache = CodeCache(CODE_CACHE_PATH, CODE_CACHE_TTL, CODE_CACHE_MAX_ENTRIES)
+code_analyzer = CodeAnalyzer(CODE_COST_BUDGET)
+upload_store = UploadStore(UPLOAD_STORE_DIR, UPLOAD_RETENTION, UPLOAD_DISK_QUOTA_BYTES)
+if LLM_STUB:
+    from app.llm_stub import start_in_thread
+    start_in_thread(LLM_STUB_PORT, LLM_STUB_DELAY, LLM_STUB_CHUNK_DELAY)
+    OPENAI_BASE_URL = f"http://127.0.0.1:{LLM_STUB_PORT}/v1"
+llm = LLMClient(
+    OPENAI_KEY, model=LLM_MODEL, base_url=OPENAI_BASE_URL,
+    max_concurrency=LLM_MAX_CONCURRENCY, per_user=LLM_PER_USER, max_retries=LLM_MAX_RETRIES,
+)
+# All chunked replies go through one paced queue per chat
+sender = MessageSender(
+    rate=SEND_GLOBAL_RATE, chat_rate=SEND_CHAT_RATE, group_rate=SEND_GROUP_PER_MINUTE / 60,
+    burst=SEND_BURST, max_retries=SEND_MAX_RETRIES,
+)
+# Expert prompts list the columns relevant to the question, with type hints, within a token budget
+schema_prompts = SchemaPromptBuilder(LLM_SCHEMA_TOKEN_BUDGET)
+paginator = Paginator(PAGINATION_MAX_RESULTS, PAGINATION_MAX_BYTES, PAGINATION_TTL)
+parse_timings = ParseTimings()
+# One user's clicks, questions and uploads run one at a time; repeated clicks are merged
+user_jobs = UserJobQueue(USER_QUEUE_DEPTH)
+# Per-stage latency tagged by the handler serving the update, plus every component's stats()
+metrics = Registry()
+STAGE_SECONDS = metrics.histogram('bot_stage_seconds', "Time spent in one stage of an update", ('stage', 'handler'))
+HANDLER_SECONDS = metrics.histogram('bot_handler_seconds', "Total time to handle an update", ('handler',))
+ERRORS = metrics.counter('bot_errors_total', "Errors reported to the user or logged", ('stage', 'handler'))
+for prefix, component in [
+    ('bot_sessions', user_files), ('bot_df_cache', df_cache), ('bot_code_cache', code_cache),
+    ('bot_upload_store', upload_store), ('bot_llm', llm), ('bot_workers', worker_pool),
+    ('bot_sandbox', sandbox), ('bot_sender', sender), ('bot_paginator', paginator),
+    ('bot_code_analyzer', code_analyzer), ('bot_jobs', user_jobs), ('bot_schema_prompt', schema_prompts),
+]:
+    metrics.stats_gauges(prefix, component.stats, f"{prefix[4:]} stats")
+# Keeps references to fire-and-forget tasks (background summaries) until they finish
+background_tasks = set()
 LANGS = ['ru', 'en']
 
 MESSAGES = {
@@ -56,6 +162,26 @@ MESSAGES = {
         'ru': "Количество по городам:",
         'en': "Count by city:",
     },
+    'llm_writing': {
+        'ru': "🤖 Пишу код для вашего запроса…",
+        'en': "🤖 Writing code for your request…",
+    },
+    'llm_writing_lines': {
+        'ru': "🤖 Пишу код… строк: {n}",
+        'en': "🤖 Writing code… {n} lines",
+    },
+    'llm_running': {
+        'ru': "⚙️ Выполняю код…",
+        'en': "⚙️ Running the code…",
+    },
+    'busy': {
+        'ru': "⏳ Ещё обрабатываю ваши предыдущие запросы, отправьте этот чуть позже.",
+        'en': "⏳ Still working on your previous requests, please send this one again in a moment.",
+    },
+    'duplicate': {
+        'ru': "⏳ Этот запрос уже выполняется, ответ придёт выше.",
+        'en': "⏳ This request is already in progress, the answer will follow above.",
+    },
     'expert_warning': {
         'ru': "Экспертный режим: опишите свой запрос, используя названия столбцов из файла.",
         'en': "Expert mode: describe your request using the column names.",
@@ -76,14 +202,105 @@ MESSAGES = {
         'ru': "💡 Экспертный режим",
         'en': "💡 Expert mode",
     },
+    'page_expired': {
+        'ru': "Этот результат больше недоступен, повторите запрос.",
+        'en': "This result is no longer available, please ask again.",
+    },
+    'choose_sheet': {
+        'ru': "В книге {n} листов. Выберите лист:",
+        'en': "The workbook has {n} sheets. Choose one:",
+    },
+    'sheet_btn': {
+        'ru': "📑 Лист",
+        'en': "📑 Sheet",
+    },
+    'sheet_selected': {
+        'ru': "Выбран лист «{name}». Выберите действие или задайте вопрос:",
+        'en': "Sheet “{name}” selected. Choose an action or ask a question:",
+    },
+    'result_too_large': {
+        'ru': "Результат слишком большой для отправки, уточните запрос.",
+        'en': "The result is too large to send, please narrow your request.",
+    },
 }
 
+def stage(name):
+    """
+    Time one stage (download, parse, llm, code, render_*, send, ...) of the current update.
+    """
+    return STAGE_SECONDS.time(stage=name, handler=current_handler.get())
+
+def count_error(stage_name):
+    ERRORS.inc(stage=stage_name, handler=current_handler.get())
+
+def instrumented(label):
+    """
+    Handler decorator: the update's stages and errors are tagged with label (a string or
+    label(update, context)) and the whole handler is timed.
+    """
+    def decorate(handler):
+        @functools.wraps(handler)
+        async def wrapper(update, context):
+            name = label(update, context) if callable(label) else label
+            token = current_handler.set(name)
+            try:
+                with HANDLER_SECONDS.time(handler=name):
+                    return await handler(update, context)
+            except Exception:
+                count_error('unhandled')
+                raise
+            finally:
+                current_handler.reset(token)
+        return wrapper
+    return decorate
+
+def queued(key, slot=None):
+    """
+    Handler decorator: the update waits for the user's earlier updates (app/jobs.py).
+    key(update) identifies repeats of an update still queued or running, which are skipped;
+    slot(update) lets a newer click on the same message drop an older one still waiting.
+    Button clicks are answered at once so a waiting or dropped click stops spinning.
+    Past USER_QUEUE_DEPTH pending updates the user is told to wait; a repeated message
+    is acknowledged rather than answered twice.
+    """
+    def decorate(handler):
+        @functools.wraps(handler)
+        async def wrapper(update, context):
+            if update.callback_query is not None:
+                await update.callback_query.answer()
+            submitted = time.perf_counter()
+
+            async def job():
+                STAGE_SECONDS.observe(time.perf_counter() - submitted, stage='queue', handler=current_handler.get())
+                return await handler(update, context)
+            user_id = update.effective_user.id
+            outcome = await user_jobs.run(user_id, key(update), job, slot(update) if slot else None)
+            if outcome is COALESCED or outcome is SUPERSEDED or outcome is BUSY:
+                logger.info(f"Skipped {outcome!r} update from user {user_id}, jobs {user_jobs.stats()}")
+            # A repeated click edits the same message as the first one; messages get a word back
+            if outcome is BUSY or (outcome is COALESCED and update.callback_query is None):
+                message = update.effective_message
+                if message is not None:
+                    await reply(message, MESSAGES['busy' if outcome is BUSY else 'duplicate'][get_lang(update)])
+        return wrapper
+    return decorate
+
+def click_key(update):
+    return ('click', click_slot(update), update.callback_query.data)
+
+def click_slot(update):
+    # Every menu button edits the message it sits on, so only the newest click there matters
+    query = update.callback_query
+    return query.message.message_id if query.message else query.inline_message_id
+
 def get_lang(update):
     lang = getattr(update.effective_user, "language_code", "ru")[:2]
     return lang if lang in LANGS else 'en'
 
-def main_menu(lang):
-    return InlineKeyboardMarkup([
+def main_menu(lang, sheet=None):
+    # Workbooks with several sheets get a sheet picker on top
+    picker = [[InlineKeyboardButton(f"{MESSAGES['sheet_btn'][lang]}: {sheet}", callback_data='sheets')]] if sheet else []
+    return InlineKeyboardMarkup(picker + [
         [InlineKeyboardButton(MESSAGES['columns_btn'][lang], callback_data='show_columns')],
         [InlineKeyboardButton(MESSAGES['count_gender'][lang], callback_data='count_gender')],
         [InlineKeyboardButton(MESSAGES['unique_managers'][lang], callback_data='unique_managers')],
@@ -91,127 +308,502 @@ def main_menu(lang):
         [InlineKeyboardButton(MESSAGES['expert_btn'][lang], callback_data='expert')]
     ])
 
+def menu(user_id, lang):
+    """
+    Main menu for the user's current upload.
+    """
+    upload = user_files.get(user_id)
+    return main_menu(lang, current_sheet(upload) if upload else None)
+
+def sheet_markup(upload):
+    """
+    One button per worksheet, the current one ticked.
+    """
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(("✅ " if i == upload['sheet'] else "") + info.label(), callback_data=f"sheet:{i}")]
+        for i, info in enumerate(upload['sheets'])
+    ])
+
+def page_markup(token, n, total):
+    """
+    Prev/next buttons for page n of a paginated result; the page is rendered when clicked.
+    """
+    buttons = []
+    if n > 0:
+        buttons.append(InlineKeyboardButton("«", callback_data=f"page:{token}:{n - 1}"))
+    buttons.append(InlineKeyboardButton(f"{n + 1}/{total}", callback_data=f"page:{token}:{n}"))
+    if n + 1 < total:
+        buttons.append(InlineKeyboardButton("»", callback_data=f"page:{token}:{n + 1}"))
+    return InlineKeyboardMarkup([buttons])
+
+async def reply(message, text, **kwargs):
+    """
+    Reply with text of any length through the send pipeline; kwargs go with the last chunk.
+    """
+    with stage('send'):
+        return await sender.send_text(message.chat.id, text, message.reply_text, **kwargs)
+
+async def send_result(message, result, lang, filename="result"):
+    """
+    Reply with a result in the format chosen for its type, shape and size: message
+    text, pages with prev/next buttons, or a CSV/XLSX/TXT/PDF attachment.
+    """
+    fmt = choose_format(result, OUTPUT_TABLE_FORMAT, OUTPUT_TEXT_FORMAT)
+    started = time.perf_counter()
+    if fmt == TEXT:
+        await reply(message, result_text(result))
+        return
+    if fmt == PAGES:
+        with stage('render_pages'):
+            token, paged = await asyncio.to_thread(paginator.add, result)
+        markup = page_markup(token, 0, paged.total) if paged.total > 1 else None
+        with stage('send'):
+            await sender.submit(message.chat.id, lambda: message.reply_text(paged.page(0), reply_markup=markup))
+        logger.info(f"Result paginated into {paged.total} pages, paginator {paginator.stats()}")
+        return
+    table = as_table(result)
+    try:
+        with stage(f"render_{fmt}"):
+            if fmt == CSV and table is not None:
+                doc = await asyncio.to_thread(table_to_csv, table, f"{filename}.csv")
+            elif fmt == XLSX and table is not None:
+                doc = await asyncio.to_thread(table_to_xlsx, table, f"{filename}.xlsx")
+            elif fmt == PDF:
+                doc = await asyncio.to_thread(make_pdf, table if table is not None else result_text(result), f"{filename}.pdf")
+            else:
+                doc = await asyncio.to_thread(lambda: text_to_file(result_text(result), f"{filename}.txt"))
+    except (AttachmentTooLarge, PDFTooLarge) as e:
+        logger.info(f"Result not sent: {e}")
+        count_error('render')
+        await reply(message, MESSAGES['result_too_large'][lang])
+        return
+    logger.info(f"Result sent as {doc.name} ({doc.getbuffer().nbytes} bytes) in {(time.perf_counter() - started) * 1000:.1f} ms")
+    with stage('send'):
+        await sender.submit(message.chat.id, lambda: message.reply_document(document=doc, filename=doc.name))
+
+@instrumented('page')
+async def page_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Prev/next click on a paginated result: render just the requested page.
+    """
+    lang = get_lang(update)
+    query = update.callback_query
+    _, token, n = query.data.split(':')
+    paged = paginator.get(token)
+    if paged is None:
+        await query.answer(MESSAGES['page_expired'][lang], show_alert=True)
+        return
+    await query.answer()
+    n = min(int(n), paged.total - 1)
+    text = await asyncio.to_thread(paged.page, n)
+    try:
+        await sender.submit(query.message.chat.id,
+                            lambda: query.edit_message_text(text, reply_markup=page_markup(token, n, paged.total)))
+    except BadRequest as e:
+        # Clicking the current page number leaves the message unchanged
+        if 'not modified' not in str(e):
+            raise
+
+@instrumented('sheet')
+@queued(click_key, click_slot)
+async def sheet_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Sheet picker: 'sheets' shows the list, 'sheet:<n>' switches to sheet n.
+    """
+    lang = get_lang(update)
+    query = update.callback_query
+    user_id = update.effective_user.id
+    upload = get_upload(user_id)
+    if upload is None or not upload.get('sheets'):
+        await query.edit_message_text(MESSAGES['no_file'][lang])
+        return
+    index = int(query.data.split(':', 1)[1]) if query.data != 'sheets' else None
+    # A picker left over from an earlier workbook may point past this one's sheets
+    if index is None or index >= len(upload['sheets']):
+        await query.edit_message_text(MESSAGES['choose_sheet'][lang].format(n=len(upload['sheets'])),
+                                      reply_markup=sheet_markup(upload))
+        return
+    if index != upload['sheet']:
+        select_sheet(upload, index)
+    await query.edit_message_text(MESSAGES['sheet_selected'][lang].format(name=current_sheet(upload)),
+                                  reply_markup=menu(user_id, lang))
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     lang = get_lang(update)
     await update.message.reply_text(MESSAGES['start'][lang])
 
+def get_upload(user_id):
+    """
+    Returns the user's upload record, restoring it from the on-disk store after a restart.
+    """
+    upload = user_files.get(user_id)
+    if upload is None:
+        key = upload_store.latest(user_id)
+        if key is not None:
+            upload = user_files[user_id] = {'key': key, 'bytes': None}
+    return upload
+
+def get_upload_bytes(user_id):
+    file_bytes = user_files.load_bytes(user_id)
+    if file_bytes is None:
+        raise Exception("Stored file expired, please upload it again.")
+    return file_bytes
+
+def current_sheet(upload):
+    """
+    Name of the selected worksheet for multi-sheet workbooks, else None.
+    """
+    return upload['sheets'][upload['sheet']].name if upload.get('sheets') else None
+
+def select_sheet(upload, index):
+    """
+    Make another worksheet current. Nothing is parsed here; the summary and column index
+    built for the previous sheet are set aside so switching back reuses them.
+    """
+    state = upload['sheet_state']
+    state[upload['key']] = {name: upload.pop(name) for name in ('summary', 'index') if name in upload}
+    upload['sheet'] = index
+    upload['key'] = sheet_key(upload['file_key'], index)
+    upload.update(state.pop(upload['key'], {}))
+
+async def timed_load(file_bytes, sheet=None, fmt=None):
+    """
+    load_upload in a worker, timed per file format.
+    """
+    fmt = fmt or detect_format(file_bytes[:SNIFF_BYTES])
+    started = time.perf_counter()
+    with stage('parse'):
+        result = await worker_pool.run(load_upload, file_bytes, sheet, fmt)
+    parse_timings.record(fmt.label, time.perf_counter() - started, len(file_bytes))
+    return result
+
+async def get_user_entry(user_id):
+    """
+    Returns the parsed upload (DataFrame + column profile), parsing only on a cache miss.
+    A miss reloads the columnar copy from disk if there is one, else re-parses the raw bytes;
+    either way the work runs off the event loop.
+    """
+    upload = get_upload(user_id)
+    if not upload:
+        return None
+    entry = df_cache.get(upload['key'])
+    if entry is None:
+        if upload['key'] in upload_store:
+            df = await asyncio.to_thread(upload_store.load, upload['key'])
+            profile = await worker_pool.run(profile_dataframe, df)
+        else:
+            # Only the selected worksheet of a workbook is parsed
+            df, profile = await timed_load(get_upload_bytes(user_id), current_sheet(upload), upload.get('format'))
+        entry = df_cache.put(upload['key'], df, user_id, profile)
+        if 'summary' not in upload:
+            schedule_summary(user_id, upload['key'], df, profile)
+    return entry
+
+def schedule_summary(user_id, key, df, profile):
+    """
+    Build the per-file aggregate summary in the background; buttons and simple
+    questions use it as soon as it is ready.
+    """
+    task = asyncio.create_task(build_summary_for(user_id, key, df, profile))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+async def build_summary_for(user_id, key, df, profile):
+    try:
+        summary = await worker_pool.run(build_summary, df, profile)
+    except Exception:
+        logger.exception("Failed to build file summary")
+        return
+    upload = user_files.get(user_id)
+    # The user may have uploaded another file meanwhile
+    if upload is not None and upload['key'] == key:
+        upload['summary'] = summary
+    elif upload is not None and key in upload.get('sheet_state', ()):
+        upload['sheet_state'][key]['summary'] = summary
+
+async def get_user_columns(user_id):
+    """
+    Column names of the user's upload, without loading any data if it is only on disk.
+    """
+    upload = get_upload(user_id)
+    if upload['key'] not in df_cache and upload['key'] in upload_store:
+        return upload_store.columns(upload['key'])
+    if upload['key'] not in df_cache and upload.get('sheets'):
+        return await worker_pool.run(read_sheet_header, get_upload_bytes(user_id), current_sheet(upload))
+    return list((await get_user_entry(user_id)).df.columns)
+
+async def get_column_index(user_id):
+    """
+    Column-resolution index for the user's upload; built once per upload.
+    """
+    upload = get_upload(user_id)
+    index = upload.get('index')
+    if index is None:
+        index = upload['index'] = ColumnIndex(await get_user_columns(user_id))
+    return index
+
+async def get_user_series(user_id, col):
+    """
+    One column of the user's upload; reads only that column from disk, or from a
+    not yet parsed worksheet, if not cached.
+    """
+    upload = get_upload(user_id)
+    if upload['key'] not in df_cache and upload['key'] in upload_store:
+        df = await asyncio.to_thread(upload_store.load, upload['key'], [col])
+        return df[col]
+    if upload['key'] not in df_cache and upload.get('sheets'):
+        df = await worker_pool.run(read_sheet, get_upload_bytes(user_id), current_sheet(upload), [col])
+        return df[col]
+    return (await get_user_entry(user_id)).df[col]
+
+async def builtin_result(user_id, action, col, job):
+    """
+    Result text for a built-in button: precomputed while streaming a large CSV or in the
+    file summary when available, else job(series) in a worker.
+    """
+    upload = get_upload(user_id)
+    aggregates = upload.get('aggregates')
+    if aggregates is not None and aggregates.targets.get(action) == col:
+        return aggregates.result_text(action)
+    col_summary = upload['summary'].get(col) if upload.get('summary') is not None else None
+    if col_summary is not None:
+        text = col_summary.unique_values_text() if job is unique_values_text else col_summary.value_counts_text()
+        if text is not None:
+            return text
+    with stage('builtin'):
+        return await worker_pool.run(job, await get_user_series(user_id, col))
+
+async def fast_answer(user_id, question, lang):
+    """
+    Deterministic answer for common questions (stats, unique values, top-N, filtered
+    counts): from the file summary when it has the numbers, else by running the pandas
+    operation on the cached frame. None means the question goes to the LLM.
+    """
+    started = time.perf_counter()
+    intent = parse_question(question, await get_column_index(user_id))
+    if intent is None:
+        return None
+    upload = get_upload(user_id)
+    answer = answer_from_summary(intent, upload['summary'], lang) if upload.get('summary') is not None else None
+    if answer is None:
+        entry = await get_user_entry(user_id)
+        with stage('fast_path'):
+            answer = await asyncio.to_thread(answer_from_frame, intent, entry.df, entry.typed_df, lang)
+    if answer is not None:
+        logger.info(f"Fast path answered {intent!r} in {(time.perf_counter() - started) * 1000:.1f} ms")
+    return answer
+
+async def handle_large_csv(update: Update, new_file, file_id, lang):
+    """
+    Streaming path for big CSVs: spool to a temp file, parse in chunks, aggregate
+    incrementally and write the columnar copy chunk by chunk. Memory stays bounded.
+    """
+    user_id = update.effective_user.id
+    with stage('download'):
+        spool = await download_to_spool(new_file, SPOOL_MAX_MEMORY_BYTES)
+    try:
+        key = (file_id, await asyncio.to_thread(stream_digest, spool))
+        document = update.message.document
+        fmt = detect_format(spool.read(SNIFF_BYTES), document.file_name, document.mime_type)
+        open_writer = lambda columns: upload_store.open_writer(key, user_id, columns)
+        started = time.perf_counter()
+        with stage('parse'):
+            aggregates = await asyncio.to_thread(ingest_csv, spool, open_writer, CSV_CHUNK_ROWS, fmt)
+        parse_timings.record(f"{fmt.label}-stream", time.perf_counter() - started, document.file_size or 0)
+    except Exception as e:
+        await update.message.reply_text(f"{MESSAGES['error'][lang]} {e}")
+        logger.exception("Failed to stream CSV")
+        count_error('parse')
+        return
+    finally:
+        spool.close()
+    previous = user_files.get(user_id)
+    if previous and previous.get('file_key', previous['key']) != key:
+        drop_session(previous)
+    user_files[user_id] = {
+        'key': key, 'bytes': None, 'aggregates': aggregates, 'index': ColumnIndex(aggregates.columns),
+    }
+    logger.info(f"Streamed CSV for user {user_id}: {aggregates.rows} rows x {len(aggregates.columns)} columns")
+    await update.message.reply_text(MESSAGES['file_received'][lang], reply_markup=menu(user_id, lang))
+
+async def handle_workbook(update: Update, key, file_bytes, sheets, lang):
+    """
+    Workbook with several sheets: keep the raw bytes and let the user pick a sheet.
+    Each sheet is parsed on first use and cached under its own key.
+    """
+    user_id = update.effective_user.id
+    previous = user_files.get(user_id)
+    if previous and previous.get('file_key', previous['key']) != key:
+        drop_session(previous)
+    try:
+        user_files[user_id] = {
+            'key': sheet_key(key, 0), 'bytes': file_bytes, 'file_key': key,
+            'sheets': sheets, 'sheet': 0, 'sheet_state': {},
+        }
+    except UploadTooLarge as e:
+        await update.message.reply_text(f"{MESSAGES['error'][lang]} {e}")
+        return
+    # Workbooks are not kept in the store; its copy of the previous upload would come back after expiry
+    await asyncio.to_thread(upload_store.discard_user, user_id)
+    logger.info(f"Workbook for user {user_id}: sheets {sheets}")
+    await update.message.reply_text(MESSAGES['choose_sheet'][lang].format(n=len(sheets)),
+                                    reply_markup=sheet_markup(user_files[user_id]))
+
+@instrumented('file')
+@queued(lambda update: ('file', update.message.document.file_unique_id))
 async def handle_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
     lang = get_lang(update)
+    user_id = update.effective_user.id
     file = update.message.document
     file_id = file.file_id
     new_file = await context.bot.get_file(file_id)
-    file_bytes = await new_file.download_as_bytearray()
-    user_files[update.effective_user.id] = file_bytes
-    await update.message.reply_text(MESSAGES['file_received'][lang], reply_markup=main_menu(lang))
+    if (upload_store.enabled and is_csv_document(file.file_name, file.mime_type)
+            and (file.file_size or 0) >= CSV_STREAM_THRESHOLD_BYTES):
+        await handle_large_csv(update, new_file, file_id, lang)
+        return
+    with stage('download'):
+        file_bytes = await new_file.download_as_bytearray()
+    key = file_key(file_id, file_bytes)
+    # The parser is picked from the first bytes, so a CSV never goes through a failed Excel attempt
+    fmt = detect_format(file_bytes[:SNIFF_BYTES], file.file_name, file.mime_type)
+    # Sheet names come from workbook metadata; no cells are parsed yet
+    sheets = await asyncio.to_thread(list_sheets, file_bytes) if fmt.kind == XLSX_UPLOAD else None
+    if sheets is not None and len(sheets) > 1:
+        await handle_workbook(update, key, file_bytes, sheets, lang)
+        return
+    try:
+        df, profile = await timed_load(file_bytes, sheets[0].name if sheets else None, fmt)
+    except Exception as e:
+        await update.message.reply_text(f"{MESSAGES['error'][lang]} {e}")
+        logger.exception("Failed to load file")
+        count_error('parse')
+        return
+    previous = user_files.get(user_id)
+    if previous and previous.get('file_key', previous['key']) != key:
+        drop_session(previous)
+    df_cache.put(key, df, user_id, profile)
+    try:
+        stored = await asyncio.to_thread(upload_store.save, key, df, user_id)
+    except Exception:
+        stored = False
+        logger.exception("Failed to store upload on disk")
+        count_error('store')
+    # Raw bytes are only kept in memory when there is no columnar copy on disk
+    try:
+        user_files[user_id] = {
+            'key': key, 'bytes': None if stored else file_bytes, 'index': ColumnIndex(df.columns), 'format': fmt,
+        }
+    except UploadTooLarge as e:
+        df_cache.discard(key)
+        await update.message.reply_text(f"{MESSAGES['error'][lang]} {e}")
+        return
+    schedule_summary(user_id, key, df, profile)
+    logger.info(f"Parsed {fmt!r} upload for user {user_id}: {df.shape}, parse times {parse_timings.stats()}, cache {df_cache.stats()}, sessions {user_files.stats()}")
+    await update.message.reply_text(MESSAGES['file_received'][lang], reply_markup=menu(user_id, lang))
 
+@instrumented(lambda update, context: f"menu:{update.callback_query.data}")
+@queued(click_key, click_slot)
 async def menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     lang = get_lang(update)
     query = update.callback_query
     user_id = update.effective_user.id
-    await query.answer()
     await context.bot.send_chat_action(chat_id=query.message.chat.id, action='typing')
-    file_bytes = user_files.get(user_id)
-    if not file_bytes:
+    if get_upload(user_id) is None:
         await query.edit_message_text(MESSAGES['no_file'][lang])
         return
 
-    # Read file robustly
+    # Parsed once on upload; the column index is built once and reused by every click
     try:
-        df = None
-        try:
-            df = pd.read_excel(BytesIO(file_bytes), engine="openpyxl")
-        except Exception:
-            try:
-                df = pd.read_csv(BytesIO(file_bytes), encoding='utf-8')
-            except Exception:
-                df = pd.read_csv(BytesIO(file_bytes), encoding='latin1')
-        if df is None or len(df.columns) == 0:
-            raise Exception("File loaded but no columns detected.")
+        index = await get_column_index(user_id)
+        columns = index.columns
     except Exception as e:
         await query.edit_message_text(f"{MESSAGES['error'][lang]} {e}")
         logger.exception("Failed to load file")
+        count_error('parse')
         return
 
     # Handle buttons
     if query.data == 'show_columns':
-        cols = "\n".join(str(c) for c in df.columns)
-        # Telegram edit_message_text max is 4096 chars, chunk if needed
-        for i in range(0, len(cols), 4000):
-            await query.edit_message_text(f"{MESSAGES['columns'][lang]}\n\n{cols[i:i+4000]}", reply_markup=main_menu(lang) if i == 0 else None)
+        cols = "\n".join(str(c) for c in columns)
+        # The menu message shows the first chunk; the rest follow as new messages, the menu under the last
+        chunks = split_message(f"{MESSAGES['columns'][lang]}\n\n{cols}")
+        await query.edit_message_text(chunks[0], reply_markup=menu(user_id, lang) if len(chunks) == 1 else None)
+        if len(chunks) > 1:
+            await sender.send_chunks(query.message.chat.id, chunks[1:], query.message.reply_text, reply_markup=menu(user_id, lang))
     elif query.data == 'count_gender':
-        gender_col = None
-        for col in df.columns:
-            if 'gender' in col.lower() or 'пол' in col.lower():
-                gender_col = col
-                break
-        if not gender_col:
-            await query.edit_message_text(f"{MESSAGES['error'][lang]} Не найден столбец для пола.", reply_markup=main_menu(lang))
+        gender_col = index.resolve(BUILTIN_ROLES['count_gender'])
+        if gender_col is None:
+            await query.edit_message_text(f"{MESSAGES['error'][lang]} Не найден столбец для пола.", reply_markup=menu(user_id, lang))
             return
         try:
-            counts = df[gender_col].value_counts(dropna=False)
-            result = "\n".join(f"{str(k)}: {v}" for k, v in counts.items())
+            result = await builtin_result(user_id, 'count_gender', gender_col, value_counts_text)
         except Exception as e:
             result = f"{MESSAGES['error'][lang]} {e}"
-        await query.edit_message_text(f"{MESSAGES['count_gender'][lang]}\n{result}", reply_markup=main_menu(lang))
+            count_error('builtin')
+        await query.edit_message_text(f"{MESSAGES['count_gender'][lang]}\n{result}", reply_markup=menu(user_id, lang))
     elif query.data == 'unique_managers':
-        man_col = None
-        for col in df.columns:
-            if 'manager' in col.lower() or 'менеджер' in col.lower():
-                man_col = col
-                break
-        if not man_col:
-            await query.edit_message_text(f"{MESSAGES['error'][lang]} Не найден столбец для менеджера.", reply_markup=main_menu(lang))
+        man_col = index.resolve(BUILTIN_ROLES['unique_managers'])
+        if man_col is None:
+            await query.edit_message_text(f"{MESSAGES['error'][lang]} Не найден столбец для менеджера.", reply_markup=menu(user_id, lang))
             return
         try:
-            uniques = df[man_col].dropna().unique()
-            result = "\n".join(str(m) for m in uniques)
+            result = await builtin_result(user_id, 'unique_managers', man_col, unique_values_text)
         except Exception as e:
             result = f"{MESSAGES['error'][lang]} {e}"
-        await query.edit_message_text(f"{MESSAGES['unique_managers'][lang]}\n{result}", reply_markup=main_menu(lang))
+            count_error('builtin')
+        await query.edit_message_text(f"{MESSAGES['unique_managers'][lang]}\n{result}", reply_markup=menu(user_id, lang))
     elif query.data == 'count_city':
-        city_col = None
-        for col in df.columns:
-            if 'city' in col.lower() or 'город' in col.lower():
-                city_col = col
-                break
-        if not city_col:
-            await query.edit_message_text(f"{MESSAGES['error'][lang]} Не найден столбец для города.", reply_markup=main_menu(lang))
+        city_col = index.resolve(BUILTIN_ROLES['count_city'])
+        if city_col is None:
+            await query.edit_message_text(f"{MESSAGES['error'][lang]} Не найден столбец для города.", reply_markup=menu(user_id, lang))
             return
         try:
-            counts = df[city_col].value_counts(dropna=False)
-            result = "\n".join(f"{str(k)}: {v}" for k, v in counts.items())
+            result = await builtin_result(user_id, 'count_city', city_col, value_counts_text)
         except Exception as e:
             result = f"{MESSAGES['error'][lang]} {e}"
-        await query.edit_message_text(f"{MESSAGES['count_city'][lang]}\n{result}", reply_markup=main_menu(lang))
+            count_error('builtin')
+        await query.edit_message_text(f"{MESSAGES['count_city'][lang]}\n{result}", reply_markup=menu(user_id, lang))
     elif query.data == 'expert':
         await query.edit_message_text(MESSAGES['expert_warning'][lang], reply_markup=None)
         context.user_data['expert'] = True
 
+@instrumented(lambda update, context: 'text:expert' if context.user_data.get('expert') else 'text')
+@queued(lambda update: ('text', update.message.text))
 async def text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     lang = get_lang(update)
     user_id = update.effective_user.id
     if context.user_data.get('expert'):
         await update.message.chat.send_action(action='typing')
-        file_bytes = user_files.get(user_id)
-        if not file_bytes:
-            await update.message.reply_text(MESSAGES['no_file'][lang], reply_markup=main_menu(lang))
+        upload = get_upload(user_id)
+        if upload is None:
+            await reply(update.message, MESSAGES['no_file'][lang], reply_markup=menu(user_id, lang))
             context.user_data['expert'] = False
             return
+        # Common questions are answered without the LLM; anything the grammar does not cover falls through
         try:
-            df = None
-            try:
-                df = pd.read_excel(BytesIO(file_bytes), engine="openpyxl")
-            except Exception:
-                try:
-                    df = pd.read_csv(BytesIO(file_bytes), encoding='utf-8')
-                except Exception:
-                    df = pd.read_csv(BytesIO(file_bytes), encoding='latin1')
-            if df is None or len(df.columns) == 0:
-                raise Exception("File loaded but no columns detected.")
+            answer = await fast_answer(user_id, update.message.text, lang)
+        except Exception:
+            answer = None
+            logger.exception("Fast path failed, falling back to the LLM")
+            count_error('fast_path')
+        if answer is not None:
+            await send_result(update.message, answer, lang)
+            context.user_data['expert'] = False
+            await reply(update.message, MESSAGES['file_received'][lang], reply_markup=menu(user_id, lang))
+            return
+        try:
+            # Expert code gets the typed frame: numeric-like/date columns already converted
+            entry = await get_user_entry(user_id)
+            df = entry.typed_df
+            index = await get_column_index(user_id)
+            # Hints read the file summary when it is ready, else scan the columns they list
+            schema = await asyncio.to_thread(schema_prompts.build, update.message.text, index, df,
+                                             entry.profile, upload.get('summary'))
         except Exception as e:
-            await update.message.reply_text(f"{MESSAGES['error'][lang]} {e}", reply_markup=main_menu(lang))
+            await reply(update.message, f"{MESSAGES['error'][lang]} {e}", reply_markup=menu(user_id, lang))
             context.user_data['expert'] = False
             logger.exception("Failed to load file in expert mode")
+            count_error('parse')
             return
         # Prepare the LLM prompt
         system_prompt = (
@@ -221,60 +813,128 @@ async def text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "ALWAYS create a string variable named 'result' with the answer (do NOT use print()). "
             "Handle missing columns gracefully. "
             "Never import or run dangerous code. "
-            "File columns: " + ', '.join(str(c) for c in df.columns)
+            "File columns (name, type and sample values):\n" + schema.text
         )
+        logger.info(f"Expert prompt lists {len(schema.columns)}/{len(df.columns)} columns in ~{schema.tokens} tokens "
+                    f"(saved ~{schema.saved}), schema prompts {schema_prompts.stats()}")
         user_prompt = update.message.text
-        # Call OpenAI
+        columns = list(df.columns)
+        progress = None
         try:
-            response = openai.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.0,
-                max_tokens=2048
-            )
-            code = response.choices[0].message.content
-            # Remove markdown if present
-            if code.startswith("```"):
-                code = code.split('```')[1]
-                code = code.replace('python', '', 1).strip()
-            # Run code safely
-            local_vars = {'df': df, 'pd': pd, 'result': None}
+            # Repeat questions on the same schema reuse previously generated code
+            code = code_cache.get(user_prompt, columns)
+            from_cache = code is not None
+            if not from_cache:
+                # A status message follows the model while it writes
+                progress = ProgressMessage(sender, update.message.chat.id, update.message.reply_text, LLM_PROGRESS_INTERVAL)
+                progress.start(MESSAGES['llm_writing'][lang])
+                # Call OpenAI (async, pooled, rate-limited per user), streamed: the code is
+                # taken as soon as its fenced block closes, the prose after it is not awaited
+                with stage('llm'):
+                    code = await llm.complete_code(
+                        [
+                            {"role": "system", "content": system_prompt},
+                            {"role": "user", "content": user_prompt}
+                        ],
+                        user_id=user_id,
+                        on_text=lambda text: progress.update(MESSAGES['llm_writing_lines'][lang].format(n=text.count('\n'))),
+                        temperature=0.0,
+                        max_tokens=2048
+                    )
+                progress.update(MESSAGES['llm_running'][lang])
+            # Run code in a sandbox process, bounded by CPU, wall-time and memory limits
+            succeeded = False
             try:
-                exec(code, {}, local_vars)
-                output = local_vars.get('result', None)
+                # Vectorize what can be, reject what would be too slow, before spending CPU on it
+                with stage('analyze'):
+                    analysis = code_analyzer.analyze(code, df, upload.get('summary'))
+                if analysis.missing:
+                    raise KeyError(analysis.missing[0])
+                if analysis.rewrites:
+                    logger.info(f"Expert code rewritten: {'; '.join(analysis.rewrites)}, analyzer {code_analyzer.stats()}")
+                with stage('code'):
+                    output = await sandbox.run(upload['key'], df, analysis.code)
                 if output is None:
                     output = "No 'result' variable was created by the code."
+                else:
+                    succeeded = True
+            except CodeRejected as e:
+                logger.info(f"Expert code rejected: {e}")
+                output = f"{MESSAGES['error'][lang]} {e}"
+            except (JobTimeout, ResourceLimitExceeded, SandboxError, UnsafeCode) as e:
+                output = f"{MESSAGES['error'][lang]} {e}"
+                count_error('code')
             except KeyError as e:
                 missing = str(e).replace("'", "")
-                matches = get_close_matches(missing, list(df.columns), n=3)
+                matches = [str(m) for m in (await get_column_index(user_id)).suggest(missing, n=3)]
                 output = f"{MESSAGES['error'][lang]} '{missing}'. Похожие столбцы: {', '.join(matches)}"
             except Exception as e:
-                tb = traceback.format_exc()
+                count_error('code')
+                tb = getattr(e, 'sandbox_traceback', None) or traceback.format_exc()
                 output = f"{MESSAGES['error'][lang]} {e}\n{tb[:500]}"
-            # Show output (handle Telegram text limits)
-            max_length = 3500
-            if isinstance(output, str):
-                for i in range(0, len(output), max_length):
-                    await update.message.reply_text(output[i:i+max_length])
-            else:
-                await update.message.reply_text(str(output))
+            if succeeded and not from_cache:
+                code_cache.put(user_prompt, columns, code)
+            elif not succeeded and from_cache:
+                code_cache.discard(user_prompt, columns)
+            logger.info(f"Expert code {'cache hit' if from_cache else 'from LLM'}, code cache {code_cache.stats()}")
+            # Show output: text, pages or an attachment depending on its shape and size
+            await send_result(update.message, output, lang, filename="expert_result")
         except Exception as e:
-            await update.message.reply_text(f"{MESSAGES['error'][lang]} {e}", reply_markup=main_menu(lang))
+            await reply(update.message, f"{MESSAGES['error'][lang]} {e}", reply_markup=menu(user_id, lang))
             logger.exception("Expert mode LLM error")
+            count_error('llm')
+        finally:
+            if progress is not None:
+                await progress.finish()
         context.user_data['expert'] = False
-        await update.message.reply_text(MESSAGES['file_received'][lang], reply_markup=main_menu(lang))
+        await reply(update.message, MESSAGES['file_received'][lang], reply_markup=menu(user_id, lang))
     else:
-        await update.message.reply_text(MESSAGES['file_received'][lang], reply_markup=main_menu(lang))
+        await reply(update.message, MESSAGES['file_received'][lang], reply_markup=menu(user_id, lang))
 
-if __name__ == '__main__':
-    print("\n🚀 AI_DATA_BOT: RUNNING ULTRA-ROBUST VERSION\n")
-    app = ApplicationBuilder().token(TELEGRAM_TOKEN).build()
+def build_application(worker_index=0):
+    """
+    The bot's Application with all handlers. Webhook workers each build their own;
+    worker_index offsets the metrics port so every worker can be scraped.
+    """
+    async def start_resources(application):
+        sandbox.start()
+        start_http_server(metrics, METRICS_PORT + worker_index if METRICS_PORT else 0, METRICS_HOST)
+
+    async def shutdown_resources(application):
+        code_cache.flush()
+        worker_pool.shutdown()
+        sandbox.shutdown()
+        await llm.aclose()
+
+    app = (ApplicationBuilder().token(TELEGRAM_TOKEN).concurrent_updates(CONCURRENT_UPDATES)
+           .post_init(start_resources).post_shutdown(shutdown_resources).build())
     app.add_handler(CommandHandler("start", start))
     app.add_handler(MessageHandler(filters.Document.ALL, handle_file))
+    app.add_handler(CallbackQueryHandler(page_handler, pattern=r'^page:'))
+    app.add_handler(CallbackQueryHandler(sheet_handler, pattern=r'^(sheets|sheet:\d+)$'))
     app.add_handler(CallbackQueryHandler(menu_handler))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, text_handler))
-    app.run_polling()
+    return app
+
+def worker_env(index):
+    """
+    Settings of webhook worker index: each gets its own upload store, code cache file and
+    LLM stub port, since these files are rewritten whole by the process that owns them.
+    Users stick to a worker, so its store still has their uploads after a restart.
+    """
+    env = {'LLM_STUB_PORT': str(LLM_STUB_PORT + index)}
+    if UPLOAD_STORE_DIR:
+        env['UPLOAD_STORE_DIR'] = os.path.join(UPLOAD_STORE_DIR, f"worker-{index}")
+    if CODE_CACHE_PATH:
+        root, ext = os.path.splitext(CODE_CACHE_PATH)
+        env['CODE_CACHE_PATH'] = f"{root}-worker-{index}{ext}"
+    return env
 
+if __name__ == '__main__':
+    print("\n🚀 AI_DATA_BOT: RUNNING ULTRA-ROBUST VERSION\n")
+    if WEBHOOK_URL:
+        # Several processes behind one HTTP front; each user sticks to one of them
+        run_webhook(build_application, TELEGRAM_TOKEN, WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH,
+                    WEBHOOK_WORKERS, WEBHOOK_SECRET, WEBHOOK_MAX_CONNECTIONS, worker_env)
+    else:
+        build_application().run_polling()
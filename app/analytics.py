@@ -0,0 +1,27 @@
+import pandas as pd
+
+# Built-in menu actions and the column role (see app.columns.ROLE_ALIASES) each one uses
+BUILTIN_ROLES = {
+    'count_gender': 'gender',
+    'unique_managers': 'manager',
+    'count_city': 'city',
+}
+
+# Job functions dispatched to app.workers.WorkerPool.
+# They must stay at module level so they can be pickled into worker processes.
+
+
+def value_counts_text(series: pd.Series) -> str:
+    """
+    Value counts of a column (NaN included), one 'value: count' per line.
+    """
+    counts = series.value_counts(dropna=False)
+    return "\n".join(f"{str(k)}: {v}" for k, v in counts.items())
+
+
+def unique_values_text(series: pd.Series) -> str:
+    """
+    Distinct non-null values of a column, one per line.
+    """
+    return "\n".join(str(m) for m in series.dropna().unique())
+
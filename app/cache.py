@@ -0,0 +1,133 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+import pandas as pd
+
+logger = logging.getLogger("AI_DATA_BOT")
+
+
+def file_key(file_id: str, file_bytes) -> tuple:
+    """
+    Cache key for an upload: Telegram file_id plus a hash of the content.
+    """
+    digest = hashlib.blake2b(bytes(file_bytes), digest_size=16).hexdigest()
+    return (file_id, digest)
+
+
+def sheet_key(key: tuple, index: int) -> tuple:
+    """
+    Cache key for one worksheet of a workbook upload; the first sheet keeps the file's key.
+    """
+    return key if index == 0 else (key[0], f"{key[1]}-{index}")
+
+
+def frame_nbytes(df: pd.DataFrame) -> int:
+    """
+    Approximate memory footprint of a DataFrame, including object payloads.
+    """
+    try:
+        return int(df.memory_usage(index=True, deep=True).sum())
+    except Exception:
+        return int(df.memory_usage(index=True).sum())
+
+
+class ParsedFile:
+    """
+    A parsed upload kept in the DataFrame cache.
+    """
+    def __init__(self, key: tuple, df: pd.DataFrame, user_id: Optional[int] = None, profile=None):
+        self.key = key
+        self.df = df
+        self.user_id = user_id
+        self.profile = profile
+        self.nbytes = frame_nbytes(df) + (profile.nbytes if profile is not None else 0)
+
+    @property
+    def typed_df(self) -> pd.DataFrame:
+        """
+        DataFrame with numeric-like/date columns converted (see app.profile).
+        """
+        return self.profile.typed_frame(self.df) if self.profile is not None else self.df
+
+
+class DataFrameCache:
+    """
+    LRU cache of parsed DataFrames bounded by a total memory budget.
+    The most recently stored entry is always kept, even if it alone exceeds the budget.
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, ParsedFile]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key: tuple) -> Optional[ParsedFile]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: tuple, df: pd.DataFrame, user_id: Optional[int] = None, profile=None) -> ParsedFile:
+        entry = ParsedFile(key, df, user_id, profile)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old.nbytes
+            self._entries[key] = entry
+            self.total_bytes += entry.nbytes
+            self._evict()
+        return entry
+
+    def get_or_load(self, key: tuple, loader: Callable[[], pd.DataFrame],
+                    user_id: Optional[int] = None) -> ParsedFile:
+        """
+        Return the cached entry for key, parsing it with loader() on a miss.
+        loader may return a DataFrame or a (df, profile) pair.
+        """
+        entry = self.get(key)
+        if entry is None:
+            loaded = loader()
+            df, profile = loaded if isinstance(loaded, tuple) else (loaded, None)
+            entry = self.put(key, df, user_id, profile)
+        return entry
+
+    def discard(self, key: tuple) -> None:
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old.nbytes
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, old = self._entries.popitem(last=False)
+            self.total_bytes -= old.nbytes
+            self.evictions += 1
+            logger.info(f"DataFrame cache evicted {key[0]} ({old.nbytes} bytes)")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.total_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,550 @@
+import ast
+import copy
+import re
+from typing import Callable, List, Optional, Set
+
+import pandas as pd
+
+# Rough per-row costs of pandas patterns, in seconds, measured on typical uploads
+ROW_APPLY_COST = 25e-6      # df.apply(f, axis=1): a Series built per row
+ITERROWS_COST = 40e-6
+ITERTUPLES_COST = 1.5e-6
+LOOP_COST = 1e-6            # a Python loop step over the rows (range(len(df)), df.index, ...)
+ROW_ACCESS_COST = 15e-6     # df.loc[i, ...] / df.iloc[i] inside such a loop
+ELEMENT_APPLY_COST = 0.5e-6  # Series.apply / map with a Python function
+OBJECT_STR_COST = 0.3e-6    # .str methods on object-dtype columns
+MERGE_ROW_COST = 0.2e-6     # per output row of a merge
+
+# Deterministic methods that return a frame with (at most) the same rows
+FRAME_METHODS = frozenset({
+    'copy', 'dropna', 'fillna', 'query', 'assign', 'reset_index', 'set_index', 'sort_values',
+    'sort_index', 'drop_duplicates', 'astype', 'drop', 'rename', 'head', 'tail', 'filter',
+})
+SERIES_METHODS = frozenset({'copy', 'dropna', 'fillna', 'astype', 'sort_values', 'reset_index', 'head', 'tail'})
+_STR_METHODS = frozenset({'lower', 'upper', 'strip', 'lstrip', 'rstrip', 'title', 'capitalize', 'casefold'})
+# str() is not here: astype('str') keeps NaN missing where str(x) gives 'nan'
+_BUILTIN_MAPS = {'abs': ('abs', ()), 'float': ('astype', ('float',))}
+# Python raises on a missing value where the vectorized form returns NaN (and float dtype),
+# so these are rewritten only over values known to have none
+_NULL_SENSITIVE = frozenset({'float', 'round', 'len'})
+_CALLABLE_BUILTINS = frozenset({'abs', 'str', 'float', 'int', 'len', 'round', 'bool', 'repr', 'type'})
+_ARITH = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+# row.name, row.index, ... are Series attributes, not columns
+_SERIES_ATTRS = frozenset(dir(pd.Series))
+_REGEX_META = re.compile(r'[.^$*+?{}\[\]\\|()]')
+
+
+class CodeRejected(Exception):
+    """
+    Raised when generated code is estimated to cost more than the budget.
+    """
+    def __init__(self, message: str, cost: float):
+        super().__init__(message)
+        self.cost = cost
+
+
+class Analysis:
+    """
+    Result of analyzing generated code: the (possibly rewritten) code, what was
+    rewritten, the estimated cost in seconds and columns referenced but missing.
+    """
+    def __init__(self, code: str, rewrites: List[str], findings: List[str], cost: float, missing: List):
+        self.code = code
+        self.rewrites = rewrites
+        self.findings = findings
+        self.cost = cost
+        self.missing = missing
+
+
+def _root(node) -> Optional[str]:
+    while isinstance(node, (ast.Attribute, ast.Subscript, ast.Call)):
+        node = node.func if isinstance(node, ast.Call) else node.value
+    return node.id if isinstance(node, ast.Name) else None
+
+
+def _const_str(node) -> Optional[str]:
+    return node.value if isinstance(node, ast.Constant) and isinstance(node.value, str) else None
+
+
+def _keyword(call: ast.Call, name: str):
+    return next((k.value for k in call.keywords if k.arg == name), None)
+
+
+def _is_rowwise(call: ast.Call) -> bool:
+    axis = _keyword(call, 'axis')
+    if axis is None and len(call.args) > 1:
+        axis = call.args[1]
+    return isinstance(axis, ast.Constant) and axis.value in (1, 'columns')
+
+
+class _Vectorizer:
+    """
+    Turns a one-argument lambda body into the equivalent vectorized pandas
+    expression over recv, or gives up (returns None) on anything it does not know.
+    null_free(col) tells whether a column of the row (rowwise) or recv itself (col None)
+    has no missing values.
+    """
+    def __init__(self, arg: str, recv: ast.expr, rowwise: bool, columns=frozenset(), null_free=None):
+        self.arg = arg
+        self.recv = recv
+        self.rowwise = rowwise
+        self.columns = columns
+        self.null_free = null_free or (lambda col: False)
+        self.uses = 0
+
+    def _recv(self) -> ast.expr:
+        self.uses += 1
+        return copy.deepcopy(self.recv)
+
+    def _row_column(self, node) -> Optional[str]:
+        if isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and node.value.id == self.arg:
+            return _const_str(node.slice)
+        if (isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id == self.arg
+                and node.attr in self.columns and node.attr not in _SERIES_ATTRS):
+            return node.attr
+        return None
+
+    def _without_nulls(self, node) -> bool:
+        # Only the argument itself (or one column of the row), where missing values are known
+        if self.rowwise:
+            col = self._row_column(node)
+            return col is not None and self.null_free(col)
+        return isinstance(node, ast.Name) and node.id == self.arg and self.null_free(None)
+
+    def convert(self, node) -> Optional[ast.expr]:
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, str, bool)):
+            return node
+        if self.rowwise:
+            col = self._row_column(node)
+            if col is not None:
+                return ast.Subscript(value=self._recv(), slice=ast.Constant(col), ctx=ast.Load())
+        elif isinstance(node, ast.Name) and node.id == self.arg:
+            return self._recv()
+        if isinstance(node, ast.BinOp) and isinstance(node.op, _ARITH):
+            left, right = self.convert(node.left), self.convert(node.right)
+            return ast.BinOp(left=left, op=node.op, right=right) if left and right else None
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            operand = self.convert(node.operand)
+            return ast.UnaryOp(op=node.op, operand=operand) if operand else None
+        if isinstance(node, ast.Compare) and len(node.ops) == 1 and not isinstance(node.ops[0], (ast.In, ast.NotIn, ast.Is, ast.IsNot)):
+            left, right = self.convert(node.left), self.convert(node.comparators[0])
+            return ast.Compare(left=left, ops=node.ops, comparators=[right]) if left and right else None
+        # not/and/or become ~/&/| only over comparisons: on other values they return an operand, not a bool
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            operand = self._convert_bool(node.operand)
+            return ast.UnaryOp(op=ast.Invert(), operand=operand) if operand else None
+        if isinstance(node, ast.BoolOp):
+            values = [self._convert_bool(v) for v in node.values]
+            if not all(values):
+                return None
+            op = ast.BitAnd() if isinstance(node.op, ast.And) else ast.BitOr()
+            out = values[0]
+            for value in values[1:]:
+                out = ast.BinOp(left=out, op=op, right=value)
+            return out
+        if isinstance(node, ast.Call) and not node.keywords:
+            return self._convert_call(node)
+        return None
+
+    def _convert_bool(self, node) -> Optional[ast.expr]:
+        if isinstance(node, (ast.Compare, ast.BoolOp)) or isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            return self.convert(node)
+        return None
+
+    def _convert_call(self, node: ast.Call) -> Optional[ast.expr]:
+        func = node.func
+        # x.lower() -> s.str.lower()
+        if (isinstance(func, ast.Attribute) and func.attr in _STR_METHODS and not node.args
+                and not self.rowwise and self._without_nulls(func.value)):
+            accessor = ast.Attribute(value=self._recv(), attr='str', ctx=ast.Load())
+            return ast.Call(func=ast.Attribute(value=accessor, attr=func.attr, ctx=ast.Load()), args=[], keywords=[])
+        if not isinstance(func, ast.Name) or len(node.args) < 1:
+            return None
+        if func.id in _NULL_SENSITIVE and not self._without_nulls(node.args[0]):
+            return None
+        value = self.convert(node.args[0])
+        if value is None:
+            return None
+        if func.id == 'len' and len(node.args) == 1 and not self.rowwise:
+            accessor = ast.Attribute(value=value, attr='str', ctx=ast.Load())
+            return ast.Call(func=ast.Attribute(value=accessor, attr='len', ctx=ast.Load()), args=[], keywords=[])
+        if func.id == 'round' and len(node.args) <= 2:
+            rounded = ast.Call(func=ast.Attribute(value=value, attr='round', ctx=ast.Load()), args=node.args[1:], keywords=[])
+            if len(node.args) == 2:
+                return rounded
+            # round(x) is an int
+            return ast.Call(func=ast.Attribute(value=rounded, attr='astype', ctx=ast.Load()),
+                            args=[ast.Constant('int64')], keywords=[])
+        if func.id in _BUILTIN_MAPS and len(node.args) == 1:
+            method, args = _BUILTIN_MAPS[func.id]
+            return ast.Call(func=ast.Attribute(value=value, attr=method, ctx=ast.Load()),
+                            args=[ast.Constant(a) for a in args], keywords=[])
+        return None
+
+
+def _is_simple(recv: ast.expr) -> bool:
+    # df or df['col']: cheap and the same every time it is evaluated
+    if isinstance(recv, ast.Subscript):
+        return isinstance(recv.value, ast.Name) and _const_str(recv.slice) is not None
+    return isinstance(recv, ast.Name)
+
+
+def vectorize_lambda(fn, recv: ast.expr, rowwise: bool, columns=frozenset(), null_free=None) -> Optional[ast.expr]:
+    """
+    Vectorized replacement for recv.apply(fn) (rowwise: axis=1), or None.
+    fn may be a one-argument lambda or one of the builtins in _BUILTIN_MAPS; row.attr
+    counts as a column only for the given columns; null_free as for _Vectorizer. The
+    rewrite repeats recv once per use of the argument, so a receiver other than
+    df / df['col'] may be used only once.
+    """
+    if isinstance(fn, ast.Name) and not rowwise and fn.id in _BUILTIN_MAPS:
+        fn = ast.Lambda(args=ast.arguments(posonlyargs=[], args=[ast.arg('x')], kwonlyargs=[], kw_defaults=[], defaults=[]),
+                        body=ast.Call(func=ast.Name(fn.id, ast.Load()), args=[ast.Name('x', ast.Load())], keywords=[]))
+    if not isinstance(fn, ast.Lambda) or len(fn.args.args) != 1 or fn.args.vararg or fn.args.kwarg:
+        return None
+    vectorizer = _Vectorizer(fn.args.args[0].arg, recv, rowwise, columns, null_free)
+    out = vectorizer.convert(fn.body)
+    # A body that ignores its argument is a constant per row, not a vectorized column
+    if out is None or not vectorizer.uses or vectorizer.uses > 1 and not _is_simple(recv):
+        return None
+    return out
+
+
+class _Analyzer(ast.NodeTransformer):
+    def __init__(self, rows: int, columns: Set, object_columns: Set, key_counts: Callable,
+                 has_nulls: Callable = None):
+        self.rows = rows
+        self.columns = columns
+        self.object_columns = object_columns
+        self.key_counts = key_counts
+        self.has_nulls = has_nulls or (lambda col: True)
+        # Any write to df, even after the apply, may bring missing values into its columns
+        self.df_mutated = False
+        self.frames = {'df'}
+        # df rebound or its columns changed in place: its subscripts no longer name upload columns
+        self.df_changed = False
+        self.multiplier = 1
+        self.cost = 0.0
+        self.rewrites: List[str] = []
+        self.findings: List[str] = []
+        self.referenced: List = []
+        self.assigned: Set = set()
+        self.guarded: Set = set()
+        self.functions: Set[str] = set()
+
+    def _add(self, cost: float, finding: str) -> None:
+        cost *= self.multiplier
+        self.cost += cost
+        self.findings.append(f"{finding} (~{cost:.1f}s)")
+
+    def is_frame(self, node) -> bool:
+        if isinstance(node, ast.Name):
+            return node.id in self.frames
+        if isinstance(node, ast.Subscript):
+            # df[mask] / df[['a', 'b']], but not df['a']
+            return self.is_frame(node.value) and _const_str(node.slice) is None
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+            return node.func.attr in FRAME_METHODS and self.is_frame(node.func.value)
+        return False
+
+    def column_of(self, node):
+        """
+        Column name if node is a single column of a frame (df['a'] or df.a), else None.
+        """
+        if isinstance(node, ast.Subscript) and self.is_frame(node.value):
+            return _const_str(node.slice)
+        if isinstance(node, ast.Attribute) and self.is_frame(node.value) and node.attr in self.columns:
+            return node.attr
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr in SERIES_METHODS:
+            return self.column_of(node.func.value)
+        return None
+
+    def is_series(self, node) -> bool:
+        return self.column_of(node) is not None
+
+    def null_free(self, recv) -> Callable:
+        """
+        null_free(col) for _Vectorizer: recv dropped or filled its missing values,
+        or reads upload columns that have none (col None: recv's own column).
+        """
+        node, dropped = recv, False
+        while isinstance(node, (ast.Call, ast.Subscript, ast.Attribute)):
+            if isinstance(node, ast.Call):
+                method = node.func.attr if isinstance(node.func, ast.Attribute) else None
+                if method == 'assign':
+                    return lambda col: False
+                if (method == 'dropna' and not node.args and not node.keywords) or (method == 'fillna' and node.args):
+                    dropped = True
+                node = node.func
+            node = node.value if isinstance(node, (ast.Subscript, ast.Attribute)) else node
+        if dropped:
+            return lambda col: True
+        if not self._is_df(node) or self.df_mutated:
+            return lambda col: False
+        own = self.column_of(recv)
+        return lambda col: not self.has_nulls(own if col is None else col)
+
+    def _iterates_rows(self, node) -> bool:
+        """
+        Whether a for-loop iterable walks the rows of a frame.
+        """
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr in ('iterrows', 'itertuples'):
+            return self.is_frame(node.func.value)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == 'range':
+            return any(isinstance(a, ast.Call) and isinstance(a.func, ast.Name) and a.func.id == 'len'
+                       and a.args and (self.is_frame(a.args[0]) or self.is_series(a.args[0])) for a in node.args)
+        if isinstance(node, ast.Attribute) and node.attr == 'index':
+            return self.is_frame(node.value) or self.is_series(node.value)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in ('zip', 'enumerate'):
+            return any(self._iterates_rows(a) or self.is_series(a) for a in node.args)
+        return self.is_series(node)
+
+    def _is_df(self, node) -> bool:
+        return isinstance(node, ast.Name) and node.id == 'df'
+
+    def visit_Module(self, node):
+        self.df_mutated = _mutates_df(node)
+        return self.generic_visit(node)
+
+    def visit_AugAssign(self, node):
+        if self._is_df(node.target):
+            self.df_changed = True
+        return self.generic_visit(node)
+
+    def visit_Assign(self, node):
+        self.generic_visit(node)
+        for target in node.targets:
+            if self._is_df(target) or isinstance(target, ast.Attribute) and self._is_df(target.value):
+                self.df_changed = True
+            if isinstance(target, ast.Name) and self.is_frame(node.value):
+                self.frames.add(target.id)
+            elif isinstance(target, ast.Subscript) and self.is_frame(target.value):
+                col = _const_str(target.slice)
+                if col is not None:
+                    self.assigned.add(col)
+        return node
+
+    def visit_Compare(self, node):
+        # 'col' in df.columns: the code checks for the column itself
+        if len(node.ops) == 1 and isinstance(node.ops[0], (ast.In, ast.NotIn)) and _const_str(node.left) is not None:
+            self.guarded.add(node.left.value)
+        return self.generic_visit(node)
+
+    def visit_Subscript(self, node):
+        self.generic_visit(node)
+        if isinstance(node.ctx, ast.Load):
+            names = []
+            # Only the upload itself: derived frames (assign, rename, ...) may have other columns
+            if self._is_df(node.value):
+                names = [node.slice] if not isinstance(node.slice, ast.List) else node.slice.elts
+            for name in names:
+                if _const_str(name) is not None:
+                    self.referenced.append(name.value)
+            if (isinstance(node.value, ast.Attribute) and node.value.attr in ('loc', 'iloc', 'at', 'iat')
+                    and self.is_frame(node.value.value) and self.multiplier > 1):
+                self._add(ROW_ACCESS_COST, f"df.{node.value.attr}[...] inside a loop over rows")
+        return node
+
+    def _visit_loop(self, node, target, iterable):
+        rowwise = self._iterates_rows(iterable)
+        if rowwise:
+            kind = iterable.func.attr if isinstance(iterable, ast.Call) and isinstance(iterable.func, ast.Attribute) else 'loop'
+            per_row = {'iterrows': ITERROWS_COST, 'itertuples': ITERTUPLES_COST}.get(kind, LOOP_COST)
+            self._add(self.rows * per_row, f"Python {kind} over {self.rows} rows")
+            self.multiplier *= max(self.rows, 1)
+        return rowwise
+
+    def visit_For(self, node):
+        node.iter = self.visit(node.iter)
+        rowwise = self._visit_loop(node, node.target, node.iter)
+        node.body = [self.visit(n) for n in node.body]
+        if rowwise:
+            self.multiplier //= max(self.rows, 1)
+        node.orelse = [self.visit(n) for n in node.orelse]
+        return node
+
+    def _visit_comprehension(self, node):
+        rowwise = 0
+        for gen in node.generators:
+            gen.iter = self.visit(gen.iter)
+            rowwise += self._visit_loop(gen, gen.target, gen.iter)
+        for field in ('elt', 'key', 'value'):
+            if getattr(node, field, None) is not None:
+                setattr(node, field, self.visit(getattr(node, field)))
+        for gen in node.generators:
+            gen.ifs = [self.visit(i) for i in gen.ifs]
+        for _ in range(rowwise):
+            self.multiplier //= max(self.rows, 1)
+        return node
+
+    visit_ListComp = visit_SetComp = visit_GeneratorExp = visit_DictComp = _visit_comprehension
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        func = node.func
+        if not isinstance(func, ast.Attribute):
+            return node
+        if self._is_df(func.value) and (func.attr == 'insert' or isinstance(_keyword(node, 'inplace'), ast.Constant)
+                                        and _keyword(node, 'inplace').value):
+            self.df_changed = True
+        if func.attr in ('apply', 'map') and node.args:
+            return self._visit_apply(node)
+        if func.attr == 'merge':
+            if self.is_frame(func.value) and node.args:
+                self._visit_merge(node, func.value, node.args[0])
+            elif isinstance(func.value, ast.Name) and func.value.id == 'pd' and len(node.args) >= 2:
+                self._visit_merge(node, node.args[0], node.args[1])
+        elif isinstance(func.value, ast.Attribute) and func.value.attr == 'str':
+            return self._visit_str(node)
+        return node
+
+    def visit_FunctionDef(self, node):
+        self.functions.add(node.name)
+        return self.generic_visit(node)
+
+    def _visit_apply(self, node):
+        recv = node.func.value
+        rowwise = self.is_frame(recv) and node.func.attr == 'apply' and _is_rowwise(node)
+        series = not rowwise and self.is_series(recv)
+        if not (rowwise or series):
+            return node
+        fn = node.args[0]
+        # map({...}) / map(other_series) are vectorized lookups already
+        if not (isinstance(fn, ast.Lambda) or isinstance(fn, ast.Name) and (fn.id in self.functions or fn.id in _CALLABLE_BUILTINS)):
+            return node
+        extra = [k for k in node.keywords if k.arg != 'axis']
+        plain = not extra and (len(node.args) == 1 or rowwise and len(node.args) == 2)
+        replacement = vectorize_lambda(fn, recv, rowwise, self.columns, self.null_free(recv)) if plain else None
+        if replacement is not None:
+            before = ast.unparse(node)
+            after = ast.unparse(replacement)
+            cost = self.rows * (ROW_APPLY_COST if rowwise else ELEMENT_APPLY_COST) * self.multiplier
+            self.rewrites.append(f"{before} -> {after} (saves ~{cost:.1f}s)")
+            return ast.copy_location(replacement, node)
+        if rowwise:
+            self._add(self.rows * ROW_APPLY_COST, f"row-wise apply over {self.rows} rows")
+        else:
+            self._add(self.rows * ELEMENT_APPLY_COST, f"element-wise {node.func.attr} with a Python function")
+        return node
+
+    def _visit_str(self, node):
+        series = node.func.value.value
+        col = self.column_of(series)
+        if col is None:
+            return node
+        if col in self.object_columns:
+            self._add(self.rows * OBJECT_STR_COST, f".str.{node.func.attr} on object column '{col}'")
+        pattern = _const_str(node.args[0]) if node.args else None
+        # A literal pattern needs no regex engine
+        if (node.func.attr == 'contains' and pattern is not None and not _REGEX_META.search(pattern)
+                and _keyword(node, 'regex') is None and len(node.args) == 1):
+            node.keywords.append(ast.keyword(arg='regex', value=ast.Constant(False)))
+            self.rewrites.append(f"{ast.unparse(series)}.str.contains({pattern!r}) -> literal match (regex=False)")
+        return node
+
+    def _visit_merge(self, node, left, right):
+        if _keyword(node, 'validate') is not None:
+            return
+        how = _const_str(_keyword(node, 'how'))
+        right_rows = self.rows if self.is_frame(right) else None
+        if how == 'cross':
+            if right_rows is not None:
+                out = self.rows * right_rows
+                self._add(out * MERGE_ROW_COST, f"cross merge producing {out} rows")
+            return
+        on = _keyword(node, 'on')
+        key = _const_str(on) if on is not None else None
+        if key is None or right_rows is None or _root(left) != _root(right):
+            return
+        # Self-merge on a key: every value pairs with each of its duplicates
+        counts = self.key_counts(key)
+        if counts:
+            out = sum(c * c for c in counts)
+            if out > self.rows:
+                self._add(out * MERGE_ROW_COST, f"self-merge on '{key}' producing ~{out} rows")
+
+
+def frame_has_nulls(df: pd.DataFrame) -> Callable:
+    """
+    Whether a column of df has missing values (unknown columns count as having them).
+    """
+    def has_nulls(col):
+        if col is None or col not in df.columns or isinstance(df[col], pd.DataFrame):
+            return True
+        return bool(df[col].isna().any())
+    return has_nulls
+
+
+def _mutates_df(tree) -> bool:
+    """
+    Whether the code assigns to df or its columns or changes it in place, anywhere.
+    """
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Name, ast.Subscript, ast.Attribute)) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            if _root(node) == 'df':
+                return True
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and _root(node.func.value) == 'df':
+            inplace = _keyword(node, 'inplace')
+            if node.func.attr == 'insert' or isinstance(inplace, ast.Constant) and inplace.value:
+                return True
+    return False
+
+
+def frame_key_counts(df: pd.DataFrame, summary=None) -> Callable:
+    """
+    Value counts of a column for merge-size estimates: from the file summary
+    when it has them, else computed on the frame.
+    """
+    def counts(col):
+        col_summary = summary.get(col) if summary is not None else None
+        if col_summary is not None and not col_summary.truncated:
+            return [c for _, c in col_summary.value_counts]
+        if col not in df.columns or isinstance(df[col], pd.DataFrame):
+            return None
+        return df[col].value_counts().tolist()
+    return counts
+
+
+class CodeAnalyzer:
+    """
+    Static check of LLM-generated code before it runs.
+
+    Parses the code, rewrites row-wise / element-wise apply of simple lambdas
+    into vectorized expressions and literal .str.contains into non-regex
+    matching, estimates the cost of what remains (Python loops over rows,
+    unbounded merges, object-dtype string ops) from the frame's row count,
+    and rejects code estimated to exceed the budget in seconds.
+    """
+    def __init__(self, budget: float):
+        self.budget = budget
+        self.analyzed = 0
+        self.rewritten = 0
+        self.rejected = 0
+
+    def analyze(self, code: str, df: pd.DataFrame, summary=None) -> Analysis:
+        """
+        Analyze code that will run against df. Raises CodeRejected over budget and
+        SyntaxError for code that does not parse.
+        """
+        self.analyzed += 1
+        tree = ast.parse(code)
+        columns = set(df.columns)
+        object_columns = {c for c, dtype in df.dtypes.items() if dtype == object}
+        analyzer = _Analyzer(len(df), columns, object_columns, frame_key_counts(df, summary), frame_has_nulls(df))
+        tree = analyzer.visit(tree)
+        if analyzer.cost > self.budget:
+            self.rejected += 1
+            raise CodeRejected(
+                f"Query rejected: estimated {analyzer.cost:.0f}s on {len(df)} rows "
+                f"(limit {self.budget:g}s): {'; '.join(analyzer.findings)}", analyzer.cost,
+            )
+        if analyzer.rewrites:
+            self.rewritten += 1
+            code = ast.unparse(ast.fix_missing_locations(tree))
+        missing = [] if analyzer.df_changed else [
+            c for c in dict.fromkeys(analyzer.referenced)
+            if c not in columns and c not in analyzer.assigned and c not in analyzer.guarded]
+        return Analysis(code, analyzer.rewrites, analyzer.findings, analyzer.cost, missing)
+
+    def stats(self) -> dict:
+        return {'analyzed': self.analyzed, 'rewritten': self.rewritten, 'rejected': self.rejected}
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+logger = logging.getLogger("AI_DATA_BOT")
+
+
+def normalize_question(question: str) -> str:
+    """
+    Canonical form of a user question: case, whitespace, 'ё' and trailing punctuation don't matter.
+    """
+    q = unicodedata.normalize('NFKC', str(question)).lower().replace('ё', 'е')
+    q = re.sub(r'\s+', ' ', q).strip()
+    return q.rstrip(' ?!.;:')
+
+
+def schema_key(columns: Iterable) -> str:
+    """
+    Hash of the column list the LLM saw in its prompt.
+    """
+    joined = '\x1f'.join(str(c) for c in columns)
+    return hashlib.sha1(joined.encode('utf-8')).hexdigest()
+
+
+class CodeCache:
+    """
+    Maps (normalized question, column schema) to LLM-generated code.
+    Bounded LRU with TTL, persisted as JSON so it survives restarts. Changes are written
+    by a timer thread at most once per save_delay seconds, never by the caller;
+    flush() writes pending changes at once (on shutdown).
+    """
+    def __init__(self, path: Optional[str], ttl: float, max_entries: int, save_delay: float = 2.0):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.save_delay = save_delay
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._timer = None
+        self._dirty = False
+        self.saves = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self._load()
+
+    @staticmethod
+    def make_key(question: str, columns: Iterable) -> str:
+        return schema_key(columns) + ':' + normalize_question(question)
+
+    def get(self, question: str, columns: Iterable) -> Optional[str]:
+        key = self.make_key(question, columns)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry['created'] > self.ttl:
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry['code']
+
+    def put(self, question: str, columns: Iterable, code: str) -> None:
+        key = self.make_key(question, columns)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = {'code': code, 'created': time.time()}
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._schedule_save()
+
+    def discard(self, question: str, columns: Iterable) -> None:
+        key = self.make_key(question, columns)
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._schedule_save()
+
+    def _schedule_save(self) -> None:
+        # Called under the lock; one pending timer covers every change until it fires
+        if not self.path:
+            return
+        self._dirty = True
+        if self._timer is None:
+            self._timer = threading.Timer(self.save_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self) -> None:
+        """
+        Write pending changes now.
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return
+            self._dirty = False
+            snapshot = dict(self._entries)
+        with self._write_lock:
+            self._save(snapshot)
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception:
+            logger.warning(f"Could not read code cache {self.path}", exc_info=True)
+            return
+        now = time.time()
+        for key, entry in data.items():
+            if now - entry.get('created', 0) <= self.ttl:
+                self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _save(self, entries: dict):
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+            self.saves += 1
+        except Exception:
+            logger.warning(f"Could not write code cache {self.path}", exc_info=True)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'expired': self.expired,
+            'saves': self.saves,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,176 @@
+import re
+import unicodedata
+from collections import defaultdict
+from difflib import get_close_matches
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Semantic roles used by the built-in buttons and the question parser, and the words (en/ru) that name them
+ROLE_ALIASES = {
+    'gender': ('gender', 'sex', 'пол'),
+    'manager': ('manager', 'менеджер'),
+    'city': ('city', 'город'),
+    'age': ('age', 'возраст'),
+}
+# Button roles also fall back to substring matches (the original button rule);
+# 'age' would otherwise match columns like 'manager'
+SUBSTRING_ROLES = ('gender', 'manager', 'city')
+
+# relevance(): question words shorter than this are ignored, longer ones must share this
+# fraction of their trigrams with a column name to count
+RELEVANCE_MIN_WORD = 4
+RELEVANCE_MIN_SHARE = 0.6
+
+_TRANSLIT = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ж': 'zh', 'з': 'z',
+    'и': 'i', 'й': 'i', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p',
+    'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch',
+    'ш': 'sh', 'щ': 'sch', 'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+})
+
+
+def normalize_name(name) -> str:
+    """
+    Lowercase, NFKC, 'ё' -> 'е', punctuation/underscores collapsed to single spaces.
+    """
+    s = unicodedata.normalize('NFKC', str(name)).lower().replace('ё', 'е')
+    return re.sub(r'[\W_]+', ' ', s).strip()
+
+
+def translit(name: str) -> str:
+    return name.translate(_TRANSLIT)
+
+
+def _trigrams(s: str) -> set:
+    s = f"  {s} "
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+class ColumnIndex:
+    """
+    Column-resolution index built once per upload.
+
+    Maps semantic roles (gender/manager/city/age) and normalized or transliterated
+    spellings to real column names, and answers "did you mean" queries from a
+    trigram index so only a handful of candidates go through difflib.
+    """
+    def __init__(self, columns: Iterable):
+        self.columns = list(columns)
+        self._by_name = {}
+        self._trigrams = defaultdict(set)
+        for pos, col in enumerate(self.columns):
+            norm = normalize_name(col)
+            for variant in {norm, translit(norm)}:
+                self._by_name.setdefault(variant, col)
+                for gram in _trigrams(variant):
+                    self._trigrams[gram].add(pos)
+        self._roles = {role: self._match_role(aliases, role in SUBSTRING_ROLES)
+                       for role, aliases in ROLE_ALIASES.items()}
+
+    def _match_role(self, aliases, substring: bool = True) -> Optional[object]:
+        variants = set()
+        for alias in aliases:
+            variants.update({alias, translit(alias)})
+        # Best tier wins: exact name, then whole word, then substring (the original button rule)
+        exact = word = sub = None
+        for col in self.columns:
+            norm = normalize_name(col)
+            names = (norm, translit(norm))
+            if exact is None and any(n in variants for n in names):
+                exact = col
+            if word is None and any(v in n.split() for n in names for v in variants):
+                word = col
+            if substring and sub is None and any(v in n for n in names for v in variants):
+                sub = col
+        return next((c for c in (exact, word, sub) if c is not None), None)
+
+    def resolve(self, role: str):
+        """
+        Column playing the given role (see ROLE_ALIASES), or None.
+        """
+        return self._roles.get(role)
+
+    def lookup(self, name):
+        """
+        Real column for a name typed loosely (case, punctuation, translit), or None.
+        """
+        if name in self.columns:
+            return name
+        norm = normalize_name(name)
+        return self._by_name.get(norm) or self._by_name.get(translit(norm))
+
+    def suggest(self, name, n: int = 3, cutoff: float = 0.6) -> List:
+        """
+        Closest column names for a missing one.
+        """
+        norm = normalize_name(name)
+        scores = defaultdict(int)
+        for variant in {norm, translit(norm)}:
+            for gram in _trigrams(variant):
+                for pos in self._trigrams.get(gram, ()):
+                    scores[pos] += 1
+        candidates = [self.columns[pos] for pos, _ in
+                      sorted(scores.items(), key=lambda item: -item[1])[:max(20, n * 5)]]
+        by_norm = {}
+        for col in candidates:
+            by_norm.setdefault(normalize_name(col), col)
+        matches = get_close_matches(norm, list(by_norm), n=n, cutoff=cutoff)
+        return [by_norm[m] for m in matches]
+
+    def relevance(self, text: str) -> Dict[object, float]:
+        """
+        Columns free text refers to, scored: named outright +3, through a role word
+        (e.g. 'город' for the city column) +2, through a word sharing most of its
+        trigrams with the column name (other word forms, typos) +share.
+        """
+        scores = defaultdict(float)
+        for col, _, _ in self.find_in_text(text):
+            scores[col] += 3
+        words = set(normalize_name(text).split())
+        for role, aliases in ROLE_ALIASES.items():
+            col = self._roles.get(role)
+            if col is not None and words & {v for a in aliases for v in (a, translit(a))}:
+                scores[col] += 2
+        for word in words:
+            if len(word) < RELEVANCE_MIN_WORD:
+                continue
+            best = {}
+            for variant in {word, translit(word)}:
+                grams = _trigrams(variant)
+                shared = defaultdict(int)
+                for gram in grams:
+                    for pos in self._trigrams.get(gram, ()):
+                        shared[pos] += 1
+                for pos, n in shared.items():
+                    best[pos] = max(best.get(pos, 0), n / len(grams))
+            for pos, share in best.items():
+                if share >= RELEVANCE_MIN_SHARE:
+                    scores[self.columns[pos]] += share
+        return dict(scores)
+
+    def find_in_text(self, text: str, max_words: int = 8) -> List[Tuple[object, int, int]]:
+        """
+        Columns mentioned in free text as (column, start, end) spans over
+        normalize_name(text).split(); longest match wins, left to right.
+        """
+        return self.find_in_tokens(normalize_name(text).split(), max_words)
+
+    def find_in_tokens(self, tokens: List[Optional[str]], max_words: int = 8) -> List[Tuple[object, int, int]]:
+        """
+        Same as find_in_text over pre-split normalized words; None entries
+        (numbers, quoted strings, operators) never take part in a match.
+        """
+        found = []
+        i = 0
+        while i < len(tokens):
+            for j in range(min(len(tokens), i + max_words), i, -1):
+                if None in tokens[i:j]:
+                    continue
+                phrase = ' '.join(tokens[i:j])
+                col = self._by_name.get(phrase) or self._by_name.get(translit(phrase))
+                if col is not None:
+                    found.append((col, i, j))
+                    i = j
+                    break
+            else:
+                i += 1
+        return found
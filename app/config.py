@@ -6,3 +6,95 @@ load_dotenv()
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+
+# Parsed DataFrame cache budget (all users together)
+DF_CACHE_MAX_BYTES = int(os.getenv("DF_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+# Worker processes for parsing/analytics/expert code (0 = run in a thread)
+WORKER_COUNT = int(os.getenv("WORKER_COUNT", str(min(4, os.cpu_count() or 1))))
+JOB_TIMEOUT = float(os.getenv("JOB_TIMEOUT", "120"))
+EXPERT_CODE_TIMEOUT = float(os.getenv("EXPERT_CODE_TIMEOUT", "30"))
+
+# LLM client (expert mode)
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_PER_USER = int(os.getenv("LLM_PER_USER", "1"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+# Estimated tokens the column list in the expert prompt may take; the columns most relevant
+# to the question come first, each with its type and a few sample values
+LLM_SCHEMA_TOKEN_BUDGET = int(os.getenv("LLM_SCHEMA_TOKEN_BUDGET", "600"))
+# Seconds between edits of the "writing code" status message shown while the LLM streams
+LLM_PROGRESS_INTERVAL = float(os.getenv("LLM_PROGRESS_INTERVAL", "1.5"))
+# LLM_STUB=1 serves canned completions locally for offline load tests
+LLM_STUB = os.getenv("LLM_STUB", "0") == "1"
+LLM_STUB_PORT = int(os.getenv("LLM_STUB_PORT", "8089"))
+LLM_STUB_DELAY = float(os.getenv("LLM_STUB_DELAY", "0.5"))
+LLM_STUB_CHUNK_DELAY = float(os.getenv("LLM_STUB_CHUNK_DELAY", "0.02"))
+
+# Cache of LLM-generated code for repeated expert questions
+CODE_CACHE_PATH = os.getenv("CODE_CACHE_PATH", "app/data/code_cache.json")
+CODE_CACHE_TTL = float(os.getenv("CODE_CACHE_TTL_HOURS", "168")) * 3600
+CODE_CACHE_MAX_ENTRIES = int(os.getenv("CODE_CACHE_MAX_ENTRIES", "5000"))
+
+# On-disk columnar copies of uploads (needs pyarrow)
+UPLOAD_STORE_DIR = os.getenv("UPLOAD_STORE_DIR", "app/data/uploads")
+UPLOAD_RETENTION = float(os.getenv("UPLOAD_RETENTION_HOURS", "72")) * 3600
+UPLOAD_DISK_QUOTA_BYTES = int(os.getenv("UPLOAD_DISK_QUOTA_MB", "2048")) * 1024 * 1024
+
+# CSVs larger than this are ingested in chunks instead of loaded whole
+CSV_STREAM_THRESHOLD_BYTES = int(os.getenv("CSV_STREAM_THRESHOLD_MB", "50")) * 1024 * 1024
+CSV_CHUNK_ROWS = int(os.getenv("CSV_CHUNK_ROWS", "100000"))
+SPOOL_MAX_MEMORY_BYTES = int(os.getenv("SPOOL_MAX_MEMORY_MB", "16")) * 1024 * 1024
+
+# Upload sessions (raw bytes kept per user when there is no on-disk copy)
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_MB", "256")) * 1024 * 1024
+SESSION_USER_MAX_BYTES = int(os.getenv("SESSION_USER_MAX_MB", "100")) * 1024 * 1024
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_HOURS", "24")) * 3600
+SESSION_SPILL_DIR = os.getenv("SESSION_SPILL_DIR") or None
+
+# Output of large results: 'auto' picks by shape and size; tables can be fixed to
+# text/pages/csv/xlsx/pdf, text to text/pages/txt/pdf
+OUTPUT_TABLE_FORMAT = os.getenv("OUTPUT_TABLE_FORMAT", "auto")
+OUTPUT_TEXT_FORMAT = os.getenv("OUTPUT_TEXT_FORMAT", "auto")
+# Paginated results kept for the prev/next buttons
+PAGINATION_MAX_RESULTS = int(os.getenv("PAGINATION_MAX_RESULTS", "1000"))
+PAGINATION_MAX_BYTES = int(os.getenv("PAGINATION_MAX_MB", "256")) * 1024 * 1024
+PAGINATION_TTL = float(os.getenv("PAGINATION_TTL_HOURS", "24")) * 3600
+
+# Outgoing message pacing (Telegram flood limits)
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "30"))
+SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", "1"))
+SEND_GROUP_PER_MINUTE = float(os.getenv("SEND_GROUP_PER_MINUTE", "20"))
+SEND_BURST = int(os.getenv("SEND_BURST", "3"))
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "5"))
+
+# Sandbox processes for LLM-generated expert code (0 = run in a thread, no limits but wall time)
+SANDBOX_WORKERS = int(os.getenv("SANDBOX_WORKERS", "2"))
+SANDBOX_DATA_DIR = os.getenv("SANDBOX_DATA_DIR") or None
+SANDBOX_CPU_SECONDS = float(os.getenv("SANDBOX_CPU_SECONDS", "20"))
+SANDBOX_MEMORY_BYTES = int(os.getenv("SANDBOX_MEMORY_MB", "2048")) * 1024 * 1024
+SANDBOX_RESULT_MAX_BYTES = int(os.getenv("SANDBOX_RESULT_MAX_MB", "64")) * 1024 * 1024
+
+# Generated code estimated to run longer than this is rejected before execution
+CODE_COST_BUDGET = float(os.getenv("CODE_COST_BUDGET_SECONDS", "10"))
+
+# Prometheus metrics endpoint (GET /metrics); 0 disables it. Bound to localhost unless set otherwise
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# Updates handled at once per process (python-telegram-bot processes them one by one by default)
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "32"))
+# Updates one user may have queued or running; more get a "busy" reply instead of holding a slot
+USER_QUEUE_DEPTH = int(os.getenv("USER_QUEUE_DEPTH", "3"))
+
+# Webhook mode: set WEBHOOK_URL (public https URL ending in WEBHOOK_PATH) to serve updates over
+# HTTP instead of long polling. WEBHOOK_WORKERS bot processes sit behind the front, each with
+# its own WORKER_COUNT parse workers and SANDBOX_WORKERS sandboxes
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT") or os.getenv("PORT") or "8443")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "2"))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
@@ -0,0 +1,654 @@
+import operator
+import re
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.analytics import unique_values_text, value_counts_text
+from app.columns import ColumnIndex, normalize_name
+
+# Vocabulary entries ending in '*' match by prefix (Russian inflections)
+STAT_WORDS = {
+    'nulls': ('null', 'nulls', 'missing', 'empty', 'nan', 'nans', 'пуст*', 'пропуск*', 'пропущ*', 'null*'),
+    'max': ('max', 'maximum', 'highest', 'largest', 'biggest', 'максимал*', 'максимум', 'наибольш*', 'макс'),
+    'min': ('min', 'minimum', 'lowest', 'smallest', 'минимал*', 'минимум', 'наименьш*', 'мин'),
+    'mean': ('mean', 'average', 'avg', 'средн*'),
+    'median': ('median', 'медиан*'),
+    'sum': ('sum', 'сумм*'),
+    'std': ('std', 'stdev', 'standard', 'deviation', 'стандартн*', 'отклонени*'),
+    'var': ('variance', 'var', 'дисперси*'),
+    'mode': ('mode', 'мода', 'моду'),
+    'range': ('range', 'диапазон*'),
+    'describe': ('statistics', 'stats', 'describe', 'статистик*'),
+}
+UNIQUE_WORDS = ('unique', 'distinct', 'different', 'possible', 'уникальн*', 'различн*', 'разн*')
+FREQUENT_WORDS = ('frequent', 'frequently', 'frequency', 'common', 'popular', 'often', 'част*', 'чаще', 'популярн*')
+LEAST_WORDS = ('least', 'rarest', 'наименее', 'реже', 'редк*')
+TOP_WORDS = ('top', 'топ')
+COUNT_WORDS = ('how', 'many', 'number', 'count', 'total', 'times', 'сколько', 'количеств*', 'число')
+ROW_WORDS = ('rows', 'row', 'records', 'entries', 'строк*', 'записей', 'записи')
+COLUMN_WORDS = ('columns', 'столбцы', 'столбцов', 'колонок')
+TYPE_WORDS = ('types', 'dtypes', 'типы', 'типов')
+GROUP_WORDS = ('by', 'per', 'each', 'every', 'по', 'каждому', 'каждой', 'каждом', 'разрезе')
+DISTRIBUTION_WORDS = ('distribution', 'breakdown', 'распределени*')
+SHARE_WORDS = ('percent', 'percentage', 'share', 'proportion', 'fraction', 'доля', 'долю', 'процент*')
+HEAD_WORDS = ('first', 'head', 'первые')
+# Nouns that only name what is being counted ("how many clients ...")
+SUBJECT_WORDS = ('clients', 'client', 'customers', 'deals', 'клиент*', 'сделок', 'сделки')
+FILLER_WORDS = (
+    'what', 'whats', 'is', 'are', 'the', 'a', 'an', 'of', 'in', 'on', 'show', 'me', 'calculate',
+    'compute', 'find', 'get', 'give', 'tell', 'display', 'print', 'please', 'value', 'values',
+    'column', 'field', 'file', 'table', 'data', 'dataset', 'sheet', 'there', 'do', 'does', 'we', 'have',
+    'has', 'list', 'all', 'their', 'its', 'and', 'for', 'where', 'with', 'who', 'that', 'which', 'than',
+    'to', 'among', 'most', 'appear', 'appears', 'years', 'year', 'old', 'as',
+    'какой', 'какая', 'какое', 'каково', 'каков', 'какие', 'покажи', 'показать', 'выведи', 'посчитай',
+    'подсчитай', 'найди', 'вычисли', 'скажи', 'перечисли', 'значение', 'значения', 'значений', 'в', 'во',
+    'столбце', 'столбца', 'столбец', 'столбцу', 'колонке', 'колонки', 'поле', 'поля', 'полем', 'файле',
+    'файла', 'таблице', 'есть', 'это', 'всего', 'все', 'всех', 'весь', 'данных', 'и', 'у', 'с', 'для',
+    'из', 'где', 'которых', 'которые', 'имеют', 'имеет', 'лет', 'года', 'среди', 'самый', 'самая',
+    'самое', 'самые', 'наиболее', 'чем', 'вариантов', 'встречаются', 'встречается',
+)
+# Words that name a column by its role (see app.columns.ROLE_ALIASES)
+ROLE_WORDS = {
+    'gender': ('gender', 'sex', 'пол'),
+    'manager': ('manager', 'managers', 'менеджер*'),
+    'city': ('city', 'город*'),
+    'age': ('age', 'возраст*'),
+}
+# "older than 50" / "младше 30": comparisons on the age column
+AGE_WORDS = {'>': ('older', 'over', 'above', 'старше'), '<': ('younger', 'under', 'below', 'младше')}
+COMPARE_WORDS = {
+    '>': ('more', 'greater', 'higher', 'above', 'over', 'exceeds', 'больше', 'более', 'выше', 'свыше'),
+    '<': ('less', 'fewer', 'lower', 'below', 'under', 'меньше', 'менее', 'ниже'),
+    '==': ('equals', 'equal', 'равно', 'равен', 'равна'),
+}
+IS_WORDS = ('is', 'are', 'was', 'were')
+NOT_WORDS = ('not', 'не')
+CONTAINS_WORDS = ('contains', 'contain', 'mentions', 'mention', 'mentioning', 'содерж*', 'упомина*')
+
+STAT_LABELS = {
+    'count': {'en': "Non-empty values in {col}", 'ru': "Заполненных значений в {col}"},
+    'nulls': {'en': "Empty values in {col}", 'ru': "Пустых значений в {col}"},
+    'n_unique': {'en': "Unique values in {col}", 'ru': "Уникальных значений в {col}"},
+    'max': {'en': "Max of {col}", 'ru': "Максимум {col}"},
+    'min': {'en': "Min of {col}", 'ru': "Минимум {col}"},
+    'mean': {'en': "Mean of {col}", 'ru': "Среднее {col}"},
+    'median': {'en': "Median of {col}", 'ru': "Медиана {col}"},
+    'sum': {'en': "Sum of {col}", 'ru': "Сумма {col}"},
+    'std': {'en': "Standard deviation of {col}", 'ru': "Стандартное отклонение {col}"},
+    'var': {'en': "Variance of {col}", 'ru': "Дисперсия {col}"},
+    'mode': {'en': "Most frequent {col}", 'ru': "Самое частое значение {col}"},
+    'least': {'en': "Least frequent {col}", 'ru': "Самое редкое значение {col}"},
+}
+ANSWERS = {
+    'rows': {'en': "Rows in the file: {value}", 'ru': "Строк в файле: {value}"},
+    'matched': {'en': "Matching rows: {value}", 'ru': "Подходящих строк: {value}"},
+    'n_columns': {'en': "Columns in the file: {value}", 'ru': "Столбцов в файле: {value}"},
+    'columns': {'en': "File columns:", 'ru': "Столбцы файла:"},
+    'dtypes': {'en': "Column types:", 'ru': "Типы столбцов:"},
+    'head': {'en': "First {n} rows:", 'ru': "Первые {n} строк:"},
+    'share': {'en': "Share of matching rows: {value}% ({matched} of {total})",
+              'ru': "Доля подходящих строк: {value}% ({matched} из {total})"},
+    'unique': {'en': "Unique values of {col}:", 'ru': "Уникальные значения {col}:"},
+    'counts': {'en': "Count by {col}:", 'ru': "Количество по {col}:"},
+    'top': {'en': "Top {n} values of {col}:", 'ru': "Топ-{n} значений {col}:"},
+    'group': {'en': "{stat} by {by}:", 'ru': "{stat} по {by}:"},
+    'filter': {'en': "Filter: {conditions} ({matched} rows)", 'ru': "Фильтр: {conditions} (строк: {matched})"},
+    'and': {'en': " and ", 'ru': " и "},
+    'isna': {'en': "is empty", 'ru': "пусто"},
+    'notna': {'en': "is not empty", 'ru': "не пусто"},
+    'contains': {'en': "contains", 'ru': "содержит"},
+}
+
+NUMERIC_STATS = ('min', 'max', 'mean', 'median', 'sum', 'std', 'var')
+GROUP_STATS = ('count', 'nulls', 'n_unique') + NUMERIC_STATS
+DESCRIBE_NUMERIC = ('count', 'nulls', 'n_unique', 'min', 'max', 'mean', 'median', 'std')
+DESCRIBE_TEXT = ('count', 'nulls', 'n_unique', 'mode')
+DEFAULT_TOP = 10
+MAX_HEAD_ROWS = 50
+# Ties for mode / least frequent shown in one answer
+MAX_TIED_VALUES = 10
+
+_COMPARE = {'>': operator.gt, '<': operator.lt, '>=': operator.ge, '<=': operator.le, '==': operator.eq}
+_TOKEN_RE = re.compile(
+    r'"(?P<dq>[^"]*)"|«(?P<gq>[^»]*)»|(?<!\w)\'(?P<sq>[^\']*)\''
+    r'|(?P<op>[<>!]=|==|[<>=])'
+    r'|(?P<num>(?<![\w.])\d+(?:_\d+)*(?:[.,]\d+)?(?!\w))'
+    r'|(?P<word>\w+)'
+)
+
+
+class Unsupported(Exception):
+    """
+    The intent cannot be answered deterministically (wrong column type, truncated summary);
+    the question goes to the LLM instead.
+    """
+
+
+def _matches(token: str, words) -> bool:
+    for word in words:
+        if word.endswith('*'):
+            if token.startswith(word[:-1]):
+                return True
+        elif token == word:
+            return True
+    return False
+
+
+def format_value(value) -> str:
+    if isinstance(value, float):
+        if value != value:
+            return '—'
+        if value.is_integer():
+            return str(int(value))
+        return f"{value:.4f}".rstrip('0').rstrip('.')
+    return str(value)
+
+
+def _parse_number(text: str):
+    number = float(text.replace('_', '').replace(',', '.'))
+    return int(number) if number.is_integer() and '.' not in text and ',' not in text else number
+
+
+def _is_number(series: pd.Series) -> bool:
+    return pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+
+
+def _text_mask(raw: pd.Series, predicate) -> pd.Series:
+    """
+    predicate(str values) evaluated once per distinct value and mapped back to rows;
+    null cells never match.
+    """
+    try:
+        codes, uniques = pd.factorize(raw, use_na_sentinel=True)
+    except TypeError:
+        codes, uniques = pd.factorize(raw.astype(str).where(raw.notna()), use_na_sentinel=True)
+    hits = predicate(pd.Series(uniques, dtype=object).astype(str)).to_numpy(dtype=bool)
+    return pd.Series(np.append(hits, False)[codes], index=raw.index)
+
+
+class Condition:
+    """
+    One row filter: column, operator ('>', '<', '>=', '<=', '==', '!=', 'isna', 'notna',
+    'contains') and value.
+    """
+    def __init__(self, column, op: str, value=None):
+        self.column = column
+        self.op = op
+        self.value = value
+
+    def __repr__(self):
+        return f"Condition({self.column!r}, {self.op!r}, {self.value!r})"
+
+    def describe(self, lang: str = 'en') -> str:
+        if self.op in ('isna', 'notna'):
+            return f"{self.column} {ANSWERS[self.op][lang]}"
+        value = f"'{self.value}'" if isinstance(self.value, str) else format_value(self.value)
+        op = ANSWERS['contains'][lang] if self.op == 'contains' else self.op
+        return f"{self.column} {op} {value}"
+
+    def mask(self, df: pd.DataFrame, typed: pd.DataFrame) -> pd.Series:
+        """
+        Boolean row mask. Ordering comparisons need a numeric column (converted values
+        for numeric-like text); equality on text columns is case-insensitive.
+        """
+        raw = df[self.column]
+        if isinstance(raw, pd.DataFrame):
+            raise Unsupported(f"duplicate column {self.column!r}")
+        if self.op == 'isna':
+            return raw.isna()
+        if self.op == 'notna':
+            return raw.notna()
+        if self.op == 'contains':
+            return _text_mask(raw, lambda values: values.str.contains(str(self.value), case=False, regex=False))
+        values = typed[self.column]
+        if _is_number(values):
+            try:
+                number = self.value if not isinstance(self.value, str) else _parse_number(self.value)
+            except ValueError:
+                raise Unsupported(f"{self.value!r} is not a number")
+            if self.op == '!=':
+                return values.notna() & (values != number)
+            return _COMPARE[self.op](values, number)
+        if self.op not in ('==', '!='):
+            raise Unsupported(f"{self.column!r} is not numeric")
+        target = format_value(self.value).casefold()
+        equal = _text_mask(raw, lambda values: values.str.strip().str.casefold() == target)
+        return equal if self.op == '==' else raw.notna() & ~equal
+
+
+class Intent:
+    """
+    A parsed question.
+
+    op is one of 'rows' (row count, or matching rows with filters), 'n_columns', 'columns',
+    'dtypes', 'head', 'share', 'stats' (scalar stats of one column), 'unique', 'counts',
+    'top' or 'group' (one stat of a column per value of another).
+    """
+    def __init__(self, op: str, column=None, stats=(), by=None, n: Optional[int] = None, filters=()):
+        self.op = op
+        self.column = column
+        self.stats = tuple(stats)
+        self.by = by
+        self.n = n
+        self.filters = list(filters)
+
+    def __repr__(self):
+        parts = [repr(self.op)]
+        for name in ('column', 'stats', 'by', 'n', 'filters'):
+            value = getattr(self, name)
+            if value:
+                parts.append(f"{name}={value!r}")
+        return f"Intent({', '.join(parts)})"
+
+
+def _tokenize(question: str, index: ColumnIndex) -> list:
+    """
+    (kind, value) tokens: 'word' (normalized), 'num', 'str' (quoted), 'op' and 'col'
+    for spans naming a column, either literally or by role ("возраст" -> the age column).
+    """
+    tokens = []
+    for m in _TOKEN_RE.finditer(question):
+        if m.group('word') is not None:
+            tokens.extend(('word', w) for w in normalize_name(m.group('word')).split())
+        elif m.group('num') is not None:
+            tokens.append(('num', m.group('num')))
+        elif m.group('op') is not None:
+            tokens.append(('op', '==' if m.group('op') == '=' else m.group('op')))
+        else:
+            text = next(g for g in (m.group('dq'), m.group('gq'), m.group('sq')) if g is not None)
+            tokens.append(('str', text))
+    # Numbers can be part of a column name ("sales 2023"), strings and operators cannot
+    words = []
+    for kind, value in tokens:
+        norm = normalize_name(value) if kind in ('word', 'num') else ''
+        words.append(norm if norm and ' ' not in norm else None)
+    seq = []
+    pos = 0
+    for col, start, end in index.find_in_tokens(words) + [(None, len(tokens), len(tokens))]:
+        for kind, value in tokens[pos:start]:
+            if kind == 'word':
+                role = next((r for r, aliases in ROLE_WORDS.items() if _matches(value, aliases)), None)
+                if role is not None and index.resolve(role) is not None:
+                    seq.append(('col', index.resolve(role)))
+                    continue
+            seq.append((kind, value))
+        if col is not None:
+            seq.append(('col', col))
+        pos = end
+    return seq
+
+
+def _literal(token):
+    kind, value = token
+    if kind == 'str':
+        return value
+    if kind == 'num':
+        return _parse_number(value)
+    if kind == 'word' and value in ('true', 'false'):
+        return value
+    return None
+
+
+def _parse_condition(seq: list, i: int):
+    """
+    A filter starting at the column token seq[i] ("X > 5", "X is not null", "X = 'a'",
+    "X больше 10", "X mentioning 'b'", "X 'a'"), as (Condition, next position) or (None, i).
+    """
+    column = seq[i][1]
+    j = i + 1
+
+    def at(k):
+        return seq[k] if k < len(seq) else (None, None)
+
+    kind, value = at(j)
+    if kind == 'op':
+        literal = _literal(at(j + 1))
+        if literal is None and at(j + 1)[0] == 'word':
+            literal = at(j + 1)[1]
+        return (Condition(column, value, literal), j + 2) if literal is not None else (None, i)
+    if kind == 'str':
+        return Condition(column, '==', value), j + 1
+    if kind != 'word':
+        return None, i
+    if _matches(value, IS_WORDS):
+        j += 1
+        kind, value = at(j)
+    negate = kind == 'word' and _matches(value, NOT_WORDS)
+    if negate:
+        j += 1
+        kind, value = at(j)
+    if kind == 'word' and _matches(value, STAT_WORDS['nulls']):
+        return Condition(column, 'notna' if negate else 'isna'), j + 1
+    if kind == 'word' and _matches(value, CONTAINS_WORDS) and at(j + 1)[0] == 'str':
+        return (None, i) if negate else (Condition(column, 'contains', at(j + 1)[1]), j + 2)
+    if kind == 'word':
+        op = next((o for o, words in COMPARE_WORDS.items() if _matches(value, words)), None)
+        if op is not None:
+            j += 1
+            if at(j)[0] == 'word' and at(j)[1] in ('than', 'чем', 'to'):
+                j += 1
+            literal = _literal(at(j))
+            if literal is not None:
+                if negate:
+                    op = {'>': '<=', '<': '>=', '==': '!='}[op]
+                return Condition(column, op, literal), j + 1
+        elif j > i + 1 and not negate and _literal(at(j)) is not None:
+            # "X is 'a'"
+            return Condition(column, '==', _literal(at(j))), j + 1
+    return None, i
+
+
+def parse_question(question: str, index: ColumnIndex) -> Optional[Intent]:
+    """
+    Recognize common aggregate questions (en/ru): stats of a column, unique values,
+    top-N and most frequent values, value counts, grouped stats, row counts with
+    filters. Every word must be understood, otherwise None is returned and the LLM
+    handles the question.
+    """
+    seq = _tokenize(question, index)
+    stats, targets, filters, flags = [], [], [], set()
+    by = None
+    n = None
+    group_next = False
+    i = 0
+    while i < len(seq):
+        kind, value = seq[i]
+        if kind == 'col':
+            condition, end = _parse_condition(seq, i)
+            if condition is not None:
+                filters.append(condition)
+                i = end
+                continue
+            if group_next:
+                if by is not None:
+                    return None
+                by = value
+                group_next = False
+            else:
+                targets.append(value)
+            i += 1
+            continue
+        if kind == 'num' and n is None:
+            n = _parse_number(value)
+            i += 1
+            continue
+        if kind != 'word':
+            return None
+        age_op = next((o for o, words in AGE_WORDS.items() if _matches(value, words)), None)
+        if age_op is not None:
+            j = i + 2 if i + 1 < len(seq) and seq[i + 1] in (('word', 'than'), ('word', 'чем')) else i + 1
+            age = index.resolve('age')
+            if age is None or j >= len(seq) or seq[j][0] != 'num':
+                return None
+            filters.append(Condition(age, age_op, _parse_number(seq[j][1])))
+            i = j + 1
+            continue
+        i += 1
+        if _matches(value, GROUP_WORDS):
+            group_next = True
+        elif _matches(value, COUNT_WORDS):
+            flags.add('count')
+        elif _matches(value, UNIQUE_WORDS):
+            flags.add('unique')
+        elif _matches(value, FREQUENT_WORDS):
+            flags.add('frequent')
+        elif _matches(value, LEAST_WORDS):
+            flags.add('least')
+        elif _matches(value, TOP_WORDS):
+            flags.add('top')
+        elif _matches(value, ROW_WORDS):
+            flags.add('rows')
+        elif _matches(value, COLUMN_WORDS):
+            flags.add('columns')
+        elif _matches(value, TYPE_WORDS):
+            flags.add('types')
+        elif _matches(value, DISTRIBUTION_WORDS):
+            flags.add('distribution')
+        elif _matches(value, SHARE_WORDS):
+            flags.add('share')
+        elif _matches(value, HEAD_WORDS):
+            flags.add('head')
+        elif _matches(value, SUBJECT_WORDS) or _matches(value, FILLER_WORDS):
+            continue
+        else:
+            stat = next((s for s, words in STAT_WORDS.items() if _matches(value, words)), None)
+            if stat is None:
+                return None
+            stats.extend(('min', 'max') if stat == 'range' else (stat,))
+    stats = list(dict.fromkeys(stats))
+    if n is not None and not isinstance(n, int):
+        return None
+    # "сумма по X": a lone grouping column is the target
+    if by is not None and not targets and stats:
+        targets, by = [by], None
+    if len(targets) > 1:
+        return None
+    column = targets[0] if targets else None
+
+    if 'columns' in flags:
+        if stats or column or by or filters or n is not None or flags & {'unique', 'rows'}:
+            return None
+        if 'count' in flags:
+            return Intent('n_columns')
+        return Intent('dtypes' if 'types' in flags else 'columns')
+    if 'head' in flags:
+        if 'rows' not in flags or not n or stats or column or by or filters:
+            return None
+        return Intent('head', n=min(n, MAX_HEAD_ROWS))
+    if 'share' in flags:
+        # "доля клиентов с пустым полем X"
+        if stats == ['nulls'] and column is not None:
+            filters.append(Condition(column, 'isna'))
+            stats, column = [], None
+        if stats or column or by or n is not None or not filters:
+            return None
+        return Intent('share', filters=filters)
+    if flags & {'frequent', 'least', 'top'}:
+        if column is None or by or (stats and stats != ['mode']):
+            return None
+        if 'least' in flags:
+            return Intent('stats', column, ('least',), filters=filters) if n is None and 'top' not in flags else None
+        if 'top' in flags or n is not None:
+            return Intent('top', column, n=n or DEFAULT_TOP, filters=filters)
+        return Intent('stats', column, ('mode',), filters=filters)
+    if 'distribution' in flags or (by is not None and not stats and column is None):
+        target = by if by is not None else column
+        if target is None or stats or (by is not None and column is not None) or n is not None:
+            return None
+        return Intent('counts', target, filters=filters)
+    if n is not None:
+        return None
+    if 'unique' in flags:
+        if 'count' in flags:
+            stats.append('n_unique')
+        elif stats or column is None or by is not None:
+            return None
+        else:
+            return Intent('unique', column, filters=filters)
+    if stats:
+        # "highest number of deals", "average number of X per client": counts of something else
+        if column is None or ('count' in flags and set(stats) & set(NUMERIC_STATS)):
+            return None
+        if by is not None:
+            if len(stats) != 1 or stats[0] not in GROUP_STATS:
+                return None
+            return Intent('group', column, stats, by=by, filters=filters)
+        return Intent('stats', column, stats, filters=filters)
+    if 'count' in flags and column is None and by is None:
+        return Intent('rows', filters=filters)
+    return None
+
+
+def _stat_lines(intent: Intent, numeric: bool, stat_value, lang: str) -> List[str]:
+    stats = []
+    for stat in intent.stats:
+        stats.extend((DESCRIBE_NUMERIC if numeric else DESCRIBE_TEXT) if stat == 'describe' else (stat,))
+    lines = []
+    for stat in dict.fromkeys(stats):
+        value = stat_value(stat)
+        if isinstance(value, list):
+            shown = [format_value(v) for v in value[:MAX_TIED_VALUES]]
+            value = ', '.join(shown) + (', …' if len(value) > MAX_TIED_VALUES else '')
+        else:
+            value = format_value(value)
+        lines.append(f"{STAT_LABELS[stat][lang].format(col=intent.column)}: {value}")
+    return lines
+
+
+def _pairs_text(pairs) -> str:
+    return "\n".join(f"{str(k)}: {format_value(v)}" for k, v in pairs)
+
+
+def _tied(pairs, least: bool) -> list:
+    if not pairs:
+        return []
+    target = min(v for _, v in pairs) if least else max(v for _, v in pairs)
+    return [k for k, v in pairs if v == target]
+
+
+def _lang(lang: str) -> str:
+    return lang if lang in ('en', 'ru') else 'en'
+
+
+def answer_from_summary(intent: Intent, summary, lang: str = 'en') -> Optional[str]:
+    """
+    Answer an intent from the precomputed FileSummary, or None if it does not have the data
+    (filters, grouping, truncated value counts).
+    """
+    lang = _lang(lang)
+    if intent.filters or intent.by is not None:
+        return None
+    if intent.op == 'rows':
+        return ANSWERS['rows'][lang].format(value=summary.rows)
+    if intent.op == 'n_columns':
+        return ANSWERS['n_columns'][lang].format(value=len(summary.names))
+    if intent.op == 'columns':
+        return ANSWERS['columns'][lang] + "\n" + "\n".join(str(c) for c in summary.names)
+    col = summary.get(intent.column)
+    if col is None or intent.op not in ('stats', 'unique', 'counts', 'top'):
+        return None
+    pairs = [(k, v) for k, v in col.value_counts if not pd.isna(k)]
+
+    def stat_value(stat):
+        if stat in ('count', 'nulls', 'n_unique'):
+            return getattr(col, stat)
+        if stat == 'mode' or (stat == 'least' and not col.truncated):
+            return _tied(pairs, stat == 'least')
+        if col.stats is None or stat not in NUMERIC_STATS:
+            raise Unsupported(stat)
+        return col.stats['std'] ** 2 if stat == 'var' else col.stats[stat]
+
+    try:
+        if intent.op == 'stats':
+            return "\n".join(_stat_lines(intent, col.stats is not None, stat_value, lang))
+    except Unsupported:
+        return None
+    if intent.op == 'unique':
+        text = col.unique_values_text()
+        return None if text is None else f"{ANSWERS['unique'][lang].format(col=intent.column)}\n{text}"
+    if intent.op == 'counts':
+        text = col.value_counts_text()
+        return None if text is None else f"{ANSWERS['counts'][lang].format(col=intent.column)}\n{text}"
+    if col.truncated and intent.n > len(pairs):
+        return None
+    header = ANSWERS['top'][lang].format(n=intent.n, col=intent.column)
+    return f"{header}\n{_pairs_text(pairs[:intent.n])}"
+
+
+def answer_from_frame(intent: Intent, df: pd.DataFrame, typed: Optional[pd.DataFrame] = None,
+                      lang: str = 'en') -> Optional[str]:
+    """
+    Answer an intent with direct pandas operations on the cached upload. Value-based
+    answers (counts, unique values, filters on text) use the raw frame, numeric stats
+    and comparisons the typed frame. None means the LLM should handle the question.
+    """
+    lang = _lang(lang)
+    typed = df if typed is None else typed
+    lines = []
+    try:
+        if intent.filters:
+            mask = pd.Series(True, index=df.index)
+            for condition in intent.filters:
+                mask &= condition.mask(df, typed).fillna(False).astype(bool)
+            matched = int(mask.sum())
+            if intent.op == 'share':
+                value = format_value(round(100 * matched / len(df), 2) if len(df) else 0.0)
+                return ANSWERS['share'][lang].format(value=value, matched=matched, total=len(df))
+            if intent.op == 'rows':
+                return ANSWERS['matched'][lang].format(value=matched)
+            conditions = ANSWERS['and'][lang].join(c.describe(lang) for c in intent.filters)
+            lines.append(ANSWERS['filter'][lang].format(conditions=conditions, matched=matched))
+            # Only the columns the answer reads are sliced
+            needed = [c for c in dict.fromkeys((intent.column, intent.by)) if c is not None]
+            if needed:
+                df, typed = df.loc[mask, needed], typed.loc[mask, needed]
+            else:
+                df, typed = df[mask], typed[mask]
+        lines.append(_frame_answer(intent, df, typed, lang))
+    except Unsupported:
+        return None
+    return "\n".join(lines)
+
+
+def _frame_answer(intent: Intent, df: pd.DataFrame, typed: pd.DataFrame, lang: str) -> str:
+    if intent.op == 'rows':
+        return ANSWERS['rows'][lang].format(value=len(df))
+    if intent.op == 'n_columns':
+        return ANSWERS['n_columns'][lang].format(value=len(df.columns))
+    if intent.op == 'columns':
+        return ANSWERS['columns'][lang] + "\n" + "\n".join(str(c) for c in df.columns)
+    if intent.op == 'dtypes':
+        return ANSWERS['dtypes'][lang] + "\n" + _pairs_text(typed.dtypes.items())
+    if intent.op == 'head':
+        table = df.head(intent.n).to_string(max_cols=20, max_colwidth=40)
+        return f"{ANSWERS['head'][lang].format(n=intent.n)}\n{table}"
+    raw = df[intent.column]
+    values = typed[intent.column]
+    if isinstance(raw, pd.DataFrame):
+        raise Unsupported(f"duplicate column {intent.column!r}")
+    numeric = _is_number(values)
+    if intent.op == 'stats':
+        def stat_value(stat):
+            if stat == 'count':
+                return int(raw.notna().sum())
+            if stat == 'nulls':
+                return int(raw.isna().sum())
+            if stat == 'n_unique':
+                return int(raw.nunique())
+            if stat in ('mode', 'least'):
+                return _tied(list(raw.value_counts().items()), stat == 'least')
+            if not numeric:
+                raise Unsupported(f"{intent.column!r} is not numeric")
+            present = values.dropna()
+            if present.empty:
+                return float('nan')
+            if stat in ('std', 'var') and len(present) < 2:
+                return 0.0
+            return float(getattr(present, stat)())
+        return "\n".join(_stat_lines(intent, numeric, stat_value, lang))
+    if intent.op == 'unique':
+        return f"{ANSWERS['unique'][lang].format(col=intent.column)}\n{unique_values_text(raw)}"
+    if intent.op == 'counts':
+        return f"{ANSWERS['counts'][lang].format(col=intent.column)}\n{value_counts_text(raw)}"
+    if intent.op == 'top':
+        header = ANSWERS['top'][lang].format(n=intent.n, col=intent.column)
+        return f"{header}\n{_pairs_text(raw.value_counts().head(intent.n).items())}"
+    # 'group'
+    stat = intent.stats[0]
+    keys = df[intent.by]
+    if isinstance(keys, pd.DataFrame):
+        raise Unsupported(f"duplicate column {intent.by!r}")
+    if stat == 'count':
+        result = raw.groupby(keys).count()
+    elif stat == 'nulls':
+        result = raw.isna().groupby(keys).sum()
+    elif stat == 'n_unique':
+        result = raw.groupby(keys).nunique()
+    elif not numeric:
+        raise Unsupported(f"{intent.column!r} is not numeric")
+    else:
+        result = values.groupby(keys).agg(stat)
+    label = STAT_LABELS[stat][lang].format(col=intent.column)
+    return f"{ANSWERS['group'][lang].format(stat=label, by=intent.by)}\n{_pairs_text(result.items())}"
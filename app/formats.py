@@ -0,0 +1,142 @@
+import csv
+import threading
+from typing import Optional
+
+XLSX = 'xlsx'
+XLS = 'xls'
+PARQUET = 'parquet'
+CSV = 'csv'
+
+# Encoding and delimiter are guessed from this much of the file
+SNIFF_BYTES = 64 * 1024
+SNIFF_LINES = 50
+DELIMITERS = (',', ';', '\t', '|')
+
+_ZIP_MAGIC = b'PK\x03\x04'
+_OLE2_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+_PARQUET_MAGIC = b'PAR1'
+_BOMS = ((b'\xef\xbb\xbf', 'utf-8-sig'), (b'\xff\xfe', 'utf-16'), (b'\xfe\xff', 'utf-16'))
+_TSV_EXTENSIONS = ('.tsv', '.tab')
+
+
+class FileFormat:
+    """
+    What an upload is and how to parse it: kind (xlsx/xls/parquet/csv) and,
+    for text files, the encoding and delimiter.
+    """
+
+    def __init__(self, kind: str, encoding: Optional[str] = None, sep: Optional[str] = None):
+        self.kind = kind
+        self.encoding = encoding
+        self.sep = sep
+
+    @property
+    def label(self) -> str:
+        return 'tsv' if self.kind == CSV and self.sep == '\t' else self.kind
+
+    def __repr__(self):
+        if self.kind == CSV:
+            return f"FileFormat({self.label}, {self.encoding}, {self.sep!r})"
+        return f"FileFormat({self.kind})"
+
+
+def _is_tsv(file_name: Optional[str], mime_type: Optional[str]) -> bool:
+    return (file_name or '').lower().endswith(_TSV_EXTENSIONS) or (mime_type or '').startswith('text/tab-separated-values')
+
+
+def _is_cp1251(head: bytes) -> bool:
+    """
+    Russian text in cp1251: high bytes are mostly Cyrillic letters (0xC0-0xFF, Ё/ё)
+    and come in runs, as whole words do. Accented letters in latin1 text sit alone.
+    """
+    high = [i for i, b in enumerate(head) if b >= 0x80]
+    if not high:
+        return False
+    letters = sum(1 for i in high if head[i] >= 0xC0 or head[i] in (0xA8, 0xB8))
+    in_runs = sum(1 for i in high if (i > 0 and head[i - 1] >= 0x80) or (i + 1 < len(head) and head[i + 1] >= 0x80))
+    return letters >= 0.9 * len(high) and in_runs >= 0.5 * len(high)
+
+
+def sniff_encoding(head: bytes) -> str:
+    """
+    Encoding of a text file from its first bytes: BOM, then utf-8, then cp1251 or latin1.
+    """
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding
+    try:
+        head.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off by the prefix end is still utf-8
+        if e.start >= len(head) - 3 and e.reason == 'unexpected end of data':
+            return 'utf-8'
+    return 'cp1251' if _is_cp1251(head) else 'latin1'
+
+
+def sniff_delimiter(text: str, preferred: str = ',') -> str:
+    """
+    The delimiter that splits the first lines into the same number (> 1) of fields,
+    the most fields winning. Quoted fields are honoured.
+    """
+    lines = text.splitlines()[:SNIFF_LINES]
+    # The last line may be cut off by the prefix end
+    if len(lines) > 1:
+        lines = lines[:-1]
+    best, best_fields = preferred, 1
+    for sep in (preferred,) + tuple(d for d in DELIMITERS if d != preferred):
+        counts = {len(row) for row in csv.reader(lines, delimiter=sep) if row}
+        if len(counts) == 1:
+            fields = counts.pop()
+            if fields > best_fields:
+                best, best_fields = sep, fields
+    return best
+
+
+def detect_format(head: bytes, file_name: Optional[str] = None, mime_type: Optional[str] = None) -> FileFormat:
+    """
+    Format of an upload from its first bytes: magic numbers pick xlsx, xls and parquet,
+    anything else is delimited text. The file name and MIME type only break delimiter
+    ties (a .tsv prefers tabs); a mislabelled file is still parsed by its content.
+    """
+    head = bytes(head[:SNIFF_BYTES])
+    if head.startswith(_ZIP_MAGIC):
+        return FileFormat(XLSX)
+    if head.startswith(_OLE2_MAGIC):
+        return FileFormat(XLS)
+    if head.startswith(_PARQUET_MAGIC):
+        return FileFormat(PARQUET)
+    encoding = sniff_encoding(head)
+    text = head.decode(encoding, errors='ignore')
+    return FileFormat(CSV, encoding, sniff_delimiter(text, '\t' if _is_tsv(file_name, mime_type) else ','))
+
+
+class ParseTimings:
+    """
+    Upload load time per detected format (parse plus column profiling),
+    recorded by the caller around each load.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._formats = {}
+
+    def record(self, label: str, seconds: float, nbytes: int) -> None:
+        with self._lock:
+            entry = self._formats.setdefault(label, {'count': 0, 'total': 0.0, 'max': 0.0, 'bytes': 0})
+            entry['count'] += 1
+            entry['total'] += seconds
+            entry['max'] = max(entry['max'], seconds)
+            entry['bytes'] += nbytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                label: {
+                    'count': e['count'],
+                    'avg_ms': round(e['total'] / e['count'] * 1000, 1),
+                    'max_ms': round(e['max'] * 1000, 1),
+                    'mb_per_s': round(e['bytes'] / e['total'] / (1024 * 1024), 1) if e['total'] else None,
+                }
+                for label, e in self._formats.items()
+            }
@@ -1,8 +1,15 @@
 import pandas as pd
 import logging
 import os
+from app.code_analysis import CodeAnalyzer, CodeRejected
+from app.columns import ColumnIndex
+from app.config import CODE_COST_BUDGET, LLM_SCHEMA_TOKEN_BUDGET
 from app.i18n import get_message
-from app.utils import safe_numeric, sanitize_and_send, safe_telegram_output
+from app.llm import extract_code
+from app.profile import profile_dataframe
+from app.sandbox import Sandbox, UnsafeCode
+from app.schema_prompt import SchemaPromptBuilder
+from app.utils import sanitize_and_send, safe_telegram_output
 
 # Ensure logs directory exists (best practice)
 os.makedirs("app/logs", exist_ok=True)
@@ -13,13 +20,25 @@ logging.basicConfig(
     format="%(asctime)s %(levelname)s %(message)s"
 )
 
+# LLM code runs in a separate process with CPU, wall-time and memory caps; started on first use
+expert_sandbox = Sandbox(1)
+code_analyzer = CodeAnalyzer(CODE_COST_BUDGET)
+schema_prompts = SchemaPromptBuilder(LLM_SCHEMA_TOKEN_BUDGET)
+
 @safe_telegram_output
-def handle_expert_mode(bot, chat_id, df, question, openai_client, lang='en'):
+def handle_expert_mode(bot, chat_id, df, question, openai_client, lang='en', profile=None):
     """
     Main expert mode: get code from LLM, check, execute, return result. Bulletproof output.
+    Pass the DataProfile cached with the upload to skip per-query column typing.
     """
+    if profile is None:
+        profile = profile_dataframe(df)
+    typed = profile.typed_frame(df)
+    # Relevant columns with type hints instead of every column name
+    schema = schema_prompts.build(question, ColumnIndex(df.columns), typed, profile)
+    logging.info(f"Expert prompt lists {len(schema.columns)}/{len(df.columns)} columns, saved ~{schema.saved} tokens")
     prompt = (
-        f"Columns: {list(df.columns)}\n"
+        f"Columns:\n{schema.text}\n"
         f"User question: '{question}'\n"
         "Generate safe, robust Python code to answer the question using only the Pandas DataFrame 'df'. "
         "Code MUST handle missing values and non-numeric data robustly. "
@@ -32,35 +51,21 @@ def handle_expert_mode(bot, chat_id, df, question, openai_client, lang='en'):
     )
     code = extract_code_from_response(response)
 
-    missing_cols = [
-        col for col in extract_column_names_from_code(code)
-        if col not in df.columns
-    ]
-    if missing_cols:
-        msg = get_message('no_such_column_or_value', lang) + f": {', '.join(missing_cols)}"
+    try:
+        analysis = code_analyzer.analyze(code, typed)
+    except CodeRejected as e:
+        return get_message('error', lang) + f" {e}"
+    if analysis.missing:
+        msg = get_message('no_such_column_or_value', lang) + f": {', '.join(map(str, analysis.missing))}"
         return msg
+    if analysis.rewrites:
+        logging.info(f"Expert code rewritten: {'; '.join(analysis.rewrites)}")
 
-    for col in df.columns:
-        try:
-            if df[col].dtype == object or df[col].apply(lambda x: isinstance(x, str)).any():
-                df[col] = safe_numeric(df[col])
-        except Exception:
-            logging.warning(f"Numeric conversion failed for column {col}", exc_info=True)
-
-    local_vars = {"df": df}
-    safe_globals = {"__builtins__": {}}  # No builtins for LLM code
-    exec(code, safe_globals, local_vars)
-    return local_vars.get("result", None)
+    # Converted copy, run with restricted builtins; the caller's df is never mutated
+    try:
+        return expert_sandbox.call(None, typed, analysis.code)
+    except UnsafeCode as e:
+        return get_message('error', lang) + f" {e}"
 
 def extract_code_from_response(response):
-    import re
-    content = response["choices"][0]["message"]["content"]
-    code_blocks = re.findall(r"```python(.*?)```", content, re.DOTALL)
-    if code_blocks:
-        return code_blocks[0].strip()
-    return content.strip()
-
-def extract_column_names_from_code(code):
-    import re
-    return re.findall(r'df\[\s*[\'"]([^\'"]+)[\'"]\s*\]', code)
-
+    return extract_code(response["choices"][0]["message"]["content"])
@@ -0,0 +1,128 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from collections import Counter
+from typing import Optional
+
+import pandas as pd
+
+from app.analytics import BUILTIN_ROLES
+from app.columns import ColumnIndex
+from app.formats import SNIFF_BYTES, FileFormat, detect_format
+
+CSV_EXTENSIONS = ('.csv', '.tsv')
+CSV_MIME_TYPES = ('text/csv', 'text/comma-separated-values', 'application/csv', 'text/tab-separated-values')
+COPY_BUFFER = 1024 * 1024
+
+
+def is_csv_document(file_name: Optional[str], mime_type: Optional[str]) -> bool:
+    return (file_name or '').lower().endswith(CSV_EXTENSIONS) or (mime_type or '') in CSV_MIME_TYPES
+
+
+async def download_to_spool(tg_file, max_memory: int) -> tempfile.SpooledTemporaryFile:
+    """
+    Download a Telegram file into a spooled temp file (RAM up to max_memory, then disk).
+    With a local Bot API server the file is copied from disk in fixed-size blocks.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=max_memory)
+    local_path = tg_file.file_path
+    if local_path and os.path.isfile(local_path):
+        with open(local_path, 'rb') as src:
+            shutil.copyfileobj(src, spool, COPY_BUFFER)
+    else:
+        await tg_file.download_to_memory(spool)
+    spool.seek(0)
+    return spool
+
+
+def stream_digest(fileobj) -> str:
+    """
+    Content hash of a file object, read in blocks (same digest as app.cache.file_key).
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    fileobj.seek(0)
+    for block in iter(lambda: fileobj.read(COPY_BUFFER), b''):
+        digest.update(block)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+class StreamingAggregates:
+    """
+    Built-in button results (count_gender, unique_managers, count_city) computed chunk by chunk.
+    """
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.rows = 0
+        index = ColumnIndex(self.columns)
+        self.targets = {action: index.resolve(role) for action, role in BUILTIN_ROLES.items()}
+        self.counts = {}
+        self.uniques = {}
+        for action, col in self.targets.items():
+            if col is None:
+                continue
+            if action == 'unique_managers':
+                self.uniques[col] = {}
+            else:
+                self.counts[col] = Counter()
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        self.rows += len(chunk)
+        for col, counter in self.counts.items():
+            for value, n in chunk[col].value_counts(dropna=False).items():
+                counter[None if pd.isna(value) else value] += int(n)
+        for col, seen in self.uniques.items():
+            for value in chunk[col].dropna().unique():
+                seen.setdefault(value, None)
+
+    def result_text(self, action: str) -> Optional[str]:
+        """
+        Same text as analytics.value_counts_text / unique_values_text, or None if not tracked.
+        """
+        col = self.targets.get(action)
+        if col is None:
+            return None
+        if col in self.uniques:
+            return "\n".join(str(m) for m in self.uniques[col])
+        return "\n".join(f"{'nan' if k is None else k}: {v}" for k, v in self.counts[col].most_common())
+
+
+def ingest_csv(fileobj, open_writer=None, chunk_rows: int = 100_000,
+               fmt: Optional[FileFormat] = None) -> StreamingAggregates:
+    """
+    Parse a CSV in chunks with bounded memory: aggregate each chunk and, if
+    open_writer(columns) returns a store writer, append the chunk to the columnar copy.
+    Encoding and delimiter come from fmt (sniffed from the first bytes if not given);
+    latin1 is the fallback if a later part does not decode. Runs in a thread
+    (a spooled file cannot go to a worker process).
+    """
+    if fmt is None:
+        fileobj.seek(0)
+        fmt = detect_format(fileobj.read(SNIFF_BYTES))
+    for encoding in dict.fromkeys((fmt.encoding, 'latin1')):
+        fileobj.seek(0)
+        aggregates = None
+        writer = None
+        try:
+            for chunk in pd.read_csv(fileobj, encoding=encoding, sep=fmt.sep, dtype=str, chunksize=chunk_rows):
+                if aggregates is None:
+                    aggregates = StreamingAggregates(chunk.columns)
+                    writer = open_writer(aggregates.columns) if open_writer else None
+                aggregates.update(chunk)
+                if writer is not None:
+                    writer.write(chunk)
+        except UnicodeDecodeError:
+            if writer is not None:
+                writer.abort()
+            continue
+        except Exception:
+            if writer is not None:
+                writer.abort()
+            raise
+        if aggregates is None or not aggregates.columns:
+            raise Exception("File loaded but no columns detected.")
+        if writer is not None:
+            writer.commit()
+        return aggregates
+    raise Exception("Could not decode CSV file.")
@@ -0,0 +1,114 @@
+"""
+Per-user job queue. A user's jobs (button clicks, questions, uploads) run one at a time
+in arrival order. A job identical to one already queued or running is not run again, and
+a queued click is dropped when a newer click on the same message replaces it. A waiting
+job holds one of the bot's concurrent update slots, so each user may only have a few.
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Hashable, Optional
+
+logger = logging.getLogger("AI_DATA_BOT")
+
+
+class _Outcome:
+    def __init__(self, name: str):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+
+# Returned instead of the job's result when the job did not run
+COALESCED = _Outcome('COALESCED')
+SUPERSEDED = _Outcome('SUPERSEDED')
+BUSY = _Outcome('BUSY')
+
+
+class _Job:
+    def __init__(self, key: Hashable, slot: Optional[Hashable]):
+        self.key = key
+        self.slot = slot
+        self.turn = asyncio.get_running_loop().create_future()
+        self.started = False
+        self.superseded = False
+
+
+class UserJobQueue:
+    """
+    run(user_id, key, job, slot) awaits job() after the user's earlier jobs have finished.
+    The job runs in the caller's task, so context variables and timings stay with the
+    update that submitted it.
+    """
+
+    def __init__(self, max_pending: Optional[int] = None):
+        self.max_pending = max_pending
+        self._users = {}
+        self.completed = 0
+        self.coalesced = 0
+        self.superseded = 0
+        self.rejected = 0
+
+    async def run(self, user_id: int, key: Hashable, job: Callable[[], Awaitable],
+                  slot: Optional[Hashable] = None):
+        """
+        Returns job()'s result; COALESCED if a job with the same key is already queued or
+        running for this user (that one does the work); SUPERSEDED if a newer job with the
+        same slot was submitted before this one got its turn; BUSY if the user already has
+        max_pending jobs queued or running.
+        """
+        jobs = self._users.setdefault(user_id, [])
+        if any(j.key == key for j in jobs):
+            self.coalesced += 1
+            return COALESCED
+        if slot is not None:
+            for older in [j for j in jobs if j.slot == slot and not j.started]:
+                older.superseded = True
+                jobs.remove(older)
+                if not older.turn.done():
+                    older.turn.set_result(None)
+                self.superseded += 1
+            # The dropped job may have been handed the turn already; pass it on
+            if jobs and not jobs[0].started and not jobs[0].turn.done():
+                jobs[0].turn.set_result(None)
+        if self.max_pending is not None and len(jobs) >= self.max_pending:
+            self.rejected += 1
+            if not jobs:
+                del self._users[user_id]
+            return BUSY
+        entry = _Job(key, slot)
+        jobs.append(entry)
+        try:
+            if jobs[0] is not entry:
+                await entry.turn
+            if entry.superseded:
+                return SUPERSEDED
+            entry.started = True
+            result = await job()
+            self.completed += 1
+            return result
+        finally:
+            self._release(user_id, jobs, entry)
+
+    def _release(self, user_id: int, jobs: list, entry: _Job) -> None:
+        # Also reached when a waiting job is cancelled: hand the turn on only if it was ours
+        if entry in jobs:
+            first = jobs[0] is entry
+            jobs.remove(entry)
+            if first and jobs and not jobs[0].turn.done():
+                jobs[0].turn.set_result(None)
+        if not jobs and self._users.get(user_id) is jobs:
+            del self._users[user_id]
+
+    def pending(self, user_id: int) -> int:
+        return len(self._users.get(user_id, ()))
+
+    def stats(self) -> dict:
+        return {
+            'users': len(self._users),
+            'queued': sum(len(jobs) for jobs in self._users.values()),
+            'completed': self.completed,
+            'coalesced': self.coalesced,
+            'superseded': self.superseded,
+            'rejected': self.rejected,
+        }
@@ -0,0 +1,219 @@
+import asyncio
+import logging
+import random
+from contextlib import aclosing
+from typing import AsyncIterator, Callable, Optional
+
+import httpx
+import openai
+
+logger = logging.getLogger("AI_DATA_BOT")
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+FENCE = "```"
+
+
+class CodeFence:
+    """
+    Incremental reader of a model answer. The code is the body of the first ``` fenced
+    block and is known as soon as its closing fence arrives; an answer without a fence
+    is all code, known only at the end (finish()).
+    """
+    def __init__(self):
+        self.text = ''
+        self._scan = 0
+        self._body = None
+        self.code = None
+
+    def feed(self, delta: str) -> Optional[str]:
+        """
+        Add the next piece of the answer; returns the code once the block is closed.
+        """
+        self.text += delta
+        if self.code is None and ('`' in delta or '\n' in delta):
+            self._parse()
+        return self.code
+
+    def _parse(self) -> None:
+        text = self.text
+        if self._body is None:
+            start = text.find(FENCE, self._scan)
+            if start < 0:
+                self._scan = max(0, len(text) - len(FENCE) + 1)
+                return
+            # The language tag runs to the end of the opening line
+            newline = text.find('\n', start)
+            if newline < 0:
+                self._scan = start
+                return
+            self._body = self._scan = newline + 1
+        end = text.find('\n' + FENCE, self._scan - 1)
+        if end < 0:
+            # A fence may be split across pieces: look again from just before the end
+            self._scan = max(self._body, len(text) - len(FENCE))
+            return
+        self.code = text[self._body:end].strip()
+
+    def finish(self) -> str:
+        """
+        The code once the answer is complete: the fenced block (closed or not) or the whole text.
+        """
+        if self.code is None:
+            self._parse()
+        if self.code is None:
+            self.code = (self.text[self._body:] if self._body is not None else self.text).strip()
+        return self.code
+
+
+def extract_code(text: str) -> str:
+    """
+    Code from a complete model answer (see CodeFence).
+    """
+    fence = CodeFence()
+    fence.feed(text)
+    return fence.finish()
+
+
+class LLMClient:
+    """
+    Async chat-completions client shared by all chats.
+
+    One pooled HTTP connection pool, a global concurrency limit, a per-user
+    limit (so one chat cannot take every slot) and retries with exponential
+    backoff on rate limits and transient errors.
+    """
+    def __init__(self, api_key: Optional[str], model: str = "gpt-4o", base_url: Optional[str] = None,
+                 max_concurrency: int = 8, per_user: int = 1, max_retries: int = 4,
+                 backoff: float = 1.0, timeout: float = 60.0):
+        self.model = model
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.per_user = per_user
+        self._http = openai.DefaultAsyncHttpxClient(
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+            timeout=timeout,
+        )
+        self._client = openai.AsyncOpenAI(
+            api_key=api_key or "missing", base_url=base_url, http_client=self._http, max_retries=0,
+        )
+        self._global = asyncio.Semaphore(max_concurrency)
+        self._users: dict = {}
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+        self.streams = 0
+        self.early_stops = 0
+
+    def _user_slot(self, user_id) -> list:
+        slot = self._users.get(user_id)
+        if slot is None:
+            slot = self._users[user_id] = [asyncio.Semaphore(self.per_user), 0]
+        return slot
+
+    def _release_user(self, user_id, slot: list) -> None:
+        slot[1] -= 1
+        if slot[1] == 0:
+            self._users.pop(user_id, None)
+
+    async def complete(self, messages: list, user_id=None, **kwargs) -> str:
+        """
+        Send a chat completion and return the message content.
+        """
+        slot = self._user_slot(user_id)
+        slot[1] += 1
+        try:
+            async with slot[0], self._global:
+                response = await self._create_with_retry(messages, **kwargs)
+                return response.choices[0].message.content
+        finally:
+            self._release_user(user_id, slot)
+
+    async def stream(self, messages: list, user_id=None, **kwargs) -> AsyncIterator[str]:
+        """
+        Yield the message content piece by piece as the model writes it. The request keeps
+        its concurrency slots until iteration ends; closing the iterator early ends it.
+        """
+        slot = self._user_slot(user_id)
+        slot[1] += 1
+        try:
+            async with slot[0], self._global:
+                response = await self._create_with_retry(messages, stream=True, **kwargs)
+                self.streams += 1
+                try:
+                    async for chunk in response:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            yield chunk.choices[0].delta.content
+                except Exception:
+                    self.errors += 1
+                    raise
+                finally:
+                    await response.close()
+        finally:
+            self._release_user(user_id, slot)
+
+    async def complete_code(self, messages: list, user_id=None, on_text: Optional[Callable[[str], None]] = None,
+                            **kwargs) -> str:
+        """
+        Stream a completion and return its code as soon as the fenced block is closed,
+        without waiting for the prose after it. on_text(answer_so_far) follows progress.
+        """
+        fence = CodeFence()
+        async with aclosing(self.stream(messages, user_id=user_id, **kwargs)) as pieces:
+            async for piece in pieces:
+                code = fence.feed(piece)
+                if on_text is not None:
+                    on_text(fence.text)
+                if code is not None:
+                    self.early_stops += 1
+                    return code
+        return fence.finish()
+
+    async def _create_with_retry(self, messages: list, **kwargs):
+        model = kwargs.pop('model', self.model)
+        attempt = 0
+        while True:
+            self.requests += 1
+            try:
+                return await self._client.chat.completions.create(
+                    model=model, messages=messages, **kwargs
+                )
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    self.errors += 1
+                    raise
+                delay = self._retry_delay(e, attempt)
+                attempt += 1
+                self.retries += 1
+                logger.warning(f"LLM call failed ({type(e).__name__}), retry {attempt} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+            except Exception:
+                self.errors += 1
+                raise
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        response = getattr(error, 'response', None)
+        retry_after = response.headers.get('retry-after') if response is not None else None
+        try:
+            if retry_after is not None:
+                return float(retry_after)
+        except ValueError:
+            pass
+        return self.backoff * (2 ** attempt) * (0.5 + random.random())
+
+    async def aclose(self) -> None:
+        await self._client.close()
+
+    def stats(self) -> dict:
+        return {
+            'requests': self.requests,
+            'retries': self.retries,
+            'errors': self.errors,
+            'streams': self.streams,
+            'early_stops': self.early_stops,
+            'active_users': len(self._users),
+        }
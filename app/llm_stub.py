@@ -0,0 +1,108 @@
+"""
+Local OpenAI-compatible stub for offline load tests.
+
+Run standalone:  python -m app.llm_stub --port 8089 --delay 0.5
+or set LLM_STUB=1 and the bot starts it in a background thread.
+Streaming requests get server-sent events: the answer in small pieces, chunk_delay apart,
+with a paragraph of prose after the code like real models write.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_CODE = "```python\nresult = f\"{len(df)} rows, {len(df.columns)} columns\"\n```"
+STUB_PROSE = ("\n\nThis code counts the rows and columns of the DataFrame `df` and stores a short "
+              "description in `result`. It does not modify the data.")
+STREAM_PIECE_CHARS = 8
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    delay = 0.0
+    chunk_delay = 0.0
+    code = STUB_CODE
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        time.sleep(self.delay)
+        if request.get("stream"):
+            self._stream(request)
+            return
+        body = json.dumps({
+            "id": "stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": self.code},
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, request: dict):
+        answer = self.code + STUB_PROSE
+        pieces = [answer[i:i + STREAM_PIECE_CHARS] for i in range(0, len(answer), STREAM_PIECE_CHARS)]
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+
+        def event(delta: dict, finish_reason=None) -> bytes:
+            chunk = {
+                "id": "stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "stub"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(chunk)}\n\n".encode()
+        try:
+            self.wfile.write(event({"role": "assistant", "content": ""}))
+            for piece in pieces:
+                time.sleep(self.chunk_delay)
+                self.wfile.write(event({"content": piece}))
+                self.wfile.flush()
+            self.wfile.write(event({}, "stop") + b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading once it had the code
+            pass
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(port: int = 8089, delay: float = 0.0, code: str = STUB_CODE,
+                chunk_delay: float = 0.0) -> ThreadingHTTPServer:
+    handler = type('ConfiguredStubHandler', (StubHandler,),
+                   {'delay': delay, 'code': code, 'chunk_delay': chunk_delay})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_thread(port: int = 8089, delay: float = 0.0, chunk_delay: float = 0.0) -> ThreadingHTTPServer:
+    """
+    Start the stub server in a daemon thread and return it.
+    """
+    server = make_server(port, delay, chunk_delay=chunk_delay)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OpenAI chat-completions stub")
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--delay', type=float, default=0.0, help="simulated LLM latency, seconds")
+    parser.add_argument('--chunk-delay', type=float, default=0.0, help="time between streamed pieces, seconds")
+    args = parser.parse_args()
+    print(f"LLM stub listening on http://127.0.0.1:{args.port}/v1")
+    make_server(args.port, args.delay, chunk_delay=args.chunk_delay).serve_forever()
@@ -0,0 +1,199 @@
+import posixpath
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+import numpy as np
+import pandas as pd
+from io import BytesIO
+from typing import Optional
+from app.formats import PARQUET, SNIFF_BYTES, XLS, XLSX, FileFormat, detect_format
+from app.profile import profile_dataframe
+
+_MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+# <dimension> sits near the top of a worksheet part; only this much is decompressed to find it
+_DIMENSION_PROBE_BYTES = 16 * 1024
+_DIMENSION_RE = re.compile(rb'<(?:\w+:)?dimension\s+ref="([A-Z]+)(\d+)(?::([A-Z]+)(\d+))?"')
+
+
+class SheetInfo:
+    """
+    A worksheet found in workbook metadata. rows/columns come from the sheet's
+    <dimension> record (rows excludes the header) and are None when it is missing.
+    """
+
+    def __init__(self, name: str, rows=None, columns=None):
+        self.name = name
+        self.rows = rows
+        self.columns = columns
+
+    def label(self) -> str:
+        if self.rows is None:
+            return self.name
+        return f"{self.name} ({self.rows}×{self.columns})"
+
+    def __repr__(self):
+        return f"SheetInfo({self.name!r}, {self.rows}, {self.columns})"
+
+
+def _column_number(letters: bytes) -> int:
+    number = 0
+    for ch in letters:
+        number = number * 26 + ch - 64
+    return number
+
+
+def _sheet_dimension(zf: zipfile.ZipFile, part: str):
+    try:
+        with zf.open(part) as f:
+            head = f.read(_DIMENSION_PROBE_BYTES)
+    except KeyError:
+        return None, None
+    match = _DIMENSION_RE.search(head)
+    if match is None:
+        return None, None
+    first_col, first_row, last_col, last_row = match.groups()
+    if last_col is None:
+        last_col, last_row = first_col, first_row
+    rows = max(int(last_row) - int(first_row), 0)
+    return rows, _column_number(last_col) - _column_number(first_col) + 1
+
+
+def list_sheets(file_bytes):
+    """
+    Worksheets of an .xlsx upload, read from workbook metadata only (no cell data is parsed).
+    Returns None if the bytes are not an xlsx workbook. Hidden sheets and chart sheets are skipped.
+    """
+    try:
+        zf = zipfile.ZipFile(BytesIO(file_bytes))
+    except zipfile.BadZipFile:
+        return None
+    with zf:
+        try:
+            workbook = ET.fromstring(zf.read("xl/workbook.xml"))
+            rels = ET.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+        except (KeyError, ET.ParseError):
+            return None
+        targets = {}
+        for rel in rels.iter(f"{_PKG_REL_NS}Relationship"):
+            target = rel.get("Target", "")
+            targets[rel.get("Id")] = target.lstrip("/") if target.startswith("/") else posixpath.normpath(f"xl/{target}")
+        sheets = []
+        for sheet in workbook.iter(f"{_MAIN_NS}sheet"):
+            part = targets.get(sheet.get(f"{_REL_NS}id"), "")
+            if sheet.get("state", "visible") != "visible" or "/worksheets/" not in part:
+                continue
+            sheets.append(SheetInfo(sheet.get("name"), *_sheet_dimension(zf, part)))
+    return sheets
+
+
+def _header_names(values) -> list:
+    """
+    Column names the way read_excel builds them: blanks become 'Unnamed: i' and
+    repeats get '.1', '.2' suffixes, named columns being numbered before unnamed ones.
+    """
+    names = [f"Unnamed: {i}" if v is None else v for i, v in enumerate(values)]
+    unnamed = [i for i, v in enumerate(values) if v is None]
+    counts = {}
+    for i in [i for i in range(len(names)) if i not in unnamed] + unnamed:
+        name = original = names[i]
+        count = counts.get(name, 0)
+        while count > 0:
+            counts[original] = count + 1
+            name = f"{original}.{count}"
+            count = count + 1 if name in names else counts.get(name, 0)
+        names[i] = name
+        counts[name] = count + 1
+    return names
+
+
+def _open_sheet(file_bytes, sheet):
+    from openpyxl import load_workbook
+    # read_only streams the sheet XML row by row instead of building every cell object
+    workbook = load_workbook(BytesIO(file_bytes), read_only=True, data_only=True)
+    return workbook, workbook[sheet]
+
+
+def read_sheet_header(file_bytes, sheet: str) -> list:
+    """
+    Column names of one worksheet; only its first row is read.
+    """
+    workbook, ws = _open_sheet(file_bytes, sheet)
+    try:
+        row = next(ws.iter_rows(max_row=1, values_only=True), ())
+    finally:
+        workbook.close()
+    while row and row[-1] is None:
+        row = row[:-1]
+    return _header_names(row)
+
+
+def read_sheet(file_bytes, sheet: str, columns=None) -> pd.DataFrame:
+    """
+    Parse one worksheet. With columns, only those columns are kept while streaming
+    the rows (column projection); the result matches the same columns of a full read.
+    """
+    if columns is None:
+        return pd.read_excel(BytesIO(file_bytes), sheet_name=sheet, engine="openpyxl")
+    workbook, ws = _open_sheet(file_bytes, sheet)
+    try:
+        rows = ws.iter_rows(values_only=True)
+        header = list(next(rows, ()))
+        while header and header[-1] is None:
+            header.pop()
+        names = _header_names(header)
+        missing = [c for c in columns if c not in names]
+        if missing:
+            raise KeyError(missing[0])
+        positions = [names.index(c) for c in columns]
+        data, last = [], 0
+        for row in rows:
+            data.append(tuple(row[p] if p < len(row) else None for p in positions))
+            # Trailing empty rows are dropped like read_excel does, judged on the whole row
+            if any(v is not None for v in row):
+                last = len(data)
+    finally:
+        workbook.close()
+    del data[last:]
+    # Blank cells are NaN in a full read, not None
+    return pd.DataFrame(data, columns=list(columns)).infer_objects().fillna(np.nan)
+
+
+def _read_csv(file_bytes, fmt: FileFormat) -> pd.DataFrame:
+    try:
+        return pd.read_csv(BytesIO(file_bytes), encoding=fmt.encoding, sep=fmt.sep)
+    except UnicodeDecodeError:
+        # The sniffed prefix looked clean but a later byte did not decode; latin1 accepts any byte
+        return pd.read_csv(BytesIO(file_bytes), encoding='latin1', sep=fmt.sep)
+
+
+def read_dataframe(file_bytes, sheet=None, fmt: Optional[FileFormat] = None) -> pd.DataFrame:
+    """
+    Parse uploaded bytes into a DataFrame with the parser for their format
+    (detected from the content unless fmt is given). sheet picks a worksheet of a workbook.
+    """
+    fmt = fmt or detect_format(file_bytes[:SNIFF_BYTES])
+    if fmt.kind == XLSX:
+        df = read_sheet(file_bytes, sheet) if sheet is not None else pd.read_excel(BytesIO(file_bytes), engine="openpyxl")
+    elif fmt.kind == XLS:
+        try:
+            df = pd.read_excel(BytesIO(file_bytes), sheet_name=sheet or 0, engine="xlrd")
+        except ImportError:
+            raise Exception("Old .xls files are not supported here, please save the file as .xlsx or CSV.")
+    elif fmt.kind == PARQUET:
+        df = pd.read_parquet(BytesIO(file_bytes))
+    else:
+        df = _read_csv(file_bytes, fmt)
+    if len(df.columns) == 0:
+        raise Exception("File loaded but no columns detected.")
+    return df
+
+
+def load_upload(file_bytes, sheet=None, fmt: Optional[FileFormat] = None):
+    """
+    Parse and profile an upload in one go (a single worker job).
+    Returns (df, profile).
+    """
+    df = read_dataframe(file_bytes, sheet, fmt)
+    return df, profile_dataframe(df)
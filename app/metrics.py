@@ -0,0 +1,210 @@
+"""
+Minimal Prometheus metrics: histograms, counters and gauges read from the
+components' stats(), rendered in the text exposition format and served on a
+local port (GET /metrics).
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional, Sequence
+
+logger = logging.getLogger("AI_DATA_BOT")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Name of the handler serving the current update; stage timings are tagged with it
+current_handler: ContextVar[str] = ContextVar('current_handler', default='other')
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = '') -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        # listener(value, labels) sees every raw observation (benchmarks compute exact percentiles)
+        self.listeners = []
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry['buckets'][i] += 1
+            entry['sum'] += value
+            entry['count'] += 1
+        for listener in self.listeners:
+            listener(value, labels)
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observe the time spent in the with-block, also when it raises.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(self._key(labels))
+        return entry['count'] if entry else 0
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted((k, dict(v, buckets=list(v['buckets']))) for k, v in self._values.items())
+        lines = self.header()
+        for key, entry in items:
+            for bound, n in zip(self.buckets, entry['buckets']):
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {n}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(entry['sum'])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {entry['count']}")
+        return lines
+
+
+class _StatsGauges:
+    """
+    Every numeric field of a component's stats() as a gauge, read at scrape time.
+    """
+
+    def __init__(self, prefix: str, stats: Callable[[], dict], help: str):
+        self.prefix = prefix
+        self.stats = stats
+        self.help = help
+
+    def render(self) -> list:
+        try:
+            stats = self.stats()
+        except Exception:
+            logger.exception(f"Failed to read {self.prefix} stats for metrics")
+            return []
+        lines = []
+        for field, value in stats.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f"{self.prefix}_{field}"
+            lines += [f"# HELP {name} {self.help}: {field}", f"# TYPE {name} gauge", f"{name} {_number(value)}"]
+        return lines
+
+
+class Registry:
+    """
+    Holds the metrics and renders them for a scrape.
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def stats_gauges(self, prefix: str, stats: Callable[[], dict], help: str) -> None:
+        self._add(_StatsGauges(prefix, stats, help))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+        return '\n'.join(lines) + '\n'
+
+
+def make_server(registry: Registry, port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    return server
+
+
+def start_http_server(registry: Registry, port: int, host: str = '127.0.0.1') -> Optional[ThreadingHTTPServer]:
+    """
+    Serve GET /metrics from a daemon thread. Returns the server, or None if port is 0.
+    """
+    if not port:
+        return None
+    server = make_server(registry, port, host)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"Metrics on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,244 @@
+import io
+import math
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import pandas as pd
+
+from app.cache import frame_nbytes
+
+TEXT = 'text'
+PAGES = 'pages'
+CSV = 'csv'
+XLSX = 'xlsx'
+TXT = 'txt'
+PDF = 'pdf'
+TABLE_FORMATS = ('auto', TEXT, PAGES, CSV, XLSX, PDF)
+TEXT_FORMATS = ('auto', TEXT, PAGES, TXT, PDF)
+
+# One Telegram message of text (the hard limit is 4096)
+TEXT_PAGE_CHARS = 3500
+TABLE_PAGE_ROWS = 25
+# Wider tables do not read well as message text
+TABLE_TEXT_MAX_COLUMNS = 8
+# Beyond this many pages a file is easier to use than clicking through
+PAGES_MAX = 40
+# Telegram bots can send documents up to 50 MB
+ATTACHMENT_MAX_BYTES = 50 * 1024 * 1024
+# Above this estimated CSV size the compressed XLSX is worth its slower write
+CSV_MAX_BYTES = 20 * 1024 * 1024
+XLSX_MAX_ROWS = 1_048_575
+XLSX_MAX_COLUMNS = 16_384
+_CSV_SAMPLE_ROWS = 1000
+
+
+class AttachmentTooLarge(Exception):
+    """
+    Raised when a result file would exceed what Telegram accepts.
+    """
+
+
+def as_table(result) -> Optional[pd.DataFrame]:
+    """
+    The result as a DataFrame if it is tabular (DataFrame or Series), else None.
+    """
+    if isinstance(result, pd.DataFrame):
+        return result
+    if isinstance(result, pd.Series):
+        return result.to_frame()
+    return None
+
+
+def _show_index(df: pd.DataFrame) -> bool:
+    return not isinstance(df.index, pd.RangeIndex)
+
+
+def estimate_csv_bytes(df: pd.DataFrame) -> int:
+    """
+    CSV size extrapolated from the first rows.
+    """
+    if df.empty:
+        return 0
+    sample = df.head(_CSV_SAMPLE_ROWS).to_csv(index=_show_index(df))
+    return int(len(sample.encode('utf-8')) * len(df) / min(len(df), _CSV_SAMPLE_ROWS))
+
+
+def choose_format(result, table_mode: str = 'auto', text_mode: str = 'auto', allow_pages: bool = True) -> str:
+    """
+    Output format for a result: a fixed mode per result type if configured, else the
+    cheapest one for its shape and size. Small results go as message text, medium ones
+    as pages rendered on demand, large tables as CSV (fast to write) or, past
+    CSV_MAX_BYTES, as compressed XLSX; long text as a .txt document.
+    """
+    df = as_table(result)
+    if df is not None:
+        if table_mode != 'auto':
+            return CSV if table_mode == PAGES and not allow_pages else table_mode
+        rows, cols = df.shape
+        # A page must fit one message; the first one is a cheap proxy for the rest
+        fits = cols <= TABLE_TEXT_MAX_COLUMNS and len(df.head(TABLE_PAGE_ROWS).to_string()) <= TEXT_PAGE_CHARS
+        if fits and rows <= TABLE_PAGE_ROWS:
+            return TEXT
+        if fits and allow_pages and rows <= TABLE_PAGE_ROWS * PAGES_MAX:
+            return PAGES
+        if estimate_csv_bytes(df) <= CSV_MAX_BYTES:
+            return CSV
+        if rows <= XLSX_MAX_ROWS and cols + _show_index(df) <= XLSX_MAX_COLUMNS:
+            return XLSX
+        return CSV
+    if text_mode != 'auto':
+        return TXT if text_mode == PAGES and not allow_pages else text_mode
+    size = len(result_text(result))
+    if size <= TEXT_PAGE_CHARS:
+        return TEXT
+    if allow_pages and size <= TEXT_PAGE_CHARS * PAGES_MAX:
+        return PAGES
+    return TXT
+
+
+def result_text(result) -> str:
+    df = as_table(result)
+    if df is not None:
+        return df.to_string()
+    return result if isinstance(result, str) else str(result)
+
+
+def _checked(bio: io.BytesIO, filename: str) -> io.BytesIO:
+    if bio.getbuffer().nbytes > ATTACHMENT_MAX_BYTES:
+        raise AttachmentTooLarge(f"{filename} is {bio.getbuffer().nbytes / 2 ** 20:.0f} MB")
+    bio.seek(0)
+    bio.name = filename
+    return bio
+
+
+def table_to_csv(df: pd.DataFrame, filename: str = "result.csv") -> io.BytesIO:
+    """
+    CSV written straight from the DataFrame (UTF-8 with BOM so Excel reads Cyrillic).
+    """
+    bio = io.BytesIO()
+    df.to_csv(bio, index=_show_index(df), encoding='utf-8-sig')
+    return _checked(bio, filename)
+
+
+def _xlsx_cell(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)) or value is pd.NaT:
+        return None
+    if isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, pd.Timestamp):
+        return value.tz_localize(None).to_pydatetime() if value.tzinfo else value.to_pydatetime()
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+def table_to_xlsx(df: pd.DataFrame, filename: str = "result.xlsx") -> io.BytesIO:
+    """
+    Deflate-compressed XLSX streamed row by row with openpyxl's write-only mode,
+    so no cell objects are kept for the whole sheet.
+    """
+    from openpyxl import Workbook
+
+    show_index = _show_index(df)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("result")
+    ws.append(([str(df.index.name or '')] if show_index else []) + [str(c) for c in df.columns])
+    for row in df.itertuples(index=show_index, name=None):
+        ws.append([_xlsx_cell(v) for v in row])
+    bio = io.BytesIO()
+    wb.save(bio)
+    return _checked(bio, filename)
+
+
+def text_to_file(text: str, filename: str = "result.txt") -> io.BytesIO:
+    return _checked(io.BytesIO(text.encode('utf-8')), filename)
+
+
+def text_page_bounds(text: str, limit: int = TEXT_PAGE_CHARS) -> List[int]:
+    """
+    Start offsets of the pages of a text: each page ends at the last line break
+    within limit characters, or is cut at limit if a single line is longer.
+    """
+    starts = [0]
+    start = 0
+    while len(text) - start > limit:
+        cut = text.rfind('\n', start, start + limit)
+        start = cut + 1 if cut > start else start + limit
+        starts.append(start)
+    return starts
+
+
+class PagedResult:
+    """
+    A result shown page by page. Table pages are formatted only when requested.
+    """
+    def __init__(self, result):
+        self.table = as_table(result)
+        if self.table is not None:
+            self.text = None
+            self.total = max(1, math.ceil(len(self.table) / TABLE_PAGE_ROWS))
+            self.nbytes = frame_nbytes(self.table)
+        else:
+            self.text = result_text(result)
+            self.starts = text_page_bounds(self.text)
+            self.total = len(self.starts)
+            self.nbytes = len(self.text) * 2
+
+    def page(self, n: int) -> str:
+        n = min(max(n, 0), self.total - 1)
+        if self.table is not None:
+            text = self.table.iloc[n * TABLE_PAGE_ROWS:(n + 1) * TABLE_PAGE_ROWS].to_string()
+            return text if len(text) <= TEXT_PAGE_CHARS else text[:TEXT_PAGE_CHARS - 1] + '…'
+        end = self.starts[n + 1] if n + 1 < self.total else len(self.text)
+        return self.text[self.starts[n]:end]
+
+
+class Paginator:
+    """
+    Recently paginated results, addressed by a short token in the buttons' callback data.
+    Bounded by count and memory (least recently viewed dropped first); idle entries expire.
+    """
+    def __init__(self, max_results: int, max_bytes: int, ttl: float):
+        self.max_results = max_results
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._results: "OrderedDict[str, Tuple[PagedResult, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+
+    def add(self, result) -> Tuple[str, PagedResult]:
+        paged = PagedResult(result)
+        token = secrets.token_hex(4)
+        with self._lock:
+            self._results[token] = (paged, time.monotonic())
+            self.nbytes += paged.nbytes
+            self._trim()
+        return token, paged
+
+    def get(self, token: str) -> Optional[PagedResult]:
+        with self._lock:
+            self._trim()
+            entry = self._results.get(token)
+            if entry is None:
+                return None
+            self._results[token] = (entry[0], time.monotonic())
+            self._results.move_to_end(token)
+            return entry[0]
+
+    def _trim(self) -> None:
+        now = time.monotonic()
+        while self._results:
+            token, (paged, touched) = next(iter(self._results.items()))
+            # Always keep the newest result
+            if (len(self._results) > 1 and (len(self._results) > self.max_results or self.nbytes > self.max_bytes)) \
+                    or now - touched > self.ttl:
+                del self._results[token]
+                self.nbytes -= paged.nbytes
+            else:
+                break
+
+    def stats(self) -> dict:
+        return {'results': len(self._results), 'bytes': self.nbytes}
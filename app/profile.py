@@ -0,0 +1,107 @@
+import re
+from typing import Dict, Optional
+
+import pandas as pd
+
+from app.utils import safe_numeric
+
+NUMERIC = 'numeric'
+NUMERIC_LIKE = 'numeric_like'
+DATE = 'date'
+CATEGORICAL = 'categorical'
+TEXT = 'text'
+
+# Share of distinct non-null values that must look numeric/date for the column to count as such
+TYPE_THRESHOLD = 0.8
+CATEGORICAL_MAX_UNIQUE = 50
+CATEGORICAL_MAX_RATIO = 0.05
+
+_NUMBER_LIKE = re.compile(r'^(до\s*)?\d+([.,]\d+)?(\s*-\s*\d+([.,]\d+)?)?$', re.IGNORECASE)
+_DATE_LIKE = re.compile(r'^\d{1,4}[./-]\d{1,2}[./-]\d{1,4}([ T]\d{1,2}:\d{2}(:\d{2})?)?$')
+_PLACEHOLDERS = {'не указано', 'зависит от продажи', 'нет информации', '-', '', 'nan'}
+
+
+class DataProfile:
+    """
+    Per-upload column typing, computed once when the file arrives.
+
+    kinds maps every column to numeric / numeric_like / date / categorical / text.
+    converted holds float (numeric_like) or datetime (date) versions of text columns,
+    kept next to the untouched originals.
+    """
+    def __init__(self, kinds: Dict[str, str], converted: Dict[str, pd.Series], n_rows: int):
+        self.kinds = kinds
+        self.converted = converted
+        self.n_rows = n_rows
+        self._typed: Optional[pd.DataFrame] = None
+
+    def columns_of(self, kind: str) -> list:
+        return [c for c, k in self.kinds.items() if k == kind]
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(s.memory_usage(index=False, deep=True) for s in self.converted.values()))
+
+    def typed_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        df with converted columns swapped in; built once, the original df is not modified.
+        """
+        if self._typed is None:
+            typed = df.copy(deep=False)
+            for col, series in self.converted.items():
+                typed[col] = series
+            self._typed = typed
+        return self._typed
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_typed'] = None
+        return state
+
+
+def _share(values: pd.Series, pattern: re.Pattern) -> float:
+    values = [v for v in values if v.lower() not in _PLACEHOLDERS]
+    if not values:
+        return 0.0
+    return sum(1 for v in values if pattern.match(v)) / len(values)
+
+
+def detect_kind(series: pd.Series) -> str:
+    if pd.api.types.is_bool_dtype(series):
+        return CATEGORICAL
+    if pd.api.types.is_numeric_dtype(series):
+        return NUMERIC
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return DATE
+    non_null = series.dropna()
+    if non_null.empty:
+        return TEXT
+    uniques = pd.Series(non_null.unique()).astype(str).str.strip()
+    if _share(uniques, _NUMBER_LIKE) >= TYPE_THRESHOLD:
+        return NUMERIC_LIKE
+    if _share(uniques, _DATE_LIKE) >= TYPE_THRESHOLD:
+        return DATE
+    if len(uniques) <= max(CATEGORICAL_MAX_UNIQUE, CATEGORICAL_MAX_RATIO * len(series)):
+        return CATEGORICAL
+    return TEXT
+
+
+def profile_dataframe(df: pd.DataFrame) -> DataProfile:
+    """
+    Detect column kinds and convert numeric-like/date text columns once per upload.
+    """
+    kinds = {}
+    converted = {}
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series, pd.DataFrame):
+            # Duplicate column names: leave them untyped
+            kinds[col] = TEXT
+            continue
+        kind = detect_kind(series)
+        kinds[col] = kind
+        if kind == NUMERIC_LIKE:
+            converted[col] = safe_numeric(series)
+        elif kind == DATE and not pd.api.types.is_datetime64_any_dtype(series):
+            converted[col] = pd.to_datetime(series, errors='coerce', dayfirst=True, format='mixed')
+    return DataProfile(kinds, converted, len(df))
@@ -0,0 +1,427 @@
+import ast
+import asyncio
+import builtins
+import logging
+import math
+import multiprocessing
+import os
+import pickle
+import signal
+import tempfile
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from typing import Any, List, Optional
+
+from app.workers import JobTimeout
+
+logger = logging.getLogger("AI_DATA_BOT")
+
+# Modules generated code may import. pandas and numpy can read and write files themselves,
+# so their I/O entry points are refused by check_code() (and writes by RLIMIT_FSIZE in workers)
+SAFE_MODULES = frozenset({
+    'pandas', 'numpy', 're', 'math', 'statistics', 'datetime', 'collections',
+    'itertools', 'functools', 'operator', 'json', 'string', 'decimal', 'fractions',
+})
+_UNSAFE_BUILTINS = frozenset({
+    'open', 'input', 'breakpoint', 'exit', 'quit', 'help', 'compile', 'eval', 'exec',
+    'globals', 'locals', 'vars', 'memoryview', '__import__',
+})
+# Attributes that open files or connections; any pd.read_* is refused as well
+_IO_NAMES = frozenset({
+    'load', 'save', 'savez', 'savez_compressed', 'loadtxt', 'savetxt', 'genfromtxt', 'fromfile',
+    'tofile', 'fromregex', 'memmap', 'open_memmap', 'DataSource', 'ExcelFile', 'ExcelWriter',
+    'HDFStore', 'to_pickle', 'to_parquet', 'to_feather', 'to_excel', 'to_hdf', 'to_sql',
+    'to_stata', 'to_orc', 'attrgetter', 'methodcaller',
+})
+# Writers that return a string when called without a target but write a file with one
+_TEXT_WRITERS = frozenset({'to_csv', 'to_json', 'to_html', 'to_xml', 'to_markdown', 'to_latex', 'to_string'})
+_TARGET_ARGS = frozenset({'path_or_buf', 'path_or_buffer', 'buf', 'path'})
+# Extra seconds the parent waits past the wall limit before killing the worker
+_KILL_GRACE = 2.0
+
+
+class ResourceLimitExceeded(Exception):
+    """
+    Raised when expert code hits the sandbox CPU-time or memory limit.
+    """
+
+
+class SandboxError(Exception):
+    """
+    Raised when the sandbox worker died without returning a result.
+    """
+
+
+class UnsafeCode(Exception):
+    """
+    Raised when generated code reaches for file I/O or interpreter internals.
+    """
+
+
+def _refused(name: str) -> bool:
+    dunder = name.startswith('__') and name.endswith('__') and name != '__name__'
+    return dunder or name in _IO_NAMES or name.startswith('read_')
+
+
+def check_code(code: str) -> None:
+    """
+    Refuse code that names a file I/O entry point (pd.read_*, np.load/save, DataFrame.to_excel,
+    to_csv with a path, ...), a dunder attribute or a star import. A static check: it closes the
+    obvious routes, while the worker process and its limits stay the actual boundary.
+    """
+    for node in ast.walk(ast.parse(code)):
+        if isinstance(node, ast.Attribute) and _refused(node.attr):
+            raise UnsafeCode(f"'{node.attr}' is not allowed")
+        if isinstance(node, ast.ImportFrom):
+            for alias in node.names:
+                if alias.name == '*' or _refused(alias.name):
+                    raise UnsafeCode(f"'from {node.module} import {alias.name}' is not allowed")
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr in _TEXT_WRITERS
+                and (node.args or any(k.arg in _TARGET_ARGS for k in node.keywords))):
+            raise UnsafeCode(f"{node.func.attr}() may only return text, not write a file")
+
+
+def _safe_getattr(obj, name, *default):
+    if isinstance(name, str) and _refused(name):
+        raise UnsafeCode(f"'{name}' is not allowed")
+    return getattr(obj, name, *default)
+
+
+def _safe_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if level != 0 or name.split('.')[0] not in SAFE_MODULES:
+        raise ImportError(f"Import of '{name}' is not allowed")
+    return __import__(name, globals, locals, fromlist, level)
+
+
+def safe_builtins() -> dict:
+    """
+    Builtins for generated code: no open(), no eval/exec, imports limited to SAFE_MODULES,
+    getattr() refusing the names check_code() refuses.
+    """
+    allowed = {name: getattr(builtins, name) for name in dir(builtins) if name not in _UNSAFE_BUILTINS}
+    allowed['__import__'] = _safe_import
+    allowed['getattr'] = _safe_getattr
+    return allowed
+
+
+def execute(df, code: str):
+    """
+    Run generated code against df and return its 'result' variable. The code
+    gets a shallow copy, so with copy-on-write it cannot change the cached frame.
+    """
+    import pandas as pd
+
+    check_code(code)
+    namespace = {'__builtins__': safe_builtins(), 'df': df.copy(deep=False), 'pd': pd, 'result': None}
+    exec(code, namespace)
+    return namespace.get('result', None)
+
+
+def export_frame(df, path: str) -> None:
+    """
+    Write df as an uncompressed Arrow IPC file the workers memory-map.
+    """
+    import pyarrow.feather as feather
+    from app.storage import _to_arrow
+
+    feather.write_feather(_to_arrow(df), path + '.tmp', compression='uncompressed')
+    os.replace(path + '.tmp', path)
+
+
+def load_frame(path: str, columns: List):
+    """
+    Memory-mapped read of an exported frame; numeric columns without nulls stay zero-copy.
+    """
+    import pyarrow.feather as feather
+    from app.storage import _from_arrow
+
+    df = _from_arrow(feather.read_table(path, memory_map=True), split_blocks=True)
+    df.columns = columns
+    return df
+
+
+class _CPULimit(BaseException):
+    pass
+
+
+class _WallLimit(BaseException):
+    pass
+
+
+def _raise(exc):
+    def handler(signum, frame):
+        raise exc
+    return handler
+
+
+def _worker_main(conn, memory_limit: int, result_max_bytes: int) -> None:
+    """
+    Sandbox worker loop: one job at a time, each under a CPU-time soft limit
+    (SIGXCPU) and a wall-clock alarm; the whole process under an RLIMIT_DATA cap.
+    """
+    for var in ('OPENBLAS_NUM_THREADS', 'OMP_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ.setdefault(var, '1')
+    import resource
+    import pandas  # noqa: F401  warm the imports before the first job
+    import pyarrow  # noqa: F401
+
+    if memory_limit > 0:
+        resource.setrlimit(resource.RLIMIT_DATA, (memory_limit, resource.getrlimit(resource.RLIMIT_DATA)[1]))
+    # Results go back through the pipe; any file write fails with EFBIG
+    signal.signal(signal.SIGXFSZ, signal.SIG_IGN)
+    resource.setrlimit(resource.RLIMIT_FSIZE, (0, resource.getrlimit(resource.RLIMIT_FSIZE)[1]))
+    signal.signal(signal.SIGXCPU, _raise(_CPULimit()))
+    signal.signal(signal.SIGALRM, _raise(_WallLimit()))
+    cpu_hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+    loaded = (None, None)
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        if job is None:
+            return
+        path, columns, code, cpu_limit, wall_limit = job
+        try:
+            try:
+                usage = resource.getrusage(resource.RUSAGE_SELF)
+                soft = math.ceil(usage.ru_utime + usage.ru_stime + cpu_limit)
+                resource.setrlimit(resource.RLIMIT_CPU, (soft if cpu_hard == resource.RLIM_INFINITY else min(soft, cpu_hard), cpu_hard))
+                signal.setitimer(signal.ITIMER_REAL, wall_limit)
+                if loaded[0] != path:
+                    # Only the last frame is kept, so worker memory stays bounded
+                    loaded = (None, None)
+                    loaded = (path, load_frame(path, columns))
+                result = execute(loaded[1], code)
+            finally:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                resource.setrlimit(resource.RLIMIT_CPU, (cpu_hard, cpu_hard))
+            payload = pickle.dumps(('ok', result), protocol=5)
+            if len(payload) > result_max_bytes:
+                payload = pickle.dumps(('error', ResourceLimitExceeded(
+                    f"Result is {len(payload) / 2 ** 20:.0f} MB, over the {result_max_bytes / 2 ** 20:.0f} MB limit"
+                ), '', False))
+        except _CPULimit:
+            payload = pickle.dumps(('error', ResourceLimitExceeded(f"CPU time limit of {cpu_limit:g}s exceeded"), '', True))
+        except _WallLimit:
+            payload = pickle.dumps(('error', JobTimeout(f"Expert code exceeded {wall_limit:g}s"), '', False))
+        except MemoryError:
+            loaded = (None, None)
+            payload = pickle.dumps(('error', ResourceLimitExceeded(
+                f"Memory limit of {memory_limit / 2 ** 20:.0f} MB exceeded"), '', True))
+        except Exception as e:
+            tb = traceback.format_exc()
+            try:
+                payload = pickle.dumps(('error', e, tb, False))
+            except Exception:
+                payload = pickle.dumps(('error', RuntimeError(f"{type(e).__name__}: {e}"), tb, False))
+        conn.send_bytes(payload)
+
+
+class _Worker:
+    def __init__(self, ctx, memory_limit: int, result_max_bytes: int):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main, args=(child, memory_limit, result_max_bytes), daemon=True,
+            name="expert-sandbox",
+        )
+        self.process.start()
+        child.close()
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+
+class Sandbox:
+    """
+    Pre-started worker processes that run LLM-generated expert code.
+
+    The frame is exported once per upload to an uncompressed Arrow file
+    (put data_dir on /dev/shm to keep it in shared memory) that workers
+    memory-map, so a job only ships the code and gets back the pickled
+    result. Each job is capped by CPU time (RLIMIT_CPU / SIGXCPU) and wall
+    time (an alarm in the worker, then SIGKILL from the parent); each
+    worker by RLIMIT_DATA. A worker that hit a limit or died is replaced.
+    With workers=0 code runs in a thread with only the wall limit (tests/dev).
+    """
+    def __init__(self, workers: int, data_dir: Optional[str] = None, cpu_limit: float = 20.0,
+                 wall_limit: float = 30.0, memory_limit: int = 2 * 1024 ** 3,
+                 result_max_bytes: int = 64 * 1024 ** 2, max_files: int = 32):
+        self.workers = workers
+        self.data_dir = data_dir or os.path.join(tempfile.gettempdir(), "ai_data_bot_sandbox")
+        self.cpu_limit = cpu_limit
+        self.wall_limit = wall_limit
+        self.memory_limit = memory_limit
+        self.result_max_bytes = result_max_bytes
+        self.max_files = max_files
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle: List[_Worker] = []
+        self._all: List[_Worker] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max(1, workers))
+        self._async_slots: Optional[asyncio.Semaphore] = None
+        self._files: "OrderedDict[Any, str]" = OrderedDict()
+        self._file_lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.limits = 0
+        self.crashes = 0
+
+    def start(self) -> None:
+        """
+        Start the worker processes ahead of the first job.
+        """
+        if self.workers > 0:
+            with self._lock:
+                self._start_locked()
+
+    def _start_locked(self) -> None:
+        os.makedirs(self.data_dir, exist_ok=True)
+        while len(self._all) < self.workers:
+            self._spawn()
+
+    def _spawn(self) -> _Worker:
+        worker = _Worker(self._ctx, self.memory_limit, self.result_max_bytes)
+        self._all.append(worker)
+        self._idle.append(worker)
+        return worker
+
+    def _replace(self, worker: _Worker) -> None:
+        worker.kill()
+        with self._lock:
+            if worker in self._all:
+                self._all.remove(worker)
+            self._spawn()
+
+    def _export(self, key, df) -> str:
+        with self._file_lock:
+            path = self._files.get(key)
+            if path is not None and os.path.exists(path):
+                self._files.move_to_end(key)
+                return path
+            os.makedirs(self.data_dir, exist_ok=True)
+            path = os.path.join(self.data_dir, f"{os.getpid()}-{abs(hash(key)):x}.arrow")
+            started = time.perf_counter()
+            export_frame(df, path)
+            logger.info(f"Exported frame for the sandbox in {(time.perf_counter() - started) * 1000:.0f} ms")
+            self._files[key] = path
+            while len(self._files) > self.max_files:
+                _, old = self._files.popitem(last=False)
+                self._unlink(old)
+            return path
+
+    @staticmethod
+    def _unlink(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def discard(self, key) -> None:
+        """
+        Remove the exported file of an upload that is gone.
+        """
+        with self._file_lock:
+            path = self._files.pop(key, None)
+        if path is not None:
+            self._unlink(path)
+
+    def call(self, key, df, code: str) -> Any:
+        """
+        Run code against df in a sandbox worker and return its 'result' (blocking).
+        key identifies the upload, so its frame is exported only once;
+        with key=None the frame is exported for this call only.
+        """
+        if self.workers <= 0:
+            return execute(df, code)
+        one_off = key is None
+        if one_off:
+            key = object()
+        path = self._export(key, df)
+        try:
+            with self._slots:
+                with self._lock:
+                    if not self._all:
+                        self._start_locked()
+                    worker = self._idle.pop()
+                try:
+                    return self._call(worker, (path, list(df.columns), code, self.cpu_limit, self.wall_limit))
+                finally:
+                    with self._lock:
+                        if worker in self._all:
+                            self._idle.append(worker)
+        finally:
+            if one_off:
+                self.discard(key)
+
+    def _call(self, worker: _Worker, job: tuple) -> Any:
+        try:
+            worker.conn.send(job)
+            if not worker.conn.poll(self.wall_limit + _KILL_GRACE):
+                # Stuck in C code where the alarm cannot interrupt it
+                self.timeouts += 1
+                self._replace(worker)
+                raise JobTimeout(f"Expert code exceeded {self.wall_limit:g}s")
+            status, *rest = pickle.loads(worker.conn.recv_bytes())
+        except (EOFError, OSError, BrokenPipeError):
+            # Killed by the kernel (hard CPU limit, OOM) or crashed
+            self.crashes += 1
+            self._replace(worker)
+            raise SandboxError("Expert code worker died (memory or CPU limit)")
+        if status == 'ok':
+            self.completed += 1
+            return rest[0]
+        error, tb, recycle = rest
+        if isinstance(error, JobTimeout):
+            self.timeouts += 1
+        elif isinstance(error, ResourceLimitExceeded):
+            self.limits += 1
+        else:
+            self.failed += 1
+        if recycle:
+            self._replace(worker)
+        error.sandbox_traceback = tb
+        raise error
+
+    async def run(self, key, df, code: str) -> Any:
+        """
+        Async wrapper around call(); waits for a free worker without holding a thread.
+        """
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(max(1, self.workers))
+        async with self._async_slots:
+            if self.workers <= 0:
+                return await asyncio.wait_for(asyncio.to_thread(execute, df, code), self.wall_limit)
+            return await asyncio.to_thread(self.call, key, df, code)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            workers, self._all, self._idle = self._all, [], []
+        for worker in workers:
+            try:
+                worker.conn.send(None)
+            except (OSError, BrokenPipeError):
+                pass
+            worker.kill()
+        with self._file_lock:
+            for path in self._files.values():
+                self._unlink(path)
+            self._files.clear()
+
+    def stats(self) -> dict:
+        return {
+            'workers': len(self._all),
+            'busy': len(self._all) - len(self._idle),
+            'files': len(self._files),
+            'completed': self.completed,
+            'failed': self.failed,
+            'timeouts': self.timeouts,
+            'limits': self.limits,
+            'crashes': self.crashes,
+        }
@@ -0,0 +1,150 @@
+"""
+Column context for the expert-mode LLM prompt. Instead of every column name, the prompt
+lists the columns most relevant to the question (ranked by ColumnIndex.relevance), each
+with a compact type and sample-value hint, until an estimated token budget is spent.
+"""
+import logging
+import math
+import threading
+from typing import List, Optional
+
+import pandas as pd
+
+from app.columns import ColumnIndex
+from app.profile import CATEGORICAL, DATE, NUMERIC, NUMERIC_LIKE
+
+logger = logging.getLogger("AI_DATA_BOT")
+
+SAMPLE_VALUES = 3
+SAMPLE_ROWS = 200
+SAMPLE_MAX_CHARS = 24
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough BPE token count: about 4 characters per token for ASCII text, 2 for other
+    scripts (Cyrillic names cost roughly twice as much).
+    """
+    ascii_chars = sum(1 for ch in text if ch < '\x80')
+    return math.ceil(ascii_chars / 4 + (len(text) - ascii_chars) / 2)
+
+
+def _short(value) -> str:
+    text = ' '.join(str(value).split())
+    return text if len(text) <= SAMPLE_MAX_CHARS else text[:SAMPLE_MAX_CHARS - 1] + '…'
+
+
+def _number(value) -> str:
+    return f"{value:.6g}"
+
+
+def column_hint(col, series: pd.Series, kind: Optional[str] = None, summary=None) -> str:
+    """
+    'name (type, hint)' for one column of the typed frame: the range of numbers and dates,
+    the distinct count and most frequent values of categories, sample values of text.
+    summary is the column's ColumnSummary when the file summary is ready.
+    """
+    if isinstance(series, pd.DataFrame):
+        series = series.iloc[:, 0]
+    if kind is None:
+        if pd.api.types.is_bool_dtype(series):
+            kind = CATEGORICAL
+        elif pd.api.types.is_numeric_dtype(series):
+            kind = NUMERIC
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            kind = DATE
+    if kind in (NUMERIC, NUMERIC_LIKE) and pd.api.types.is_numeric_dtype(series):
+        stats = summary.stats if summary is not None else None
+        if stats is None:
+            values = series.dropna()
+            stats = {'min': values.min(), 'max': values.max()} if not values.empty else None
+        return f"{col} (num {_number(stats['min'])}..{_number(stats['max'])})" if stats else f"{col} (num)"
+    if kind == DATE and pd.api.types.is_datetime64_any_dtype(series):
+        values = series.dropna()
+        if values.empty:
+            return f"{col} (date)"
+        return f"{col} (date {values.min():%Y-%m-%d}..{values.max():%Y-%m-%d})"
+    if summary is not None:
+        samples = [value for value, _ in summary.value_counts if not pd.isna(value)][:SAMPLE_VALUES]
+        n_unique = summary.n_unique
+    else:
+        samples = list(series.head(SAMPLE_ROWS).dropna().unique()[:SAMPLE_VALUES])
+        n_unique = None
+    shown = ', '.join(_short(v) for v in samples)
+    if kind == CATEGORICAL:
+        count = f"{n_unique} values: " if n_unique is not None else ""
+        return f"{col} (cat, {count}{shown})"
+    return f"{col} (text, e.g. {shown})" if shown else f"{col} (text)"
+
+
+class SchemaContext:
+    """
+    The column block of one prompt and what it cost compared to listing every column name.
+    """
+    def __init__(self, text: str, columns: List, omitted: int, tokens: int, full_tokens: int):
+        self.text = text
+        self.columns = columns
+        self.omitted = omitted
+        self.tokens = tokens
+        self.full_tokens = full_tokens
+
+    @property
+    def saved(self) -> int:
+        # Negative on narrow sheets, where the hints cost more than the bare names did
+        return self.full_tokens - self.tokens
+
+
+class SchemaPromptBuilder:
+    """
+    Builds the prompt's column block within budget estimated tokens and keeps totals.
+    """
+    def __init__(self, budget: int):
+        self.budget = budget
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.tokens_sent = 0
+        self.tokens_saved = 0
+        self.columns_omitted = 0
+
+    def build(self, question: str, index: ColumnIndex, df: pd.DataFrame, profile=None, summary=None) -> SchemaContext:
+        """
+        Columns of df most relevant to question first, then the rest in file order,
+        one hint per line while the budget lasts. At least one column is always listed.
+        """
+        columns = index.columns
+        scores = index.relevance(question)
+        position = {col: i for i, col in enumerate(columns)}
+        ranked = sorted(scores, key=lambda col: (-scores[col], position[col]))
+        ranked += [col for col in columns if col not in scores]
+        kinds = profile.kinds if profile is not None else {}
+        lines = []
+        tokens = 0
+        for col in ranked:
+            line = "- " + column_hint(col, df[col], kinds.get(col), summary.get(col) if summary is not None else None)
+            cost = estimate_tokens(line) + 1
+            if lines and tokens + cost > self.budget:
+                break
+            lines.append(line)
+            tokens += cost
+        omitted = len(columns) - len(lines)
+        if omitted:
+            lines.append(f"({omitted} less relevant columns not shown)")
+            tokens += estimate_tokens(lines[-1])
+        # What the prompt used to carry: every column name, comma separated
+        full_tokens = estimate_tokens(', '.join(str(c) for c in columns))
+        context = SchemaContext('\n'.join(lines), ranked[:len(columns) - omitted], omitted, tokens, full_tokens)
+        with self._lock:
+            self.requests += 1
+            self.tokens_sent += tokens
+            self.tokens_saved += context.saved
+            self.columns_omitted += omitted
+        return context
+
+    def stats(self) -> dict:
+        return {
+            'budget': self.budget,
+            'requests': self.requests,
+            'tokens_sent': self.tokens_sent,
+            'tokens_saved': self.tokens_saved,
+            'columns_omitted': self.columns_omitted,
+        }
@@ -0,0 +1,250 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, List
+
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+from app.utils import split_message
+
+logger = logging.getLogger("AI_DATA_BOT")
+
+
+class _Bucket:
+    """
+    Token bucket: rate sends per second with bursts of up to burst.
+    """
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class _ChatState:
+    def __init__(self, bucket: _Bucket):
+        self.bucket = bucket
+        self.queue = deque()
+        self.worker = None
+        self.sent = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_ms = 0.0
+
+
+class MessageSender:
+    """
+    Outgoing message pipeline shared by all chats.
+
+    Each chat has a FIFO queue drained by one task, so chunks arrive in order.
+    Sends are paced by a global and a per-chat token bucket (groups get
+    Telegram's lower per-minute limit); a flood-control RetryAfter waits the
+    time Telegram asks for, network errors back off exponentially. Latency
+    (queueing plus the API call) is tracked per chat.
+    """
+    def __init__(self, rate: float = 30.0, chat_rate: float = 1.0, group_rate: float = 20 / 60,
+                 burst: int = 3, max_retries: int = 5, backoff: float = 1.0, max_chats: int = 10_000):
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_chats = max_chats
+        self._global = _Bucket(rate, max(1, int(rate)))
+        self._chats: "OrderedDict[int, _ChatState]" = OrderedDict()
+        self.sent = 0
+        self.retries = 0
+        self.flood_waits = 0
+        self.errors = 0
+
+    def _chat(self, chat_id) -> _ChatState:
+        state = self._chats.get(chat_id)
+        if state is None:
+            # Negative ids are groups and channels
+            rate = self.group_rate if isinstance(chat_id, int) and chat_id < 0 else self.chat_rate
+            state = self._chats[chat_id] = _ChatState(_Bucket(rate, self.burst))
+            self._trim()
+        self._chats.move_to_end(chat_id)
+        return state
+
+    def _trim(self) -> None:
+        for chat_id in list(self._chats):
+            if len(self._chats) <= self.max_chats:
+                break
+            if self._chats[chat_id].worker is None:
+                del self._chats[chat_id]
+
+    async def submit(self, chat_id, send: Callable[[], Awaitable]):
+        """
+        Queue one API call for the chat and wait until it has gone out; returns its result.
+        """
+        state = self._chat(chat_id)
+        future = asyncio.get_running_loop().create_future()
+        state.queue.append((send, future, time.monotonic()))
+        if state.worker is None:
+            state.worker = asyncio.create_task(self._drain(chat_id, state))
+        return await future
+
+    async def send_chunks(self, chat_id, chunks: List[str], send: Callable[..., Awaitable], **kwargs) -> list:
+        """
+        Send chunks in order with send(chunk); kwargs (e.g. reply_markup) go with the last one.
+        """
+        started = time.monotonic()
+        last = len(chunks) - 1
+        results = await asyncio.gather(*(
+            self.submit(chat_id, lambda chunk=chunk, i=i: send(chunk, **(kwargs if i == last else {})))
+            for i, chunk in enumerate(chunks)
+        ))
+        if len(chunks) > 1:
+            logger.info(f"Sent {len(chunks)} chunks to chat {chat_id} in {(time.monotonic() - started) * 1000:.0f} ms")
+        return results
+
+    async def send_text(self, chat_id, text: str, send: Callable[..., Awaitable], **kwargs) -> list:
+        """
+        Split text for Telegram and send the chunks in order.
+        """
+        return await self.send_chunks(chat_id, split_message(text), send, **kwargs)
+
+    async def _drain(self, chat_id, state: _ChatState) -> None:
+        try:
+            while state.queue:
+                send, future, queued = state.queue.popleft()
+                try:
+                    result = await self._deliver(state, send)
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                    continue
+                elapsed = (time.monotonic() - queued) * 1000
+                state.sent += 1
+                state.total_ms += elapsed
+                state.last_ms = elapsed
+                state.max_ms = max(state.max_ms, elapsed)
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            state.worker = None
+
+    async def _deliver(self, state: _ChatState, send: Callable[[], Awaitable]):
+        attempt = 0
+        while True:
+            await state.bucket.acquire()
+            await self._global.acquire()
+            try:
+                result = await send()
+                self.sent += 1
+                return result
+            except RetryAfter as e:
+                # Flood control: wait exactly as long as Telegram asks, it does not count as a failure
+                self.flood_waits += 1
+                logger.warning(f"Telegram flood control, waiting {e.retry_after}s")
+                await asyncio.sleep(float(e.retry_after))
+            except BadRequest:
+                self.errors += 1
+                raise
+            except NetworkError as e:
+                if attempt >= self.max_retries:
+                    self.errors += 1
+                    raise
+                delay = min(self.backoff * (2 ** attempt), 30.0)
+                attempt += 1
+                self.retries += 1
+                logger.warning(f"Telegram send failed ({type(e).__name__}), retry {attempt} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    def chat_stats(self, chat_id) -> dict:
+        """
+        Send latency for one chat, from queueing to Telegram's reply, in milliseconds.
+        """
+        state = self._chats.get(chat_id)
+        if state is None or not state.sent:
+            return {'sent': 0, 'queued': len(state.queue) if state else 0}
+        return {
+            'sent': state.sent,
+            'queued': len(state.queue),
+            'avg_ms': round(state.total_ms / state.sent, 1),
+            'max_ms': round(state.max_ms, 1),
+            'last_ms': round(state.last_ms, 1),
+        }
+
+    def stats(self) -> dict:
+        return {
+            'sent': self.sent,
+            'retries': self.retries,
+            'flood_waits': self.flood_waits,
+            'errors': self.errors,
+            'chats': len(self._chats),
+            'queued': sum(len(s.queue) for s in self._chats.values()),
+        }
+
+
+class ProgressMessage:
+    """
+    A status message for a long step: sent with start(), edited to the latest update()
+    at most once per interval (through the chat's paced queue), deleted by finish().
+    Best effort: a failed send or edit is logged and never reaches the caller.
+    """
+    def __init__(self, sender: MessageSender, chat_id, send: Callable[..., Awaitable], interval: float = 1.5):
+        self.sender = sender
+        self.chat_id = chat_id
+        self.send = send
+        self.interval = interval
+        self.message = None
+        self._text = None
+        self._shown = None
+        self._sending = None
+        self._ticker = None
+
+    def start(self, text: str) -> None:
+        """
+        Send the status message in the background; the step it describes starts at once.
+        """
+        self._text = text
+        self._sending = asyncio.create_task(self._send(text))
+
+    def update(self, text: str) -> None:
+        self._text = text
+
+    async def _send(self, text: str) -> None:
+        try:
+            self.message = await self.sender.submit(self.chat_id, lambda: self.send(text))
+        except Exception as e:
+            logger.warning(f"Progress message not sent: {e!r}")
+            return
+        self._shown = text
+        self._ticker = asyncio.create_task(self._tick())
+
+    async def _tick(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            text = self._text
+            if text == self._shown:
+                continue
+            try:
+                await self.sender.submit(self.chat_id, lambda: self.message.edit_text(text))
+            except Exception as e:
+                logger.debug(f"Progress edit failed: {e!r}")
+            self._shown = text
+
+    async def finish(self) -> None:
+        if self._sending is None:
+            return
+        await self._sending
+        if self._ticker is not None:
+            self._ticker.cancel()
+        if self.message is not None:
+            try:
+                await self.sender.submit(self.chat_id, self.message.delete)
+            except Exception as e:
+                logger.debug(f"Progress message not deleted: {e!r}")
@@ -0,0 +1,160 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+logger = logging.getLogger("AI_DATA_BOT")
+
+
+class UploadTooLarge(Exception):
+    """
+    Raised when an upload exceeds the per-user cap and cannot be spilled to disk.
+    """
+
+
+class SessionStore:
+    """
+    Per-user upload sessions (what used to be the unbounded user_files dict).
+
+    A session is a dict with at least 'key' and 'bytes' (raw upload, may be None).
+    Raw bytes count against a global budget and a per-user cap. Sessions idle
+    longer than idle_ttl expire. Over budget, the least recently used sessions
+    have their bytes spilled to spill_dir (if set) or are dropped. on_evict(user_id,
+    session) is called when a session is dropped so caches can release it too.
+    """
+    def __init__(self, max_bytes: int, per_user_bytes: int, idle_ttl: float,
+                 spill_dir: Optional[str] = None, on_evict: Optional[Callable] = None):
+        self.max_bytes = max_bytes
+        self.per_user_bytes = per_user_bytes
+        self.idle_ttl = idle_ttl
+        self.spill_dir = spill_dir
+        self.on_evict = on_evict
+        self._sessions: "OrderedDict[int, dict]" = OrderedDict()
+        self._touched: dict = {}
+        self._lock = threading.RLock()
+        self.memory_bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.spills = 0
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    @staticmethod
+    def _size(session: dict) -> int:
+        data = session.get('bytes')
+        return len(data) if data is not None else 0
+
+    def __contains__(self, user_id) -> bool:
+        return self.get(user_id) is not None
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, user_id) -> Optional[dict]:
+        with self._lock:
+            self._expire()
+            session = self._sessions.get(user_id)
+            if session is not None:
+                self._sessions.move_to_end(user_id)
+                self._touched[user_id] = time.monotonic()
+            return session
+
+    def __getitem__(self, user_id) -> dict:
+        session = self.get(user_id)
+        if session is None:
+            raise KeyError(user_id)
+        return session
+
+    def __setitem__(self, user_id, session: dict) -> None:
+        self.put(user_id, session)
+
+    def put(self, user_id, session: dict) -> None:
+        size = self._size(session)
+        with self._lock:
+            self.pop(user_id, notify=False)
+            if size > self.per_user_bytes:
+                if not self.spill_dir:
+                    raise UploadTooLarge(f"File is larger than the {self.per_user_bytes // (1024 * 1024)} MB limit.")
+                self._spill(user_id, session)
+                size = 0
+            self._sessions[user_id] = session
+            self._touched[user_id] = time.monotonic()
+            self.memory_bytes += size
+            self._expire()
+            self._evict()
+
+    def pop(self, user_id, notify: bool = True) -> Optional[dict]:
+        with self._lock:
+            session = self._sessions.pop(user_id, None)
+            self._touched.pop(user_id, None)
+            if session is None:
+                return None
+            self.memory_bytes -= self._size(session)
+            self._remove_spill(session)
+        if notify and self.on_evict:
+            self.on_evict(user_id, session)
+        return session
+
+    def load_bytes(self, user_id) -> Optional[bytes]:
+        """
+        Raw upload bytes, read back from the spill file if they were spilled.
+        """
+        session = self.get(user_id)
+        if session is None:
+            return None
+        if session.get('bytes') is not None:
+            return session['bytes']
+        if session.get('spill'):
+            with open(session['spill'], 'rb') as f:
+                return f.read()
+        return None
+
+    def _spill(self, user_id, session: dict) -> None:
+        path = os.path.join(self.spill_dir, f"{user_id}.bin")
+        with open(path, 'wb') as f:
+            f.write(session['bytes'])
+        session['bytes'] = None
+        session['spill'] = path
+        self.spills += 1
+
+    @staticmethod
+    def _remove_spill(session: dict) -> None:
+        path = session.pop('spill', None)
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        while self._sessions:
+            user_id = next(iter(self._sessions))
+            if now - self._touched[user_id] <= self.idle_ttl:
+                break
+            self.expirations += 1
+            self.pop(user_id)
+
+    def _evict(self) -> None:
+        for user_id in list(self._sessions):
+            if self.memory_bytes <= self.max_bytes:
+                break
+            session = self._sessions[user_id]
+            if self._size(session) == 0:
+                continue
+            self.evictions += 1
+            if self.spill_dir:
+                self.memory_bytes -= self._size(session)
+                self._spill(user_id, session)
+            else:
+                self.pop(user_id)
+            logger.info(f"Session store evicted user {user_id}, {self.stats()}")
+
+    def stats(self) -> dict:
+        return {
+            'sessions': len(self._sessions),
+            'memory_bytes': self.memory_bytes,
+            'max_bytes': self.max_bytes,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'spills': self.spills,
+        }
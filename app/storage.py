@@ -0,0 +1,294 @@
+import base64
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from typing import List, Optional
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # optional: without pyarrow uploads stay in memory only
+    pa = None
+    feather = None
+
+logger = logging.getLogger("AI_DATA_BOT")
+
+
+def _store_key(key: tuple) -> str:
+    return f"{key[0]}:{key[1]}"
+
+
+# Schema metadata listing the fields whose values are pickled one by one
+_PICKLED = b'pickled_fields'
+
+
+def _encode_label(col):
+    """
+    JSON-safe form of a column label for the manifest: str, int, float, bool and None as
+    they are, anything else (dates, tuples, numpy scalars) pickled under a 'pickled' key.
+    """
+    if col is None or type(col) in (str, int, float, bool):
+        return col
+    return {'pickled': base64.b64encode(pickle.dumps(col, protocol=5)).decode('ascii')}
+
+
+def _decode_label(value):
+    if isinstance(value, dict):
+        return pickle.loads(base64.b64decode(value['pickled']))
+    return value
+
+
+def _field_names(columns: List) -> List[str]:
+    """
+    Unique Arrow field names for the columns, in order: str(column), with '#position'
+    appended to repeats (duplicate names, or 1 and '1').
+    """
+    names, seen = [], set()
+    for pos, col in enumerate(columns):
+        name = str(col)
+        while name in seen:
+            name = f"{name}#{pos}"
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+def _to_arrow(df: pd.DataFrame):
+    """
+    Arrow table with unique string field names (see _field_names). Object columns Arrow
+    cannot type (mixed int and str, say) keep their exact values as pickled cells.
+    """
+    arrays, pickled = [], []
+    names = _field_names(df.columns)
+    for pos, name in enumerate(names):
+        series = df.iloc[:, pos]
+        try:
+            arrays.append(pa.array(series, from_pandas=True))
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            arrays.append(pa.array([pickle.dumps(v, protocol=5) for v in series], type=pa.binary()))
+            pickled.append(name)
+    metadata = {_PICKLED: json.dumps(pickled).encode()} if pickled else None
+    return pa.Table.from_arrays(arrays, names=names, metadata=metadata)
+
+
+def _from_arrow(table, **kwargs) -> pd.DataFrame:
+    """
+    DataFrame from a _to_arrow() table (or a projection of one), pickled cells restored.
+    Columns keep the Arrow field names; kwargs go to Table.to_pandas.
+    """
+    metadata = table.schema.metadata or {}
+    df = table.to_pandas(**kwargs)
+    for name in json.loads(metadata.get(_PICKLED, b'[]')):
+        if name in df.columns:
+            df[name] = pd.Series([pickle.loads(v) for v in df[name]], index=df.index, dtype=object)
+    return df
+
+
+class UploadStore:
+    """
+    Keeps each parsed upload on local disk as an uncompressed Arrow IPC (Feather v2) file.
+
+    Reloads are memory-mapped and can project columns, so a single-column
+    aggregation touches only that column's pages. Files expire after
+    retention seconds without access, and the oldest are removed when the
+    store exceeds quota_bytes. Only the latest upload per user is kept.
+    """
+    MANIFEST = 'manifest.json'
+
+    def __init__(self, root: str, retention: float, quota_bytes: int):
+        self.root = root
+        self.retention = retention
+        self.quota_bytes = quota_bytes
+        self.enabled = pa is not None
+        self._lock = threading.Lock()
+        self._manifest = {}
+        if self.enabled:
+            os.makedirs(root, exist_ok=True)
+            self._load_manifest()
+            self.cleanup()
+        else:
+            logger.warning("pyarrow is not installed; upload store disabled")
+
+    def _path(self, key: tuple, user_id: int) -> str:
+        return os.path.join(self.root, f"{user_id}-{key[1]}.arrow")
+
+    def _load_manifest(self):
+        path = os.path.join(self.root, self.MANIFEST)
+        if os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    self._manifest = json.load(f)
+            except Exception:
+                logger.warning("Upload store manifest unreadable, starting empty", exc_info=True)
+
+    def _save_manifest(self):
+        path = os.path.join(self.root, self.MANIFEST)
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self._manifest, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def __contains__(self, key: tuple) -> bool:
+        return self.enabled and _store_key(key) in self._manifest
+
+    def save(self, key: tuple, df: pd.DataFrame, user_id: int) -> bool:
+        """
+        Write df as a columnar file. Returns False if the store is disabled or full.
+        """
+        if not self.enabled:
+            return False
+        path = self._path(key, user_id)
+        feather.write_feather(_to_arrow(df), path + '.tmp', compression='uncompressed')
+        os.replace(path + '.tmp', path)
+        return self._register(key, user_id, path, list(df.columns))
+
+    def open_writer(self, key: tuple, user_id: int, columns: List) -> Optional["ChunkWriter"]:
+        """
+        Incremental writer for uploads streamed in chunks (all columns stored as strings).
+        Returns None if the store is disabled.
+        """
+        if not self.enabled:
+            return None
+        return ChunkWriter(self, key, user_id, columns)
+
+    def _register(self, key: tuple, user_id: int, path: str, columns: List) -> bool:
+        size = os.path.getsize(path)
+        now = time.time()
+        entry = {
+            'user_id': user_id,
+            'file': os.path.basename(path),
+            'columns': [_encode_label(c) for c in columns],
+            'nbytes': size,
+            'created': now,
+            'accessed': now,
+        }
+        with self._lock:
+            for old_key, meta in list(self._manifest.items()):
+                if meta['user_id'] == user_id and old_key != _store_key(key):
+                    self._remove(old_key)
+            self._manifest[_store_key(key)] = entry
+            try:
+                self._save_manifest()
+            except Exception:
+                # A manifest that cannot be written must not break every later save
+                self._remove(_store_key(key))
+                raise
+        self.cleanup()
+        return key in self
+
+    def columns(self, key: tuple) -> List:
+        return [_decode_label(c) for c in self._manifest[_store_key(key)]['columns']]
+
+    def load(self, key: tuple, columns: Optional[List] = None) -> pd.DataFrame:
+        """
+        Memory-map the stored file and read only the requested columns.
+        """
+        meta = self._manifest[_store_key(key)]
+        labels = self.columns(key)
+        fields = list(zip(_field_names(labels), labels))
+        if columns is not None:
+            fields = [(name, col) for name, col in fields if col in columns]
+        table = feather.read_table(os.path.join(self.root, meta['file']), columns=[name for name, _ in fields],
+                                   memory_map=True)
+        meta['accessed'] = time.time()
+        df = _from_arrow(table)
+        df.columns = [col for _, col in fields]
+        return df
+
+    def latest(self, user_id: int) -> Optional[tuple]:
+        """
+        Key of the user's stored upload (survives restarts), or None.
+        """
+        for store_key, meta in self._manifest.items():
+            if meta['user_id'] == user_id:
+                file_id, digest = store_key.rsplit(':', 1)
+                return (file_id, digest)
+        return None
+
+    def discard_user(self, user_id: int) -> None:
+        """
+        Forget the user's stored upload, e.g. when the new one is not stored here.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            stale = [store_key for store_key, meta in self._manifest.items() if meta['user_id'] == user_id]
+            for store_key in stale:
+                self._remove(store_key)
+            if stale:
+                self._save_manifest()
+
+    def _remove(self, store_key: str):
+        meta = self._manifest.pop(store_key, None)
+        if meta:
+            try:
+                os.remove(os.path.join(self.root, meta['file']))
+            except FileNotFoundError:
+                pass
+
+    def cleanup(self) -> None:
+        """
+        Drop files idle longer than the retention period, then the least recently used over quota.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            now = time.time()
+            for store_key, meta in list(self._manifest.items()):
+                if now - meta['accessed'] > self.retention:
+                    self._remove(store_key)
+            by_age = sorted(self._manifest.items(), key=lambda item: item[1]['accessed'])
+            total = sum(meta['nbytes'] for _, meta in by_age)
+            for store_key, meta in by_age:
+                if total <= self.quota_bytes:
+                    break
+                self._remove(store_key)
+                total -= meta['nbytes']
+            self._save_manifest()
+
+    def stats(self) -> dict:
+        return {
+            'enabled': self.enabled,
+            'files': len(self._manifest),
+            'bytes': sum(meta['nbytes'] for meta in self._manifest.values()),
+            'quota_bytes': self.quota_bytes,
+        }
+
+
+class ChunkWriter:
+    """
+    Appends string-typed DataFrame chunks to an Arrow IPC file; bounded memory per chunk.
+    """
+    def __init__(self, store: UploadStore, key: tuple, user_id: int, columns: List):
+        self.store = store
+        self.key = key
+        self.user_id = user_id
+        self.columns = list(columns)
+        self.path = store._path(key, user_id)
+        self.schema = pa.schema([(name, pa.string()) for name in _field_names(self.columns)])
+        self._sink = pa.OSFile(self.path + '.tmp', 'wb')
+        self._writer = pa.ipc.new_file(self._sink, self.schema)
+
+    def write(self, chunk: pd.DataFrame) -> None:
+        arrays = [pa.array(chunk[c].astype(object).where(chunk[c].notna(), None), type=pa.string())
+                  for c in self.columns]
+        self._writer.write_batch(pa.record_batch(arrays, schema=self.schema))
+
+    def commit(self) -> bool:
+        self._writer.close()
+        self._sink.close()
+        os.replace(self.path + '.tmp', self.path)
+        return self.store._register(self.key, self.user_id, self.path, self.columns)
+
+    def abort(self) -> None:
+        try:
+            self._writer.close()
+            self._sink.close()
+        finally:
+            if os.path.exists(self.path + '.tmp'):
+                os.remove(self.path + '.tmp')
@@ -0,0 +1,103 @@
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from app.profile import NUMERIC, NUMERIC_LIKE
+
+# Full value counts / unique lists are kept only for columns with at most this many distinct values
+SUMMARY_MAX_DISTINCT = 10_000
+# Otherwise only the most frequent values are kept
+SUMMARY_TOP_VALUES = 100
+
+
+class ColumnSummary:
+    """
+    Precomputed aggregates for one column.
+    """
+    def __init__(self, count: int, nulls: int, n_unique: int,
+                 value_counts: List[Tuple], truncated: bool,
+                 uniques: Optional[list], stats: Optional[Dict[str, float]]):
+        self.count = count
+        self.nulls = nulls
+        self.n_unique = n_unique
+        self.value_counts = value_counts
+        self.truncated = truncated
+        self.uniques = uniques
+        self.stats = stats
+
+    def value_counts_text(self) -> Optional[str]:
+        """
+        Same text as analytics.value_counts_text, or None if the counts were truncated.
+        """
+        if self.truncated:
+            return None
+        return "\n".join(f"{str(k)}: {v}" for k, v in self.value_counts)
+
+    def unique_values_text(self) -> Optional[str]:
+        """
+        Same text as analytics.unique_values_text, or None if too many distinct values.
+        """
+        if self.uniques is None:
+            return None
+        return "\n".join(str(m) for m in self.uniques)
+
+
+class FileSummary:
+    """
+    Aggregates for every column of an upload, built once in the background after upload.
+    """
+    def __init__(self, rows: int, columns: Dict[object, ColumnSummary], names: Optional[list] = None):
+        self.rows = rows
+        self.columns = columns
+        self.names = list(columns) if names is None else names
+
+    def get(self, col) -> Optional[ColumnSummary]:
+        return self.columns.get(col)
+
+
+def summarize_column(series: pd.Series, numeric: Optional[pd.Series] = None) -> ColumnSummary:
+    counts = series.value_counts(dropna=False)
+    nulls = int(series.isna().sum())
+    n_unique = int(len(counts) - (1 if nulls else 0))
+    truncated = len(counts) > SUMMARY_MAX_DISTINCT
+    if truncated:
+        counts = counts.iloc[:SUMMARY_TOP_VALUES]
+    uniques = None if n_unique > SUMMARY_MAX_DISTINCT else list(series.dropna().unique())
+    stats = None
+    if numeric is not None:
+        values = numeric.dropna()
+        if not values.empty:
+            stats = {
+                'min': float(values.min()),
+                'max': float(values.max()),
+                'mean': float(values.mean()),
+                'median': float(values.median()),
+                'sum': float(values.sum()),
+                'std': float(values.std()) if len(values) > 1 else 0.0,
+            }
+    return ColumnSummary(
+        count=int(len(series) - nulls), nulls=nulls, n_unique=n_unique,
+        value_counts=list(counts.items()), truncated=truncated, uniques=uniques, stats=stats,
+    )
+
+
+def build_summary(df: pd.DataFrame, profile=None) -> FileSummary:
+    """
+    Value counts, unique sets, null counts and numeric stats for every column.
+    Numeric-like text columns use the converted values from the profile.
+    Module-level so it can run in a worker process.
+    """
+    columns = {}
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series, pd.DataFrame):
+            continue
+        numeric = None
+        kind = profile.kinds.get(col) if profile is not None else None
+        if kind == NUMERIC_LIKE:
+            numeric = profile.converted[col]
+        elif kind == NUMERIC or (kind is None and pd.api.types.is_numeric_dtype(series)
+                                 and not pd.api.types.is_bool_dtype(series)):
+            numeric = series
+        columns[col] = summarize_column(series, numeric)
+    return FileSummary(len(df), columns, list(df.columns))
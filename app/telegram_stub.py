@@ -0,0 +1,113 @@
+"""
+Local fake of the Telegram Bot API for offline load tests.
+
+Answers the methods the bot uses (getMe, getFile, sendMessage, editMessageText,
+sendDocument, sendChatAction, answerCallbackQuery) with plausible results after
+an optional delay, and serves one upload's bytes as every file download.
+Point a telegram.Bot at it with bot_for(server).
+"""
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from telegram import Bot
+from telegram.request import HTTPXRequest
+
+TOKEN = "123456:STUB"
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "StubBot", "username": "stub_bot"}
+
+
+class TelegramStubHandler(BaseHTTPRequestHandler):
+    delay = 0.0
+    file_bytes = b""
+    calls = None
+    message_ids = None
+
+    def _reply(self, status: int, body: bytes, content_type: str = 'application/json'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _params(self) -> dict:
+        length = int(self.headers.get('Content-Length', 0))
+        raw = self.rfile.read(length)
+        if self.headers.get('Content-Type', '').startswith('application/x-www-form-urlencoded'):
+            return {k: v[0] for k, v in parse_qs(raw.decode()).items()}
+        # Multipart uploads (sendDocument): the parameters are not needed
+        return {}
+
+    def _message(self, params: dict, **fields) -> dict:
+        chat_id = int(params.get('chat_id', 0) or 0)
+        message = {
+            "message_id": next(self.message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+        }
+        message.update(fields)
+        return message
+
+    def do_GET(self):
+        # File downloads: /file/bot<token>/<file_path>
+        time.sleep(self.delay)
+        self.calls['download'] = self.calls.get('download', 0) + 1
+        self._reply(200, self.file_bytes, 'application/octet-stream')
+
+    def do_POST(self):
+        method = self.path.rsplit('/', 1)[-1]
+        params = self._params()
+        time.sleep(self.delay)
+        self.calls[method] = self.calls.get(method, 0) + 1
+        if method == 'getMe':
+            result = BOT_USER
+        elif method == 'getFile':
+            file_id = params.get('file_id', 'file')
+            result = {"file_id": file_id, "file_unique_id": file_id, "file_size": len(self.file_bytes),
+                      "file_path": f"documents/{file_id}"}
+        elif method in ('sendMessage', 'editMessageText'):
+            result = self._message(params, text=params.get('text', ''))
+        elif method == 'sendDocument':
+            result = self._message(params, document={"file_id": "sent", "file_unique_id": "sent"})
+        else:
+            result = True
+        self._reply(200, json.dumps({"ok": True, "result": result}).encode())
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(file_bytes: bytes, port: int = 0, delay: float = 0.0) -> ThreadingHTTPServer:
+    """
+    Fake Bot API serving file_bytes for downloads; server.calls counts requests per method.
+    """
+    handler = type('ConfiguredTelegramStubHandler', (TelegramStubHandler,), {
+        'delay': delay, 'file_bytes': file_bytes, 'calls': {}, 'message_ids': itertools.count(1000),
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    server.calls = handler.calls
+    return server
+
+
+def start_in_thread(file_bytes: bytes, port: int = 0, delay: float = 0.0) -> ThreadingHTTPServer:
+    """
+    Start the fake Bot API in a daemon thread and return it.
+    """
+    server = make_server(file_bytes, port, delay)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bot_for(server: ThreadingHTTPServer) -> Bot:
+    """
+    A telegram.Bot whose API and file URLs point at the stub, with a connection pool
+    as large as the one ApplicationBuilder gives the real bot.
+    """
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    return Bot(TOKEN, base_url=f"{base}/bot", base_file_url=f"{base}/file/bot",
+               request=HTTPXRequest(connection_pool_size=256))
@@ -0,0 +1,31 @@
+import pandas as pd
+from app.cache import DataFrameCache, file_key, frame_nbytes
+
+def test_file_key_depends_on_content():
+    assert file_key('f1', b'abc') == file_key('f1', bytearray(b'abc'))
+    assert file_key('f1', b'abc') != file_key('f1', b'abd')
+
+def test_get_or_load_parses_once():
+    cache = DataFrameCache(10 * 1024 * 1024)
+    calls = []
+    def loader():
+        calls.append(1)
+        return pd.DataFrame({'A': [1, 2, 3]})
+    key = file_key('f1', b'data')
+    first = cache.get_or_load(key, loader)
+    second = cache.get_or_load(key, loader)
+    assert first is second
+    assert len(calls) == 1
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+def test_lru_eviction_by_memory_budget():
+    df = pd.DataFrame({'A': range(1000)})
+    cache = DataFrameCache(frame_nbytes(df) * 2)
+    cache.put(('a', '1'), df)
+    cache.put(('b', '2'), df.copy())
+    cache.get(('a', '1'))
+    cache.put(('c', '3'), df.copy())
+    assert ('a', '1') in cache
+    assert ('b', '2') not in cache
+    assert cache.stats()['evictions'] == 1
@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+import pytest
+from app.code_analysis import CodeAnalyzer, CodeRejected
+from app.sandbox import execute
+
+@pytest.fixture
+def df():
+    n = 1_000_000
+    return pd.DataFrame({'a': np.arange(n), 'b': np.linspace(0, 1, n),
+                         'city': np.tile(['Moscow', 'Kazan', None, 'Сочи'], n // 4),
+                         'g': np.tile(['x', 'y'], n // 2)})
+
+@pytest.mark.parametrize('code, expected', [
+    ("result = df.apply(lambda r: r['a'] * 2 + r.b, axis=1).sum()", "df['a'] * 2 + df['b']"),
+    ("result = df.apply(lambda row: row['a'] > 10 and not row['b'] < 0.5, axis=1).sum()", "&"),
+    ("result = df['city'].dropna().apply(lambda x: x.lower()).value_counts()", "df['city'].dropna().str.lower()"),
+    ("result = df['a'].map(float).sum()", "df['a'].astype('float')"),
+    ("result = df['b'].apply(lambda v: round(v)).sum()", "df['b'].round().astype('int64')"),
+    ("result = df['g'].apply(lambda x: len(x)).sum()", "df['g'].str.len()"),
+    ("result = df['city'].str.contains('Mos').sum()", "regex=False"),
+])
+def test_rewrites_are_vectorized_and_equivalent(df, code, expected):
+    small = df.head(1000)
+    analysis = CodeAnalyzer(10).analyze(code, df)
+    assert analysis.rewrites and expected in analysis.code and analysis.cost < 1
+    original, rewritten = execute(small, code), execute(small, analysis.code)
+    if isinstance(original, pd.Series):
+        pd.testing.assert_series_equal(original, rewritten, check_names=False, check_dtype=False)
+    else:
+        assert original == rewritten
+
+@pytest.mark.parametrize('code', [
+    "total = 0\nfor i, row in df.iterrows():\n    total += row['a']\nresult = total",
+    "def f(r):\n    return r['a'] + 1\nresult = df.apply(f, axis=1).sum()",
+    "result = df.apply(lambda r: r['city'][:3], axis=1)",
+    "for i in range(len(df)):\n    x = df.loc[i, 'a']",
+    "result = len(df.merge(df, on='g'))",
+    "result = len(pd.merge(df, df, how='cross'))",
+])
+def test_expensive_patterns_are_rejected_with_estimate(df, code):
+    analyzer = CodeAnalyzer(10)
+    with pytest.raises(CodeRejected) as e:
+        analyzer.analyze(code, df)
+    assert e.value.cost > 10 and '1000000 rows' in str(e.value)
+    # The same code is fine on a small file
+    assert analyzer.analyze(code, df.head(100)).cost < 10
+    assert analyzer.stats()['rejected'] == 1
+
+def test_cheap_code_untouched_and_missing_columns_found(df):
+    analyzer = CodeAnalyzer(10)
+    code = "result = df.groupby('g')['a'].mean()"
+    analysis = analyzer.analyze(code, df)
+    assert analysis.code == code and not analysis.rewrites and not analysis.missing
+    assert analyzer.analyze("result = len(df.merge(df, on='a'))", df).cost == 0
+    assert analyzer.analyze("result = df['nope'].sum()", df).missing == ['nope']
+    guarded = "result = df['gender'].value_counts() if 'gender' in df.columns else 'no gender'"
+    assert analyzer.analyze(guarded, df).missing == []
+    assert analyzer.analyze("df['c'] = df['a'] + 1\nresult = df['c'].sum()", df).missing == []
+
+@pytest.mark.parametrize('code', [
+    "result = df['a'].apply(lambda x: x or 10)",
+    "result = df['a'].apply(lambda x: not x)",
+    "result = df.apply(lambda r: r['a'] and r['b'], axis=1)",
+    "result = df.apply(lambda r: r.name, axis=1)",
+    "result = df.sample(2, random_state=1).apply(lambda r: r['a'] + r['b'], axis=1)",
+    "result = df['a'].dropna().apply(lambda x: x * 2 + x)",
+])
+def test_rewrites_that_would_change_results_are_skipped(code):
+    small = pd.DataFrame({'a': [1, 0, 3, 0], 'b': [5, 3, 0, 0]}, index=[10, 11, 12, 13])
+    analysis = CodeAnalyzer(10).analyze(code, small)
+    assert not analysis.rewrites and analysis.code == code
+    pd.testing.assert_series_equal(execute(small, code), execute(small, analysis.code))
+
+def test_derived_frames_are_not_checked_for_missing_columns(df):
+    analyzer = CodeAnalyzer(10)
+    for code in ["result = df.assign(total=df.a + df.b)['total'].sum()",
+                 "d = df.rename(columns={'a': 'amount'})\nresult = d['amount'].sum()",
+                 "df = df.rename(columns={'a': 'amount'})\nresult = df['amount'].sum()",
+                 "df.rename(columns={'a': 'amount'}, inplace=True)\nresult = df['amount'].sum()"]:
+        analysis = analyzer.analyze(code, df)
+        assert analysis.missing == []
+        assert execute(df.head(10), analysis.code) == execute(df.head(10), code)
+
+@pytest.mark.parametrize('code', [
+    "result = df['a'].apply(str)",
+    "result = df['a'].apply(lambda x: str(x))",
+    "result = df['a'].apply(lambda v: round(v))",
+    "result = df['name'].apply(lambda x: len(x))",
+    "result = df['name'].apply(lambda x: x.lower())",
+    "result = df.apply(lambda r: float(r['name']), axis=1)",
+    "df.loc[0, 'b'] = None\nresult = df['b'].apply(lambda v: round(v))",
+])
+def test_missing_values_keep_python_semantics(code):
+    df = pd.DataFrame({'a': [1.0, np.nan, 3.0], 'b': [1.4, 2.6, 3.5], 'name': ['Ann', None, 'Bob']})
+    analysis = CodeAnalyzer(10).analyze(code, df)
+    assert not analysis.rewrites and analysis.code == code
+
+    def run(source):
+        try:
+            return execute(df, source)
+        except Exception as e:
+            return type(e)
+    original = run(code)
+    rewritten = run(analysis.code)
+    if isinstance(original, pd.Series):
+        pd.testing.assert_series_equal(original, rewritten)
+    else:
+        assert original is rewritten
+
+def test_dropped_missing_values_allow_the_rewrite():
+    df = pd.DataFrame({'a': [1.2, np.nan, 3.7]})
+    code = "result = df['a'].dropna().apply(lambda v: round(v))"
+    analysis = CodeAnalyzer(10).analyze(code, df)
+    assert analysis.rewrites
+    pd.testing.assert_series_equal(execute(df, code), execute(df, analysis.code))
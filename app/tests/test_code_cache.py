@@ -0,0 +1,45 @@
+import time
+from app.code_cache import CodeCache, normalize_question
+
+def test_normalize_question():
+    assert normalize_question("  How many ROWS are in the file? ") == "how many rows are in the file"
+    assert normalize_question("Сколько строк в файле?") == normalize_question("сколько  строк в файле")
+
+def test_hit_requires_same_schema(tmp_path):
+    cache = CodeCache(str(tmp_path / "cc.json"), ttl=60, max_entries=10)
+    cache.put("How many rows?", ['a', 'b'], "result = str(len(df))")
+    assert cache.get("how many rows", ['a', 'b']) == "result = str(len(df))"
+    assert cache.get("how many rows", ['a', 'c']) is None
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+def test_persists_and_expires(tmp_path):
+    path = str(tmp_path / "cc.json")
+    writer = CodeCache(path, ttl=60, max_entries=10)
+    writer.put("q", ['a'], "result = '1'")
+    writer.flush()
+    assert CodeCache(path, ttl=60, max_entries=10).get("q", ['a']) == "result = '1'"
+    cache = CodeCache(path, ttl=0.01, max_entries=10)
+    time.sleep(0.02)
+    assert cache.get("q", ['a']) is None
+
+def test_size_bound_evicts_oldest():
+    cache = CodeCache(None, ttl=60, max_entries=2)
+    for q in ("q1", "q2", "q3"):
+        cache.put(q, ['a'], q)
+    assert cache.get("q1", ['a']) is None
+    assert cache.get("q3", ['a']) == "q3"
+
+def test_writes_are_batched_off_the_caller(tmp_path):
+    path = tmp_path / "cc.json"
+    cache = CodeCache(str(path), ttl=60, max_entries=100, save_delay=0.05)
+    for i in range(20):
+        cache.put(f"q{i}", ['a'], str(i))
+    cache.discard("q0", ['a'])
+    assert not path.exists()
+    time.sleep(0.2)
+    assert cache.stats()['saves'] == 1
+    reloaded = CodeCache(str(path), ttl=60, max_entries=100)
+    assert reloaded.get("q0", ['a']) is None and reloaded.get("q19", ['a']) == "19"
+    cache.flush()
+    assert cache.stats()['saves'] == 1
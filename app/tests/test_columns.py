@@ -0,0 +1,27 @@
+from app.columns import ColumnIndex
+
+def test_roles_prefer_exact_and_word_matches():
+    index = ColumnIndex(['Полный адрес', 'Пол клиента', 'Менеджер (ФИО)', 'client_city_norm'])
+    assert index.resolve('gender') == 'Пол клиента'
+    assert index.resolve('manager') == 'Менеджер (ФИО)'
+    assert index.resolve('city') == 'client_city_norm'
+
+def test_roles_fall_back_to_substring_and_translit():
+    assert ColumnIndex(['Sales manager id']).resolve('manager') == 'Sales manager id'
+    assert ColumnIndex(['gorod']).resolve('city') == 'gorod'
+    assert ColumnIndex(['age']).resolve('city') is None
+
+def test_lookup_and_suggestions_on_wide_sheet():
+    columns = [f"metric_{i}" for i in range(5000)] + ['client_age_parsed', 'Город']
+    index = ColumnIndex(columns)
+    assert index.lookup('Client Age Parsed') == 'client_age_parsed'
+    assert index.lookup('gorod') == 'Город'
+    assert index.suggest('client_age')[0] == 'client_age_parsed'
+
+def test_relevance_ranks_named_role_and_similar_columns():
+    index = ColumnIndex(['Дата продажи', 'Город', 'client_age_parsed', 'Country'] + [f"metric_{i}" for i in range(300)])
+    scores = index.relevance("Средний client age parsed по городам, продажи за май")
+    assert scores['client_age_parsed'] >= 3
+    assert scores['Город'] > 0 and scores['Дата продажи'] > 0
+    assert not any(str(c).startswith('metric_') for c in scores)
+    assert ColumnIndex(['Город', 'x']).relevance("сколько клиентов в каждом город")['Город'] >= 2
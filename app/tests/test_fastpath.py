@@ -0,0 +1,52 @@
+import pandas as pd
+from app.columns import ColumnIndex
+from app.fastpath import answer_from_frame, answer_from_summary, parse_question
+from app.profile import profile_dataframe
+from app.summary import build_summary
+
+DF = pd.DataFrame({
+    'client_age_parsed': [25, 40, 61, 33, None, 52],
+    'cost_target_budget_parsed': ['до 100', '200', '300', '400', 'не указано', '600'],
+    'region': ['Central', 'North', 'Central', 'South', 'Central', None],
+    'result_doubts_parsed': ['price', 'unknown', 'price', None, 'location', 'Unknown'],
+})
+PROFILE = profile_dataframe(DF)
+TYPED = PROFILE.typed_frame(DF)
+INDEX = ColumnIndex(DF.columns)
+
+def ask(question, lang='en'):
+    intent = parse_question(question, INDEX)
+    return None if intent is None else answer_from_frame(intent, DF, TYPED, lang)
+
+def test_filtered_counts_and_stats():
+    assert ask("How many clients are older than 50?") == "Matching rows: 2"
+    assert ask("Сколько клиентов младше 30 лет?", 'ru') == "Подходящих строк: 1"
+    assert ask("How many clients have cost_target_budget_parsed > 250?") == "Matching rows: 3"
+    assert ask("How many clients have result_doubts_parsed == 'unknown'?") == "Matching rows: 2"
+    assert ask("Count of rows where result_doubts_parsed is not null.") == "Matching rows: 5"
+    assert ask("What is the sum of cost_target_budget_parsed for clients older than 35?") == (
+        "Filter: client_age_parsed > 35 (3 rows)\nSum of cost_target_budget_parsed: 1100")
+    assert ask("Покажи сумму по столбцу cost_target_budget_parsed для клиентов из region == 'central'.", 'ru') == (
+        "Фильтр: region == 'central' (строк: 3)\nСумма cost_target_budget_parsed: 400")
+
+def test_lists_and_groups():
+    assert ask("List top 2 frequent region.") == "Top 2 values of region:\nCentral: 3\nNorth: 1"
+    assert ask("Which region is most common?") == "Most frequent region: Central"
+    assert ask("Show the mean client_age_parsed for each region.") == (
+        "Mean of client_age_parsed by region:\nCentral: 43\nNorth: 40\nSouth: 33")
+    assert ask("What is the range of client_age_parsed?") == "Min of client_age_parsed: 25\nMax of client_age_parsed: 61"
+    assert ask("Show all columns.").splitlines()[1:] == list(DF.columns)
+
+def test_summary_and_frame_agree():
+    summary = build_summary(DF, PROFILE)
+    for question in ("What is the median of cost_target_budget_parsed?", "Покажи статистику по client_age_parsed",
+                     "Show the distribution of region.", "List top 3 frequent result_doubts_parsed.",
+                     "What is the variance of client_age_parsed?", "Сколько уникальных region?"):
+        intent = parse_question(question, INDEX)
+        assert answer_from_summary(intent, summary) == answer_from_frame(intent, DF, TYPED), question
+
+def test_unsupported_questions_go_to_the_llm():
+    assert ask("Which client_age_parsed values are outliers?") is None
+    assert ask("How many clients are from Moscow or Saint Petersburg?") is None
+    assert ask("What is the mean of region?") is None
+    assert ask("Which region has the highest number of deals?") is None
@@ -0,0 +1,53 @@
+from io import BytesIO
+import pandas as pd
+import pytest
+from app.formats import ParseTimings, detect_format, sniff_encoding
+from app.ingest import ingest_csv
+from app.loader import read_dataframe
+
+DF = pd.DataFrame({'Город': ['Москва', 'Казань', 'Сочи'], 'Менеджер': ['Иван; Петров', 'Ольга', 'Пётр'], 'n': [1, 2, 3]})
+
+def _bytes(kind):
+    out = BytesIO()
+    if kind == 'xlsx':
+        DF.to_excel(out, index=False)
+    elif kind == 'parquet':
+        DF.to_parquet(out)
+    elif kind == 'tsv':
+        return DF.to_csv(sep='\t', index=False).encode('utf-8')
+    else:
+        encoding, sep = kind.split('/')
+        return DF.to_csv(sep=sep, index=False).encode(encoding)
+    return out.getvalue()
+
+@pytest.mark.parametrize('kind, label, encoding, sep', [
+    ('xlsx', 'xlsx', None, None),
+    ('parquet', 'parquet', None, None),
+    ('utf-8/,', 'csv', 'utf-8', ','),
+    ('utf-8-sig/;', 'csv', 'utf-8-sig', ';'),
+    ('cp1251/;', 'csv', 'cp1251', ';'),
+    ('tsv', 'tsv', 'utf-8', '\t'),
+])
+def test_format_is_detected_and_parsed(kind, label, encoding, sep):
+    data = _bytes(kind)
+    fmt = detect_format(data, 'upload.bin')
+    assert (fmt.label, fmt.encoding, fmt.sep) == (label, encoding, sep)
+    pd.testing.assert_frame_equal(read_dataframe(data, fmt=fmt), DF, check_dtype=False)
+
+def test_encoding_and_delimiter_edge_cases():
+    # Accented Western text stays latin1; a utf-8 character cut by the prefix end is still utf-8
+    assert sniff_encoding("name,city\nJosé,Köln\n".encode('latin1')) == 'latin1'
+    assert sniff_encoding("город".encode('utf-8')[:-1]) == 'utf-8'
+    assert detect_format(b"a,b\n1,2\n", 'x.tsv').sep == ','
+    assert detect_format(b"a\tb,c\n1\t2,3\n", 'x.tsv').sep == '\t'
+    assert detect_format(b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1rest').kind == 'xls'
+
+def test_streaming_ingest_uses_sniffed_format():
+    aggregates = ingest_csv(BytesIO(_bytes('cp1251/;')), chunk_rows=2)
+    assert aggregates.columns == list(DF.columns) and aggregates.rows == 3
+
+def test_parse_timings():
+    timings = ParseTimings()
+    timings.record('csv', 0.5, 1024 * 1024)
+    timings.record('csv', 1.5, 1024 * 1024)
+    assert timings.stats() == {'csv': {'count': 2, 'avg_ms': 1000.0, 'max_ms': 1500.0, 'mb_per_s': 1.0}}
@@ -0,0 +1,22 @@
+import io
+import pandas as pd
+from app.analytics import unique_values_text, value_counts_text
+from app.ingest import ingest_csv
+
+def test_chunked_aggregates_match_full_parse():
+    df = pd.DataFrame({
+        'Город': ['Moscow', 'SPb', 'Moscow', None, 'Kazan', 'Moscow', 'SPb'],
+        'manager': ['A', 'B', None, 'A', 'C', 'B', 'A'],
+        'gender': ['m', 'f', 'f', 'm', 'm', None, 'm'],
+    })
+    data = io.BytesIO(df.to_csv(index=False).encode('utf-8'))
+    aggregates = ingest_csv(data, chunk_rows=2)
+    full = pd.read_csv(io.BytesIO(data.getvalue()), dtype=str)
+    assert aggregates.rows == 7
+    assert aggregates.result_text('count_city') == value_counts_text(full['Город'])
+    assert aggregates.result_text('count_gender') == value_counts_text(full['gender'])
+    assert aggregates.result_text('unique_managers') == unique_values_text(full['manager'])
+
+def test_latin1_fallback():
+    data = io.BytesIO("city\nK\xf6ln\nK\xf6ln\n".encode('latin1'))
+    assert ingest_csv(data, chunk_rows=1).result_text('count_city') == "Köln: 2"
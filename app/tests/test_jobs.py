@@ -0,0 +1,84 @@
+import asyncio
+from app.jobs import BUSY, COALESCED, SUPERSEDED, UserJobQueue
+
+def test_jobs_run_one_at_a_time_per_user():
+    log = []
+
+    def job(name, delay):
+        async def run():
+            log.append(f"start {name}")
+            await asyncio.sleep(delay)
+            log.append(f"end {name}")
+            return name
+        return run
+
+    async def scenario():
+        jobs = UserJobQueue()
+        results = await asyncio.gather(jobs.run(1, 'a', job('a', 0.05)), jobs.run(1, 'b', job('b', 0.01)),
+                                       jobs.run(2, 'c', job('c', 0.01)))
+        return jobs, results
+    jobs, results = asyncio.run(scenario())
+    assert results == ['a', 'b', 'c']
+    # User 2 does not wait for user 1; user 1's jobs never overlap
+    assert log.index("end c") < log.index("end a") < log.index("start b")
+    assert jobs.stats() == {'users': 0, 'queued': 0, 'completed': 3, 'coalesced': 0, 'superseded': 0, 'rejected': 0}
+
+def test_repeated_clicks_are_coalesced_and_superseded():
+    runs = []
+
+    def click(data):
+        async def run():
+            runs.append(data)
+            await asyncio.sleep(0.02)
+            return data
+        return run
+
+    async def scenario():
+        jobs = UserJobQueue()
+        burst = [jobs.run(1, ('click', 7, data), click(data), slot=7)
+                 for data in ['count_city', 'count_city', 'count_gender', 'count_gender', 'show_columns']]
+        # A click on another message keeps its place
+        burst.append(jobs.run(1, ('click', 8, 'count_city'), click('other'), slot=8))
+        return jobs, await asyncio.gather(*burst)
+    jobs, results = asyncio.run(scenario())
+    assert results == ['count_city', COALESCED, SUPERSEDED, COALESCED, 'show_columns', 'other']
+    assert runs == ['count_city', 'show_columns', 'other']
+    assert jobs.stats()['coalesced'] == 2 and jobs.stats()['superseded'] == 1
+
+def test_failed_or_cancelled_job_passes_the_turn():
+    async def boom():
+        await asyncio.sleep(0.02)
+        raise ValueError("boom")
+
+    async def ok():
+        return 'ok'
+
+    async def scenario():
+        jobs = UserJobQueue()
+        failing = asyncio.create_task(jobs.run(1, 'a', boom))
+        waiting = asyncio.create_task(jobs.run(1, 'b', ok))
+        later = asyncio.create_task(jobs.run(1, 'c', ok))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        results = await asyncio.gather(failing, waiting, later, return_exceptions=True)
+        return jobs, results
+    jobs, (failed, cancelled, result) = asyncio.run(scenario())
+    assert isinstance(failed, ValueError) and isinstance(cancelled, asyncio.CancelledError) and result == 'ok'
+    assert jobs.pending(1) == 0
+
+def test_queue_depth_is_capped_per_user():
+    async def slow():
+        await asyncio.sleep(0.02)
+        return 'done'
+
+    async def scenario():
+        jobs = UserJobQueue(max_pending=2)
+        results = await asyncio.gather(*(jobs.run(1, i, slow) for i in range(4)), jobs.run(2, 0, slow))
+        # A superseded click frees its place for the newer one
+        clicks = await asyncio.gather(jobs.run(1, 'a', slow), jobs.run(1, 'b', slow, slot=7),
+                                      jobs.run(1, 'c', slow, slot=7))
+        return jobs, results, clicks
+    jobs, results, clicks = asyncio.run(scenario())
+    assert results == ['done', 'done', BUSY, BUSY, 'done']
+    assert clicks == ['done', SUPERSEDED, 'done']
+    assert jobs.stats()['rejected'] == 2 and jobs.stats()['users'] == 0
@@ -0,0 +1,70 @@
+import asyncio
+import threading
+import time
+from app.llm import LLMClient
+from app.llm_stub import make_server
+
+def test_per_user_limit_serializes_same_chat():
+    server = make_server(port=0, delay=0.3)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    messages = [{"role": "user", "content": "How many rows?"}]
+
+    async def scenario():
+        llm = LLMClient("test", base_url=base_url, max_concurrency=4, per_user=1)
+        try:
+            await llm.complete(messages, user_id=0)
+            started = time.monotonic()
+            await asyncio.gather(llm.complete(messages, user_id=1), llm.complete(messages, user_id=2))
+            parallel = time.monotonic() - started
+            started = time.monotonic()
+            answers = await asyncio.gather(llm.complete(messages, user_id=1), llm.complete(messages, user_id=1))
+            serial = time.monotonic() - started
+            return answers, parallel, serial
+        finally:
+            await llm.aclose()
+    try:
+        answers, parallel, serial = asyncio.run(scenario())
+    finally:
+        server.shutdown()
+    assert all("```python" in a for a in answers)
+    assert parallel < 0.55
+    assert serial >= 0.6
+
+def test_streamed_code_returns_at_closing_fence():
+    server = make_server(port=0, chunk_delay=0.02)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    messages = [{"role": "user", "content": "How many rows?"}]
+    seen = []
+
+    async def scenario():
+        llm = LLMClient("test", base_url=base_url)
+        try:
+            started = time.monotonic()
+            code = await llm.complete_code(messages, user_id=1, on_text=seen.append)
+            early = time.monotonic() - started
+            started = time.monotonic()
+            full = ''.join([piece async for piece in llm.stream(messages, user_id=1)])
+            return llm, code, early, full, time.monotonic() - started
+        finally:
+            await llm.aclose()
+    try:
+        llm, code, early, full, full_time = asyncio.run(scenario())
+    finally:
+        server.shutdown()
+    assert code == 'result = f"{len(df)} rows, {len(df.columns)} columns"'
+    assert full.startswith(seen[-1]) and len(seen[-1]) < len(full) / 2
+    # The prose after the code is about as long again as the code
+    assert early < full_time * 0.7
+    assert llm.stats()['early_stops'] == 1 and llm.stats()['streams'] == 2 and llm.stats()['active_users'] == 0
+
+def test_extract_code_handles_fences_and_split_pieces():
+    from app.llm import CodeFence, extract_code
+    answer = "Sure:\n```python\nresult = df['a'].sum()\n```\nThis sums column a."
+    for size in (1, 3, len(answer)):
+        fence = CodeFence()
+        codes = [fence.feed(answer[i:i + size]) for i in range(0, len(answer), size)]
+        assert next(c for c in codes if c is not None) == "result = df['a'].sum()"
+    assert extract_code("result = 1") == "result = 1"
+    assert extract_code("```\nresult = 2\n") == "result = 2"
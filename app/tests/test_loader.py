@@ -0,0 +1,44 @@
+import datetime
+from io import BytesIO
+import openpyxl
+import pandas as pd
+import pytest
+from app.cache import sheet_key
+from app.loader import list_sheets, load_upload, read_sheet, read_sheet_header
+
+@pytest.fixture
+def workbook():
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Sales"
+    ws.append(['city', None, 'city', 2024, 'date'])
+    ws.append(['Moscow', 1, 3, 4.5, datetime.datetime(2024, 1, 1)])
+    ws.append([None, None, None, None, None])
+    ws.append(['Kazan', 'x', None, 1, None])
+    ws.append([None] * 5)
+    wb.create_sheet("Managers").append(['name'])
+    wb["Managers"].append(['Ivan'])
+    wb.create_sheet("Secret").sheet_state = 'hidden'
+    out = BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+def test_sheets_are_listed_from_metadata(workbook):
+    sheets = list_sheets(workbook)
+    assert [s.name for s in sheets] == ['Sales', 'Managers']
+    assert (sheets[0].rows, sheets[0].columns) == (4, 5) and sheets[1].label() == 'Managers (1×1)'
+    assert list_sheets(b"a,b\n1,2\n") is None
+
+def test_projected_columns_match_full_read(workbook):
+    full = read_sheet(workbook, 'Sales')
+    assert read_sheet_header(workbook, 'Sales') == list(full.columns) == ['city', 'Unnamed: 1', 'city.1', 2024, 'date']
+    for col in full.columns:
+        pd.testing.assert_series_equal(read_sheet(workbook, 'Sales', [col])[col], full[col])
+    with pytest.raises(KeyError):
+        read_sheet(workbook, 'Sales', ['nope'])
+    df, _ = load_upload(workbook, 'Managers')
+    assert df['name'].tolist() == ['Ivan']
+
+def test_sheet_keys():
+    key = ('file', 'abc')
+    assert sheet_key(key, 0) == key and sheet_key(key, 2) == ('file', 'abc-2')
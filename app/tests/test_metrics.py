@@ -0,0 +1,39 @@
+import threading
+import urllib.request
+import pytest
+from app.metrics import Registry, make_server, start_http_server
+
+def test_histograms_counters_and_stats_render():
+    registry = Registry()
+    stage = registry.histogram('bot_stage_seconds', "Stage time", ('stage', 'handler'), buckets=(0.1, 1))
+    errors = registry.counter('bot_errors_total', "Errors", ('stage', 'handler'))
+    registry.stats_gauges('bot_sessions', lambda: {'memory_bytes': 512, 'hit_rate': 0.5, 'name': 'x'}, "sessions stats")
+    stage.observe(0.05, stage='llm', handler='text:expert')
+    stage.observe(0.5, stage='llm', handler='text:expert')
+    with pytest.raises(RuntimeError):
+        with stage.time(stage='code', handler='menu:"odd"'):
+            raise RuntimeError
+    errors.inc(stage='code', handler='text:expert')
+    with pytest.raises(ValueError):
+        errors.inc(stage='code')
+    text = registry.render()
+    assert 'bot_stage_seconds_bucket{stage="llm",handler="text:expert",le="0.1"} 1' in text
+    assert 'bot_stage_seconds_bucket{stage="llm",handler="text:expert",le="1"} 2' in text
+    assert 'bot_stage_seconds_bucket{stage="llm",handler="text:expert",le="+Inf"} 2' in text
+    assert 'bot_stage_seconds_count{stage="llm",handler="text:expert"} 2' in text
+    assert stage.count(stage='code', handler='menu:"odd"') == 1 and 'handler="menu:\\"odd\\""' in text
+    assert 'bot_errors_total{stage="code",handler="text:expert"} 1' in text
+    assert 'bot_sessions_memory_bytes 512' in text and 'bot_sessions_name' not in text
+
+def test_served_over_http():
+    registry = Registry()
+    registry.counter('bot_updates_total', "Updates").inc()
+    assert start_http_server(registry, 0) is None
+    server = make_server(registry, 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url) as response:
+            assert 'bot_updates_total 1' in response.read().decode()
+    finally:
+        server.shutdown()
@@ -0,0 +1,50 @@
+import io
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from app import output
+from app.output import (
+    CSV, PAGES, TEXT, TXT, XLSX, Paginator, choose_format, table_to_csv, table_to_xlsx, text_page_bounds,
+)
+
+def test_format_follows_shape_and_size(monkeypatch):
+    assert choose_format("short answer") == TEXT
+    assert choose_format("line\n" * 2000) == PAGES
+    assert choose_format("line\n" * 2000, allow_pages=False) == TXT
+    assert choose_format(pd.Series([1, 2, 3])) == TEXT
+    narrow = pd.DataFrame({'a': range(500), 'b': range(500)})
+    assert choose_format(narrow) == PAGES
+    assert choose_format(narrow, allow_pages=False) == CSV
+    assert choose_format(pd.DataFrame(np.zeros((5, 30)))) == CSV
+    monkeypatch.setattr(output, 'CSV_MAX_BYTES', 1000)
+    assert choose_format(pd.DataFrame(np.zeros((5000, 30)))) == XLSX
+    assert choose_format(narrow, table_mode='pdf') == 'pdf'
+
+def test_csv_and_xlsx_attachments():
+    df = pd.DataFrame({'город': ['Москва', None], 'n': [1.5, np.nan],
+                       'when': pd.to_datetime(['2024-01-01', None]).tz_localize('UTC')})
+    csv = table_to_csv(df)
+    assert csv.name == "result.csv"
+    assert pd.read_csv(io.BytesIO(csv.getvalue()), encoding='utf-8-sig')['город'].tolist()[0] == 'Москва'
+    xlsx = table_to_xlsx(df.set_index('город'))
+    rows = list(load_workbook(xlsx, read_only=True).active.values)
+    assert rows[0] == ('город', 'n', 'when') and rows[1][:2] == ('Москва', 1.5) and not any(rows[2])
+
+def test_text_pages_break_on_lines():
+    text = "\n".join(f"line {i}" for i in range(3000))
+    starts = text_page_bounds(text, limit=1000)
+    pages = [text[a:b] for a, b in zip(starts, starts[1:] + [len(text)])]
+    assert ''.join(pages) == text
+    assert all(len(p) <= 1000 and (p.endswith('\n') or p is pages[-1]) for p in pages)
+    assert text_page_bounds("x" * 2500, limit=1000) == [0, 1000, 2000]
+
+def test_paginator_renders_pages_and_evicts():
+    pages = Paginator(max_results=2, max_bytes=10 ** 9, ttl=3600)
+    token, paged = pages.add(pd.DataFrame({'a': range(100)}))
+    assert paged.total == 4 and '99' in paged.page(3) and ' 0' in paged.page(0)
+    pages.add("a")
+    pages.add("b")
+    assert pages.get(token) is None and pages.stats()['results'] == 2
+    expiring = Paginator(max_results=10, max_bytes=10 ** 9, ttl=0)
+    token, _ = expiring.add("a")
+    assert expiring.get(token) is None
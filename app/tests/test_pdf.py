@@ -0,0 +1,40 @@
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from app.utils import PDFTooLarge, _font_metrics, get_unicode_font_path, make_pdf, sanitize_and_send
+
+def test_text_and_table_pdfs():
+    text = make_pdf("Привет, мир\nhello", filename="x.pdf")
+    assert text.getvalue().startswith(b'%PDF') and text.name == "x.pdf"
+    df = pd.DataFrame(np.arange(600).reshape(200, 3), columns=['город', 'b', 'c'])
+    table = make_pdf(df).getvalue()
+    assert table.startswith(b'%PDF') and table.count(b'/Type /Page\n') > 1
+
+def test_wide_table_is_split_into_column_groups():
+    df = pd.DataFrame(np.random.rand(5, 40)).add_prefix('column_')
+    assert make_pdf(df).getvalue().count(b'/Type /Page\n') > 1
+
+def test_oversized_output_stops_early():
+    huge = "\n".join(f"{i} some row of a very long dump" for i in range(2_000_000))
+    started = time.perf_counter()
+    with pytest.raises(PDFTooLarge):
+        make_pdf(huge, max_size=512 * 1024)
+    assert time.perf_counter() - started < 5
+
+@pytest.mark.skipif(get_unicode_font_path() is None, reason="no Unicode font installed")
+def test_font_is_parsed_once_per_process():
+    path = get_unicode_font_path()
+    assert _font_metrics(path) is _font_metrics(path)
+
+def test_sanitize_and_send_reports_oversized_pdf(monkeypatch):
+    import app.utils as utils
+    sent = []
+    bot = type('Bot', (), {'send_message': lambda self, chat_id, text: sent.append(('msg', text)),
+                           'send_document': lambda self, chat_id, doc: sent.append(('doc', doc.name))})()
+    sanitize_and_send(bot, 1, pd.DataFrame({'a': range(100)}), table_format='pdf')
+    assert sent == [('doc', 'expert_result.pdf')]
+    monkeypatch.setattr(utils, 'PDF_MAX_SIZE', 1024)
+    sent.clear()
+    sanitize_and_send(bot, 1, "x\n" * 5000)
+    assert sent[0][0] == 'msg' and 'too large' in sent[0][1]
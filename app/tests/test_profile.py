@@ -0,0 +1,22 @@
+import pandas as pd
+from app.profile import CATEGORICAL, DATE, NUMERIC, NUMERIC_LIKE, TEXT, profile_dataframe
+
+def test_profile_detects_kinds_and_converts():
+    df = pd.DataFrame({
+        'age': ['до 30', '20 - 40', '35', 'не указано'] * 30,
+        'income': [100, 200, 300, 400] * 30,
+        'city': ['Moscow', 'SPb', 'Kazan', None] * 30,
+        'signed': ['01.02.2024', '15.03.2024', '2024-04-01', None] * 30,
+        'comment': [f"note number {i}" for i in range(120)],
+    })
+    profile = profile_dataframe(df)
+    assert profile.kinds == {'age': NUMERIC_LIKE, 'income': NUMERIC, 'city': CATEGORICAL,
+                             'signed': DATE, 'comment': TEXT}
+    assert profile.converted['age'].iloc[:3].tolist() == [30.0, 30.0, 35.0]
+    assert profile.converted['signed'].iloc[0] == pd.Timestamp('2024-02-01')
+
+def test_typed_frame_leaves_original_untouched():
+    df = pd.DataFrame({'age': ['до 30', '35']})
+    typed = profile_dataframe(df).typed_frame(df)
+    assert typed['age'].tolist() == [30.0, 35.0]
+    assert df['age'].tolist() == ['до 30', '35']
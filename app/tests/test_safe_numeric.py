@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+from app.utils import safe_numeric
+
+def test_safe_numeric_documented_cases():
+    series = pd.Series(['до 30', '20 - 40', '1,5', '12', 'не указано', 'около 100', None, '-'],
+                       index=list('abcdefgh'), name='age')
+    result = safe_numeric(series)
+    expected = [30.0, 30.0, 1.5, 12.0, np.nan, 100.0, np.nan, np.nan]
+    assert np.allclose(result.to_numpy(), expected, equal_nan=True)
+    assert list(result.index) == list('abcdefgh')
+    assert result.name == 'age'
+
+def test_safe_numeric_repeated_values_and_numbers():
+    series = pd.Series(['до 5', 7, 7.5, 'до 5', '3 - 4'] * 1000, dtype=object)
+    result = safe_numeric(series)
+    assert result.dtype == float
+    assert result.iloc[:5].tolist() == [5.0, 7.0, 7.5, 5.0, 3.5]
+
+def test_safe_numeric_numeric_dtype_passthrough():
+    result = safe_numeric(pd.Series([1, 2, None]))
+    assert np.allclose(result.to_numpy(), [1.0, 2.0, np.nan], equal_nan=True)
+
+def test_safe_numeric_bools_do_not_share_numbers_conversion():
+    # True == 1: the result must not depend on which comes first
+    for cells in ([True, 1, '1,5', 1.0, False, 0], [1, True, '1,5', 1.0, 0, False]):
+        result = safe_numeric(pd.Series(cells, dtype=object))
+        by_cell = {(type(c), c): v for c, v in zip(cells, result.tolist())}
+        assert by_cell[(int, 1)] == 1.0 and by_cell[(float, 1.0)] == 1.0 and by_cell[(int, 0)] == 0.0
+        assert np.isnan(by_cell[(bool, True)]) and np.isnan(by_cell[(bool, False)])
+        assert by_cell[(str, '1,5')] == 1.5
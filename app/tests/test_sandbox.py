@@ -0,0 +1,74 @@
+import asyncio
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from app.sandbox import ResourceLimitExceeded, Sandbox, UnsafeCode, execute
+from app.workers import JobTimeout
+
+@pytest.fixture(scope="module")
+def sandbox(tmp_path_factory):
+    box = Sandbox(1, data_dir=str(tmp_path_factory.mktemp("sandbox")), cpu_limit=1, wall_limit=2,
+                  memory_limit=1024 ** 3)
+    box.start()
+    yield box
+    box.shutdown()
+
+def test_restricted_builtins_and_no_mutation():
+    df = pd.DataFrame({'a': [1, 2, 3]})
+    assert execute(df, "import numpy as np\ndf['a'] = 0\nresult = int(np.sum(df['a']))") == 0
+    assert df['a'].tolist() == [1, 2, 3]
+    with pytest.raises(ImportError):
+        execute(df, "import os")
+    with pytest.raises(NameError):
+        execute(df, "result = open('/etc/passwd').read()")
+
+@pytest.mark.parametrize('code', [
+    "result = pd.read_csv('/etc/passwd')",
+    "import numpy as np\nresult = np.load('x.npy')",
+    "df.to_pickle('x.pkl')",
+    "df.to_csv('x.csv')",
+    "df.to_json(path_or_buf='x.json')",
+    "from pandas import *",
+    "result = getattr(pd, 'read_' + 'pickle')",
+    "result = df.__class__.__init__.__globals__",
+])
+def test_file_access_is_refused(tmp_path, code):
+    with pytest.raises(UnsafeCode):
+        execute(pd.DataFrame({'a': [1]}), code)
+
+def test_text_output_still_allowed():
+    df = pd.DataFrame({'a': [1, 2]})
+    assert execute(df, "result = df.to_csv(index=False)") == "a\n1\n2\n"
+    assert execute(df, "result = type(df).__name__ + df.to_string(index=False)").startswith("DataFrame")
+
+def test_worker_cannot_write_files(sandbox, tmp_path):
+    target = tmp_path / "out.txt"
+    with pytest.raises(OSError):
+        sandbox.call(None, pd.DataFrame({'a': [1]}), f"import numpy as np\nnp.arange(3).dump({str(target)!r})")
+    assert not target.exists() or target.stat().st_size == 0
+
+def test_runs_code_on_mapped_frame(sandbox):
+    df = pd.DataFrame({'a': np.arange(100_000), 0: 'x', 'b': [None, 'y'] * 50_000})
+    assert sandbox.call('k', df, "result = df['a'].sum()") == df['a'].sum()
+    result = asyncio.run(sandbox.run('k', df, "result = df.groupby('b')['a'].count()"))
+    assert result['y'] == 50_000
+    assert sandbox.call('k', df, "result = list(df.columns)") == ['a', 0, 'b']
+    with pytest.raises(KeyError) as e:
+        sandbox.call('k', df, "result = df['missing']")
+    assert 'missing' in e.value.sandbox_traceback
+    assert sandbox.stats()['files'] == 1
+
+def test_limits_stop_runaway_code_and_worker_recovers(sandbox):
+    df = pd.DataFrame({'a': np.arange(10)})
+    started = time.monotonic()
+    with pytest.raises(ResourceLimitExceeded):
+        sandbox.call('k2', df, "while True: pass")
+    with pytest.raises(ResourceLimitExceeded):
+        sandbox.call('k2', df, "result = [0] * (10 ** 9)")
+    # sum() over a range loops in C without checking signals; only the parent's kill stops it
+    with pytest.raises(JobTimeout):
+        sandbox.call('k2', df, "result = sum(range(10 ** 12))")
+    assert time.monotonic() - started < 15
+    assert sandbox.call('k2', df, "result = len(df)") == 10
+    assert sandbox.stats()['workers'] == 1
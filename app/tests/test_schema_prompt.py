@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+from app.columns import ColumnIndex
+from app.profile import profile_dataframe
+from app.schema_prompt import SchemaPromptBuilder, column_hint, estimate_tokens
+from app.summary import build_summary
+
+def wide_frame(rows=500, filler=300):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'price': rng.integers(100, 1000, rows),
+        'income_parsed': [f"до {i}" if i % 2 else str(i) for i in range(rows)],
+        'Город': rng.choice(['Москва', 'Казань', 'Сочи'], rows),
+        'signed': pd.date_range('2024-01-01', periods=rows, freq='D').strftime('%d.%m.%Y'),
+        'comment': [f"free text comment number {i} " * 3 for i in range(rows)],
+    })
+    return pd.concat([df, pd.DataFrame(0.0, index=df.index, columns=[f"metric_{i}" for i in range(filler)])], axis=1)
+
+def test_hints_give_types_and_samples():
+    df = wide_frame(filler=0)
+    profile = profile_dataframe(df)
+    typed = profile.typed_frame(df)
+    summary = build_summary(df, profile)
+    hints = {col: column_hint(col, typed[col], profile.kinds[col], summary.get(col)) for col in df.columns}
+    assert hints['price'].startswith('price (num ') and '..' in hints['price']
+    # Numbers stored as text are hinted as the numbers the expert code will see
+    assert hints['income_parsed'] == f"income_parsed (num 0..{len(df) - 1})"
+    assert hints['Город'].startswith('Город (cat, 3 values: ') and 'Москва' in hints['Город']
+    assert hints['signed'] == f"signed (date 2024-01-01..{pd.Timestamp('2024-01-01') + pd.Timedelta(days=499):%Y-%m-%d})"
+    assert hints['comment'].startswith('comment (text, e.g. free text comment') and len(hints['comment']) < 120
+    # Without summary or profile the hint comes from the column itself
+    assert column_hint('price', df['price']) == hints['price']
+
+def test_prompt_lists_relevant_columns_within_budget():
+    df = wide_frame()
+    profile = profile_dataframe(df)
+    builder = SchemaPromptBuilder(budget=120)
+    context = builder.build("Средняя price по городам", ColumnIndex(df.columns), profile.typed_frame(df), profile)
+    assert context.columns[:2] == ['price', 'Город']
+    assert context.omitted == len(df.columns) - len(context.columns) > 250
+    assert context.tokens <= 120 + estimate_tokens(context.text.splitlines()[-1])
+    assert context.text.endswith(f"({context.omitted} less relevant columns not shown)")
+    assert context.full_tokens > 800 and context.saved == context.full_tokens - context.tokens
+    # Narrow sheets fit whole; a budget smaller than one line still lists one column
+    narrow = SchemaPromptBuilder(budget=1).build("сумма", ColumnIndex(['a', 'b']), pd.DataFrame({'a': [1], 'b': [2]}))
+    assert narrow.columns == ['a'] and narrow.omitted == 1
+    assert builder.stats()['requests'] == 1 and builder.stats()['tokens_saved'] == context.saved
+
+def test_token_estimate_counts_cyrillic_higher():
+    assert estimate_tokens("abcdefgh") == 2
+    assert estimate_tokens("абвгдежз") == 4
+    assert estimate_tokens("") == 0
@@ -0,0 +1,99 @@
+import asyncio
+import time
+from telegram.error import BadRequest, RetryAfter, TimedOut
+from app.sender import MessageSender
+from app.utils import _utf16_len, split_message
+
+def test_split_message_respects_lines_and_graphemes():
+    text = "\n".join(f"строка {i} 👍🏽" for i in range(5000))
+    parts = split_message(text)
+    assert ''.join(parts) == text
+    assert all(_utf16_len(p) <= 4096 and p.endswith('\n') for p in parts[:-1])
+    # Flags (pairs of regional indicators) and letters with combining accents stay whole
+    text = "🇷🇺" * 300 + "e\u0301" * 300
+    parts = split_message(text, limit=101)
+    assert ''.join(parts) == text
+    assert all(_utf16_len(p) <= 101 and p[0] != '\u0301' and p[0] != '\U0001F1FA' for p in parts)
+    assert split_message("") == [] and split_message("x" * 10, 4) == ['xxxx', 'xxxx', 'xx']
+
+def test_split_message_is_linear():
+    small = "line of text\n" * 20_000
+    started = time.perf_counter()
+    split_message(small)
+    small_time = time.perf_counter() - started
+    started = time.perf_counter()
+    split_message(small * 20)
+    assert time.perf_counter() - started < small_time * 60
+
+def test_chunks_arrive_in_order_with_pacing():
+    sent = []
+
+    async def send(text, **kwargs):
+        sent.append((text, kwargs.get('reply_markup')))
+        return text
+
+    async def scenario():
+        sender = MessageSender(rate=100, chat_rate=20, burst=2)
+        started = time.monotonic()
+        await asyncio.gather(sender.send_chunks(1, ['a', 'b', 'c', 'd', 'e'], send, reply_markup='menu'),
+                             sender.send_text(2, "x", send))
+        return sender, time.monotonic() - started
+    sender, elapsed = asyncio.run(scenario())
+    assert [s for s in sent if s[0] != 'x'] == [('a', None), ('b', None), ('c', None), ('d', None), ('e', 'menu')]
+    # 2 burst sends, then 3 more at 20/s
+    assert elapsed >= 0.14
+    assert sender.chat_stats(1)['sent'] == 5 and sender.stats()['sent'] == 6
+
+def test_flood_control_and_network_errors_are_retried():
+    calls = []
+
+    async def flaky():
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise RetryAfter(0.2)
+        if len(calls) == 2:
+            raise TimedOut()
+        return 'ok'
+
+    async def bad():
+        raise BadRequest("message is too long")
+
+    async def scenario():
+        sender = MessageSender(burst=10, backoff=0.01)
+        result = await sender.submit(1, flaky)
+        try:
+            await sender.submit(1, bad)
+        except BadRequest:
+            pass
+        return sender, result
+    sender, result = asyncio.run(scenario())
+    assert result == 'ok' and calls[1] - calls[0] >= 0.2
+    assert sender.stats()['flood_waits'] == 1 and sender.stats()['retries'] == 1 and sender.stats()['errors'] == 1
+
+def test_progress_message_edits_latest_text_then_deletes():
+    calls = []
+
+    class Status:
+        async def edit_text(self, text):
+            calls.append(('edit', text))
+
+        async def delete(self):
+            calls.append(('delete',))
+
+    async def send(text):
+        calls.append(('send', text))
+        return Status()
+
+    async def scenario():
+        from app.sender import ProgressMessage
+        progress = ProgressMessage(MessageSender(rate=100, chat_rate=100), 1, send, interval=0.1)
+        progress.start("writing")
+        for n in range(5):
+            progress.update(f"writing {n} lines")
+        # One tick at 0.1 s; finish() comes before the next
+        await asyncio.sleep(0.15)
+        progress.update("running")
+        await progress.finish()
+    asyncio.run(scenario())
+    # Updates faster than the interval collapse into one edit; the last one is never shown
+    assert calls == [('send', 'writing'), ('edit', 'writing 4 lines'), ('delete',)]
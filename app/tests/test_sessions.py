@@ -0,0 +1,34 @@
+import time
+import pytest
+from app.sessions import SessionStore, UploadTooLarge
+
+def test_lru_eviction_over_global_budget_notifies():
+    evicted = []
+    store = SessionStore(max_bytes=10, per_user_bytes=10, idle_ttl=60,
+                         on_evict=lambda user_id, session: evicted.append(user_id))
+    store[1] = {'key': 'a', 'bytes': b'x' * 6}
+    store[2] = {'key': 'b', 'bytes': b'x' * 3}
+    store.get(1)
+    store[3] = {'key': 'c', 'bytes': b'x' * 4}
+    assert evicted == [2]
+    assert 1 in store and 3 in store
+    assert store.stats()['memory_bytes'] == 10
+    assert store.stats()['evictions'] == 1
+
+def test_spill_tier_keeps_bytes_readable(tmp_path):
+    store = SessionStore(max_bytes=5, per_user_bytes=100, idle_ttl=60, spill_dir=str(tmp_path))
+    store[1] = {'key': 'a', 'bytes': b'first'}
+    store[2] = {'key': 'b', 'bytes': b'second'}
+    assert store.load_bytes(1) == b'first'
+    assert store.load_bytes(2) == b'second'
+    assert store.stats()['memory_bytes'] <= 5
+    assert store.stats()['spills'] >= 1
+
+def test_per_user_cap_and_idle_expiry():
+    store = SessionStore(max_bytes=100, per_user_bytes=4, idle_ttl=0.01)
+    with pytest.raises(UploadTooLarge):
+        store[1] = {'key': 'a', 'bytes': b'too big'}
+    store[2] = {'key': 'b', 'bytes': None}
+    time.sleep(0.02)
+    assert store.get(2) is None
+    assert store.stats()['expirations'] == 1
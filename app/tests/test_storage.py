@@ -0,0 +1,81 @@
+from datetime import datetime
+import pandas as pd
+import pytest
+from app.storage import UploadStore
+
+pytest.importorskip("pyarrow")
+
+def make_df():
+    return pd.DataFrame({'city': ['Moscow', 'SPb', None], 2024: [1.5, 2.0, 3.0], 'mixed': [1, 'a', None]})
+
+def test_roundtrip_with_projection_and_restart(tmp_path):
+    store = UploadStore(str(tmp_path), retention=3600, quota_bytes=10 * 1024 * 1024)
+    key = ('file-id', 'abc123')
+    assert store.save(key, make_df(), user_id=7)
+    assert store.columns(key) == ['city', 2024, 'mixed']
+    only_city = store.load(key, columns=['city'])
+    assert list(only_city.columns) == ['city']
+    assert only_city['city'].tolist()[:2] == ['Moscow', 'SPb']
+
+    reopened = UploadStore(str(tmp_path), retention=3600, quota_bytes=10 * 1024 * 1024)
+    assert reopened.latest(7) == key
+    df = reopened.load(key)
+    assert df[2024].tolist() == [1.5, 2.0, 3.0]
+    assert df['mixed'].tolist()[:2] == [1, 'a']
+
+def test_mixed_types_and_repeated_names_survive(tmp_path):
+    store = UploadStore(str(tmp_path), retention=3600, quota_bytes=10 * 1024 * 1024)
+    df = pd.DataFrame([[1, 'x', 2, 3.5], ['1', 'y', None, 4.5]], columns=['id', 'a', 'a', 1])
+    df[1] = df[1].astype(object)
+    df.loc[1, 1] = '1'
+    df.insert(4, '1', ['p', 'q'])
+    key = ('file-id', 'dup')
+    assert store.save(key, df, user_id=7)
+    restored = store.load(key)
+    assert restored.columns.tolist() == ['id', 'a', 'a', 1, '1']
+    assert restored['id'].tolist() == [1, '1'] and restored[1].tolist() == [3.5, '1']
+    assert restored['id'].nunique() == 2
+    only_a = store.load(key, columns=['a'])
+    assert only_a.columns.tolist() == ['a', 'a'] and only_a.iloc[:, 0].tolist() == ['x', 'y']
+    assert store.load(key, columns=['1'])['1'].tolist() == ['p', 'q']
+
+def test_new_upload_replaces_users_previous_file(tmp_path):
+    store = UploadStore(str(tmp_path), retention=3600, quota_bytes=10 * 1024 * 1024)
+    store.save(('f1', 'd1'), make_df(), user_id=7)
+    store.save(('f2', 'd2'), make_df(), user_id=7)
+    assert ('f1', 'd1') not in store
+    assert store.latest(7) == ('f2', 'd2')
+    assert store.stats()['files'] == 1
+    store.discard_user(7)
+    assert store.latest(7) is None and store.stats()['files'] == 0
+    assert UploadStore(str(tmp_path), retention=3600, quota_bytes=10 * 1024 * 1024).latest(7) is None
+
+def test_quota_drops_least_recently_used(tmp_path):
+    store = UploadStore(str(tmp_path), retention=3600, quota_bytes=10 * 1024 * 1024)
+    store.save(('f1', 'd1'), make_df(), user_id=1)
+    store.quota_bytes = store.stats()['bytes'] + 1
+    store.save(('f2', 'd2'), make_df(), user_id=2)
+    assert ('f1', 'd1') not in store
+    assert ('f2', 'd2') in store
+
+def test_date_and_tuple_labels_survive_the_manifest(tmp_path):
+    store = UploadStore(str(tmp_path), retention=3600, quota_bytes=10 * 1024 * 1024)
+    labels = [datetime(2024, 1, 1), pd.Timestamp('2024-02-01'), ('a', 1), 'name']
+    df = pd.DataFrame([[1, 2, 3, 'x'], [4, 5, 6, 'y']], columns=labels)
+    assert store.save(('f', 'k'), df, user_id=1)
+    assert store.save(('g', 'k2'), make_df(), user_id=2)
+    reopened = UploadStore(str(tmp_path), retention=3600, quota_bytes=10 * 1024 * 1024)
+    assert reopened.latest(1) == ('f', 'k') and reopened.latest(2) == ('g', 'k2')
+    assert reopened.columns(('f', 'k')) == labels
+    restored = reopened.load(('f', 'k'))
+    assert restored.columns.tolist() == labels and restored[('a', 1)].tolist() == [3, 6]
+    assert reopened.load(('f', 'k'), columns=[datetime(2024, 1, 1)]).iloc[:, 0].tolist() == [1, 4]
+
+def test_failed_manifest_write_is_rolled_back(tmp_path, monkeypatch):
+    store = UploadStore(str(tmp_path), retention=3600, quota_bytes=10 * 1024 * 1024)
+    monkeypatch.setattr(store, '_save_manifest', lambda: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        store.save(('f', 'k'), make_df(), user_id=1)
+    monkeypatch.undo()
+    assert ('f', 'k') not in store and store.stats()['files'] == 0
+    assert store.save(('g', 'k2'), make_df(), user_id=2)
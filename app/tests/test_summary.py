@@ -0,0 +1,34 @@
+import pandas as pd
+from app.analytics import unique_values_text, value_counts_text
+from app.columns import ColumnIndex
+from app.fastpath import answer_from_summary, parse_question
+from app.profile import profile_dataframe
+from app.summary import build_summary
+
+DF = pd.DataFrame({
+    'client_age_parsed': [25, 40, None, 61],
+    'income': ['до 100', '200', '150', 'не указано'],
+    'city': ['Moscow', 'SPb', 'Moscow', None],
+})
+
+def test_summary_matches_direct_aggregates():
+    summary = build_summary(DF, profile_dataframe(DF))
+    city = summary.get('city')
+    assert city.value_counts_text() == value_counts_text(DF['city'])
+    assert city.unique_values_text() == unique_values_text(DF['city'])
+    assert city.nulls == 1
+    assert summary.get('client_age_parsed').stats['median'] == 40.0
+    assert summary.get('income').stats['max'] == 200.0
+
+def test_simple_questions_answered_from_summary():
+    summary = build_summary(DF, profile_dataframe(DF))
+    index = ColumnIndex(DF.columns)
+    def ask(question, lang='en'):
+        intent = parse_question(question, index)
+        return answer_from_summary(intent, summary, lang) if intent else None
+    assert ask("What is the max client_age_parsed?") == "Max of client_age_parsed: 61"
+    assert ask("How many nulls in city?") == "Empty values in city: 1"
+    assert ask("Сколько строк в файле?", 'ru') == "Строк в файле: 4"
+    assert ask("Сколько уникальных city?", 'ru') == "Уникальных значений в city: 2"
+    assert ask("Какая средняя income у мужчин?") is None
+    assert ask("What is the mean of city?") is None
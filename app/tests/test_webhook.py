@@ -0,0 +1,72 @@
+import asyncio
+import json
+import os
+import queue
+from app.webhook import WebhookFront, route_key
+
+def _update(user_id, text='hi'):
+    return {"update_id": 1, "message": {"message_id": 1, "date": 0, "text": text,
+                                        "chat": {"id": user_id, "type": "private"},
+                                        "from": {"id": user_id, "is_bot": False, "first_name": "u"}}}
+
+def test_route_key():
+    assert route_key(_update(42)) == 42
+    assert route_key({"update_id": 1, "callback_query": {"id": "1", "from": {"id": 7}, "data": "x"}}) == 7
+    assert route_key({"update_id": 1, "channel_post": {"chat": {"id": -100}}}) == -100
+    assert route_key({"update_id": 1}) == 0
+
+def test_front_routes_users_to_fixed_workers_over_keep_alive():
+    front = WebhookFront(factory=None, workers=3, path='/telegram', secret='s3cret')
+    front._queues = [queue.Queue() for _ in range(3)]
+
+    async def request(reader, writer, method, path, body=b'', secret='s3cret'):
+        writer.write(f"{method} {path} HTTP/1.1\r\nHost: x\r\nContent-Length: {len(body)}\r\n"
+                     f"X-Telegram-Bot-Api-Secret-Token: {secret}\r\n\r\n".encode() + body)
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        headers = {}
+        while (line := await reader.readline()) != b'\r\n':
+            name, _, value = line.decode().partition(':')
+            headers[name.lower()] = value.strip()
+        return status, await reader.readexactly(int(headers['content-length']))
+
+    async def scenario():
+        server = await asyncio.start_server(front.handle_connection, '127.0.0.1', 0)
+        reader, writer = await asyncio.open_connection('127.0.0.1', server.sockets[0].getsockname()[1])
+        results = []
+        for user_id in (10, 11, 10, 12, 10):
+            results.append(await request(reader, writer, 'POST', '/telegram', json.dumps(_update(user_id)).encode()))
+        results.append(await request(reader, writer, 'POST', '/telegram', b'{}', secret='wrong'))
+        results.append(await request(reader, writer, 'POST', '/telegram', b'not json'))
+        results.append(await request(reader, writer, 'POST', '/other', b'{}'))
+        results.append(await request(reader, writer, 'GET', '/healthz'))
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return results
+
+    results = asyncio.run(scenario())
+    assert [status for status, _ in results] == [200] * 5 + [403, 400, 404, 200]
+    assert json.loads(results[-1][1])['routed'] == [1, 3, 1]
+    # All of user 10's updates, in order, on worker 10 % 3
+    bodies = [json.loads(front._queues[1].get_nowait()) for _ in range(3)]
+    assert [b['message']['from']['id'] for b in bodies] == [10, 10, 10]
+    assert front.rejected == 1
+
+def test_workers_start_with_their_own_environment(monkeypatch):
+    started = []
+
+    class FakeProcess:
+        def __init__(self, target, args, name):
+            self.pid = len(started)
+
+        def start(self):
+            started.append(os.environ.get('UPLOAD_STORE_DIR'))
+
+    monkeypatch.setenv('UPLOAD_STORE_DIR', 'uploads')
+    front = WebhookFront(None, 2, worker_env=lambda index: {'UPLOAD_STORE_DIR': f"uploads/worker-{index}"})
+    monkeypatch.setattr(front._context, 'Process', FakeProcess)
+    monkeypatch.setattr(front._context, 'Queue', queue.Queue)
+    front.start_workers()
+    assert started == ['uploads/worker-0', 'uploads/worker-1']
+    assert os.environ['UPLOAD_STORE_DIR'] == 'uploads'
@@ -0,0 +1,38 @@
+import asyncio
+import time
+import pandas as pd
+import pytest
+from app.analytics import value_counts_text
+from app.sandbox import execute
+from app.workers import JobTimeout, WorkerPool
+
+def test_run_in_worker_process():
+    pool = WorkerPool(1, timeout=30)
+    try:
+        series = pd.Series(['a', 'b', 'a', None])
+        result = asyncio.run(pool.run(value_counts_text, series))
+        assert result.splitlines()[0] == "a: 2"
+        assert pool.stats()['completed'] == 1
+    finally:
+        pool.shutdown()
+
+def test_timeout_retires_pool_and_recovers():
+    pool = WorkerPool(1, timeout=30)
+    try:
+        async def scenario():
+            await pool.run(abs, -1)
+            with pytest.raises(JobTimeout):
+                await pool.run(time.sleep, 10, timeout=0.5)
+            return await pool.run(abs, -2)
+        started = time.monotonic()
+        assert asyncio.run(scenario()) == 2
+        assert time.monotonic() - started < 10
+        assert pool.stats()['timeouts'] == 1
+    finally:
+        pool.shutdown()
+
+def test_thread_mode_runs_expert_code():
+    pool = WorkerPool(0, timeout=5)
+    df = pd.DataFrame({'x': [1, 2, 3]})
+    result = asyncio.run(pool.run(execute, df, "result = str(df['x'].sum())"))
+    assert result == "6"
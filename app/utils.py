@@ -3,8 +3,12 @@ import pandas as pd
 import re
 import io
 import os
+import threading
+import unicodedata
+import zlib
 from fpdf import FPDF
-from typing import Any, Callable
+from fpdf.ttfonts import TTFontFile
+from typing import Any, Callable, Optional
 import functools
 
 FONTS = [
@@ -24,78 +28,403 @@ def get_unicode_font_path() -> str:
             return path
     return None
 
+_DO_PATTERN = r'^до\s*\d+'
+_RANGE_PATTERN = r'^(\d+)\s*-\s*(\d+)'
+_PLAIN_PATTERN = r'\d+(?:\.\d+)?'
+
 def safe_numeric(series: pd.Series) -> pd.Series:
     """
     Convert a pandas Series to float, robust to Russian/English number words, ranges, and junk.
+    Vectorized: each distinct value is parsed once with pandas .str ops, then mapped back.
     """
-    def to_num(x):
-        if pd.isnull(x):
-            return np.nan
-        s = str(x).strip().replace(',', '.')
-        if re.match(r'^до\s*(\d+)', s, re.IGNORECASE):
-            return float(re.findall(r'\d+', s)[0])
-        if re.match(r'^\d+\s*-\s*\d+', s):
-            a, b = re.findall(r'\d+', s)
-            return (float(a) + float(b)) / 2
-        if re.match(r'^\d+(\.\d+)?$', s):
-            return float(s)
-        if s.lower() in ['не указано', 'зависит от продажи', 'нет информации', '-', '', 'nan']:
-            return np.nan
-        nums = re.findall(r'\d+', s)
-        return float(nums[0]) if nums else np.nan
-    return series.apply(to_num)
-
-def make_pdf(text: str, filename: str = "result.pdf") -> io.BytesIO:
-    """
-    Create a PDF from any Unicode text, with font fallback.
-    Returns: BytesIO file-like object ready for Telegram API.
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series.astype(float)
+    try:
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    except TypeError:
+        # Unhashable cells (lists, dicts): fall back to one value at a time
+        codes, uniques = pd.factorize(series.astype(str).where(series.notna()), use_na_sentinel=True)
+    values = _to_num_unique(pd.Series(uniques, dtype=object))
+    out = np.full(len(series), np.nan)
+    known = codes >= 0
+    out[known] = values[codes[known]]
+    # True == 1 and False == 0, so factorize gives a bool and the equal number one code;
+    # split them again: a number converts to itself, a bool ('True') to NaN
+    shared = [i for i, u in enumerate(uniques) if isinstance(u, (bool, np.bool_, int, float, np.number)) and u in (0, 1)]
+    if shared:
+        rows = np.flatnonzero(np.isin(codes, shared))
+        cells = series.to_numpy(dtype=object)[rows]
+        is_bool = np.fromiter((isinstance(v, (bool, np.bool_)) for v in cells), dtype=bool, count=len(cells))
+        out[rows] = np.where(is_bool, np.nan, cells.astype(float))
+    return pd.Series(out, index=series.index, name=series.name)
+
+def _to_num_unique(values: pd.Series) -> np.ndarray:
+    """
+    Parse distinct non-null values: 'до N' -> N, 'a - b' -> (a+b)/2, '1,5' -> 1.5,
+    placeholders like 'не указано' -> NaN, otherwise the first integer found.
+    """
+    s = values.astype(str).str.strip().str.replace(',', '.', regex=False)
+    # First run of digits covers 'до N' and the generic fallback; no digits -> NaN
+    out = s.str.extract(r'(\d+)', expand=False).astype(float)
+    is_do = s.str.match(_DO_PATTERN, case=False)
+    plain = ~is_do & s.str.fullmatch(_PLAIN_PATTERN)
+    out[plain] = s[plain].astype(float)
+    ranges = s[~is_do & ~plain].str.extract(_RANGE_PATTERN).dropna().astype(float)
+    out[ranges.index] = (ranges[0] + ranges[1]) / 2
+    return out.to_numpy(dtype=float)
+
+class PDFTooLarge(Exception):
+    """
+    Raised by make_pdf as soon as the document is projected to exceed max_size.
+    """
+
+# Fixed part of the size estimate: catalog, xref and the embedded font subset
+_PDF_BASE_SIZE = 24 * 1024
+# Per-page objects around the compressed content stream
+_PDF_PAGE_OVERHEAD = 200
+PDF_FONT_SIZE = 12
+PDF_LINE_HEIGHT = 10
+PDF_TABLE_FONT_SIZE = 8
+PDF_TABLE_ROW_HEIGHT = 5
+PDF_MAX_CELL_WIDTH = 60  # mm
+# Rows measured to size table columns
+_PDF_WIDTH_SAMPLE = 200
+
+_font_cache = {}
+_font_lock = threading.Lock()
+
+def _font_metrics(path: str) -> dict:
+    """
+    TrueType metrics for the PDF font, parsed once per process.
+    FPDF.add_font re-reads (or re-unpickles) the font file on every document.
+    """
+    with _font_lock:
+        font = _font_cache.get(path)
+        if font is None:
+            ttf = TTFontFile()
+            ttf.getMetrics(path)
+            font = _font_cache[path] = {
+                'name': re.sub('[ ()]', '', ttf.fullName),
+                'desc': {
+                    'Ascent': int(round(ttf.ascent, 0)),
+                    'Descent': int(round(ttf.descent, 0)),
+                    'CapHeight': int(round(ttf.capHeight, 0)),
+                    'Flags': ttf.flags,
+                    'FontBBox': "[%s %s %s %s]" % tuple(int(round(b, 0)) for b in ttf.bbox),
+                    'ItalicAngle': int(ttf.italicAngle),
+                    'StemV': int(round(ttf.stemV, 0)),
+                    'MissingWidth': int(round(ttf.defaultWidth, 0)),
+                },
+                'up': round(ttf.underlinePosition),
+                'ut': round(ttf.underlineThickness),
+                'cw': ttf.charWidths,
+                'originalsize': os.stat(path).st_size,
+            }
+    return font
+
+class _Subset(list):
+    """
+    The font's used-glyph list, deduplicated and with O(1) membership. fpdf appends
+    every rendered character to it and later checks `cid in subset` for every code
+    point of the font, which with a plain list grows with the document and is quadratic.
     """
-    pdf = FPDF()
+    def __init__(self, items=()):
+        super().__init__(items)
+        self._members = set(self)
+
+    def __contains__(self, item):
+        return item in self._members
+
+    def append(self, item):
+        if item not in self._members:
+            super().append(item)
+            self._members.add(item)
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self._members = set(self)
+
+def _cell_text(value) -> str:
+    if value is None or (isinstance(value, float) and value != value):
+        return ''
+    if isinstance(value, float):
+        if value.is_integer():
+            return str(int(value))
+        return f"{value:.4f}".rstrip('0').rstrip('.')
+    return str(value).replace('\n', ' ')
+
+class _StreamingPDF(FPDF):
+    """
+    FPDF that keeps a running estimate of the final file size. Each finished page is
+    compressed the way fpdf will compress it, and the total is extrapolated from the
+    share of the input rendered so far, so an oversized document is abandoned after
+    its first pages instead of after rendering everything.
+    """
+    def __init__(self, max_size: int, total_units: int, orientation: str = 'P'):
+        super().__init__(orientation=orientation)
+        self.max_size = max_size
+        self.total_units = max(total_units, 1)
+        self.done_units = 0
+        self.pages_size = 0
+        self.table_header = None
+        self.unicode = False
+
+    def use_font(self, size: int) -> None:
+        """
+        Unicode font from the per-process cache, or core Arial (latin-1 only) if none is installed.
+        """
+        path = get_unicode_font_path()
+        if path and 'unicodefont' not in self.fonts:
+            font = _font_metrics(path)
+            self.fonts['unicodefont'] = {
+                'i': len(self.fonts) + 1, 'type': 'TTF', 'name': font['name'], 'desc': font['desc'],
+                'up': font['up'], 'ut': font['ut'], 'cw': font['cw'], 'ttffile': path,
+                'fontkey': 'unicodefont', 'subset': _Subset(range(0, 32)), 'unifilename': None,
+            }
+            self.font_files['unicodefont'] = {'length1': font['originalsize'], 'type': 'TTF', 'ttffile': path}
+            self.font_files[path] = {'type': 'TTF'}
+        self.unicode = bool(path)
+        self.set_font('UnicodeFont' if path else 'Arial', size=size)
+
+    def text_of(self, value) -> str:
+        text = value if isinstance(value, str) else _cell_text(value)
+        return text if self.unicode else text.encode('latin-1', 'replace').decode('latin-1')
+
+    def estimated_size(self) -> float:
+        return _PDF_BASE_SIZE + self.pages_size * self.total_units / max(self.done_units, 1)
+
+    def header(self):
+        if self.table_header is not None:
+            self.table_header()
+
+    def add_page(self, *args, **kwargs):
+        if self.page > 0:
+            content = self.pages[self.page]
+            if isinstance(content, str):
+                content = content.encode('latin-1')
+            self.pages_size += len(zlib.compress(content)) + _PDF_PAGE_OVERHEAD
+            if self.estimated_size() > self.max_size:
+                raise PDFTooLarge(f"PDF would be about {self.estimated_size() / 2 ** 20:.1f} MB")
+        super().add_page(*args, **kwargs)
+
+    def fit(self, text: str, width: float) -> str:
+        """
+        Text cut (with an ellipsis) to fit a cell of the given inner width.
+        """
+        full = self.get_string_width(text)
+        if full <= width:
+            return text
+        ellipsis = '…' if self.unicode else '...'
+        text = text[:max(1, int(len(text) * width / full))]
+        while text and self.get_string_width(text + ellipsis) > width:
+            text = text[:-1]
+        return text + ellipsis
+
+    def to_bytes(self) -> bytes:
+        data = self.output(dest='S')
+        return data.encode('latin-1') if isinstance(data, str) else bytes(data)
+
+def _render_text(text: str, max_size: int) -> _StreamingPDF:
+    pdf = _StreamingPDF(max_size, len(text))
     pdf.add_page()
-    font_path = get_unicode_font_path()
-    if font_path:
-        pdf.add_font('UnicodeFont', '', font_path, uni=True)
-        pdf.set_font('UnicodeFont', size=12)
+    pdf.use_font(PDF_FONT_SIZE)
+    for line in io.StringIO(text):
+        pdf.multi_cell(0, PDF_LINE_HEIGHT, pdf.text_of(line.rstrip('\n')))
+        pdf.done_units += len(line)
+    return pdf
+
+def _table_widths(pdf: _StreamingPDF, headers: list, sample: list) -> list:
+    widths = []
+    for i, header in enumerate(headers):
+        longest = max([pdf.get_string_width(pdf.text_of(header))] +
+                      [pdf.get_string_width(pdf.text_of(row[i])) for row in sample])
+        widths.append(min(max(longest + 2 * pdf.c_margin, 10), PDF_MAX_CELL_WIDTH))
+    return widths
+
+def _column_groups(widths: list, available: float, keep_first: bool) -> list:
+    """
+    Column positions split into groups that fit the page width; the index column
+    (if shown) repeats in every group.
+    """
+    groups, current, used = [], [], 0.0
+    first = [0] if keep_first else []
+    base = widths[0] if keep_first else 0.0
+    for i in range(1 if keep_first else 0, len(widths)):
+        if current and base + used + widths[i] > available:
+            groups.append(first + current)
+            current, used = [], 0.0
+        current.append(i)
+        used += widths[i]
+    if current or not groups:
+        groups.append(first + current)
+    return groups
+
+def _render_table(data, max_size: int) -> _StreamingPDF:
+    frame = data.to_frame() if isinstance(data, pd.Series) else data
+    show_index = not isinstance(frame.index, pd.RangeIndex)
+    headers = ([str(frame.index.name or '')] if show_index else []) + [str(c) for c in frame.columns]
+    sample = list(frame.head(_PDF_WIDTH_SAMPLE).itertuples(index=show_index, name=None))
+
+    pdf = _StreamingPDF(max_size, len(frame))
+    pdf.use_font(PDF_TABLE_FONT_SIZE)
+    widths = _table_widths(pdf, headers, sample)
+    if sum(widths) > pdf.w - pdf.l_margin - pdf.r_margin:
+        pdf = _StreamingPDF(max_size, len(frame), orientation='L')
+        pdf.use_font(PDF_TABLE_FONT_SIZE)
+    groups = _column_groups(widths, pdf.w - pdf.l_margin - pdf.r_margin, show_index)
+    pdf.total_units = max(len(frame) * len(groups), 1)
+
+    for group in groups:
+        def draw_header(group=group):
+            pdf.set_fill_color(230, 230, 230)
+            for i in group:
+                pdf.cell(widths[i], PDF_TABLE_ROW_HEIGHT,
+                         pdf.fit(pdf.text_of(headers[i]), widths[i] - 2 * pdf.c_margin), border=1, fill=1)
+            pdf.ln(PDF_TABLE_ROW_HEIGHT)
+        pdf.table_header = draw_header
+        pdf.add_page()
+        for row in frame.itertuples(index=show_index, name=None):
+            for i in group:
+                pdf.cell(widths[i], PDF_TABLE_ROW_HEIGHT,
+                         pdf.fit(pdf.text_of(row[i]), widths[i] - 2 * pdf.c_margin), border=1)
+            pdf.ln(PDF_TABLE_ROW_HEIGHT)
+            pdf.done_units += 1
+    pdf.table_header = None
+    return pdf
+
+def make_pdf(content, filename: str = "result.pdf", max_size: Optional[int] = None) -> io.BytesIO:
+    """
+    Create a PDF from any Unicode text, or a DataFrame/Series laid out as a table
+    (header repeated on every page, wide tables split into column groups).
+    Raises PDFTooLarge as soon as the output is projected to exceed max_size
+    (PDF_MAX_SIZE by default).
+    Returns: BytesIO file-like object ready for Telegram API.
+    """
+    max_size = PDF_MAX_SIZE if max_size is None else max_size
+    if isinstance(content, (pd.DataFrame, pd.Series)):
+        pdf = _render_table(content, max_size)
     else:
-        pdf.set_font("Arial", size=12)
-    lines = text.split("\n")
-    for line in lines:
-        pdf.multi_cell(0, 10, line)
-    bio = io.BytesIO()
-    pdf.output(bio)
-    bio.seek(0)
+        pdf = _render_text(str(content), max_size)
+    data = pdf.to_bytes()
+    if len(data) > max_size:
+        raise PDFTooLarge(f"PDF is {len(data) / 2 ** 20:.1f} MB")
+    bio = io.BytesIO(data)
     bio.name = filename
     return bio
 
+def _utf16_len(text: str) -> int:
+    """
+    Length as Telegram counts it: UTF-16 code units (characters outside the BMP count twice).
+    """
+    return len(text.encode('utf-16-le')) // 2
+
+_ZWJ = '\u200d'
+
+def _is_extender(ch: str) -> bool:
+    """
+    Characters that continue the previous grapheme: combining marks, ZWJ,
+    variation selectors and emoji skin-tone modifiers.
+    """
+    code = ord(ch)
+    return (unicodedata.category(ch) in ('Mn', 'Me', 'Mc') or ch == _ZWJ
+            or 0xFE00 <= code <= 0xFE0F or 0x1F3FB <= code <= 0x1F3FF or 0xE0020 <= code <= 0xE007F)
+
+def _is_regional(ch: str) -> bool:
+    return 0x1F1E6 <= ord(ch) <= 0x1F1FF
+
+def _can_break(text: str, i: int) -> bool:
+    """
+    Whether text may be cut before position i without splitting a grapheme
+    (an accented letter, a ZWJ emoji sequence or a flag).
+    """
+    if i <= 0 or i >= len(text):
+        return True
+    if _is_extender(text[i]) or text[i - 1] == _ZWJ:
+        return False
+    if _is_regional(text[i]):
+        # Flags are pairs of regional indicators
+        run = 0
+        while i - run - 1 >= 0 and _is_regional(text[i - run - 1]):
+            run += 1
+        return run % 2 == 0
+    return True
+
+def _split_long_line(line: str, limit: int) -> list:
+    """
+    Cuts one over-long line into pieces of at most limit UTF-16 units,
+    preferring the last space and never splitting a grapheme.
+    """
+    pieces = []
+    start = 0
+    while start < len(line):
+        units = 0
+        cut = start
+        while cut < len(line):
+            width = 2 if ord(line[cut]) > 0xFFFF else 1
+            if units + width > limit:
+                break
+            units += width
+            cut += 1
+        if cut < len(line):
+            space = line.rfind(' ', start, cut)
+            if space >= start + limit // 2:
+                cut = space + 1
+            while cut > start + 1 and not _can_break(line, cut):
+                cut -= 1
+        pieces.append(line[start:cut])
+        start = cut
+    return pieces
+
 def split_message(text: str, limit: int = TELEGRAM_LIMIT) -> list:
     """
-    Splits text into chunks safe for Telegram messaging.
+    Splits text into chunks safe for Telegram messaging: at line breaks where
+    possible, measured in UTF-16 units and without breaking graphemes. Linear time.
     """
-    lines = str(text).splitlines(keepends=True)
     result = []
-    current = ""
-    for line in lines:
-        if len(current) + len(line) > limit:
-            result.append(current)
-            current = line
+    current = []
+    size = 0
+    for line in str(text).splitlines(keepends=True):
+        width = _utf16_len(line)
+        if width > limit:
+            pieces = _split_long_line(line, limit)
         else:
-            current += line
+            pieces = [line]
+        for piece in pieces:
+            width = _utf16_len(piece) if len(pieces) > 1 else width
+            if current and size + width > limit:
+                result.append(''.join(current))
+                current = []
+                size = 0
+            current.append(piece)
+            size += width
     if current:
-        result.append(current)
+        result.append(''.join(current))
     return result
 
 def sanitize_and_send(bot, chat_id: int, result: Any, lang: str = 'en',
-                      filename: str = 'expert_result.pdf', char_limit: int = 1000, line_limit: int = 30):
+                      filename: str = 'expert_result.pdf', char_limit: int = 1000, line_limit: int = 30,
+                      table_format: str = 'auto'):
     """
-    Sends output to Telegram, using PDF if too long.
+    Sends output to Telegram, as a file if too long: tables as CSV/XLSX (or a PDF
+    table if table_format='pdf'), text as PDF.
     Handles DataFrame, str, Exception, or any object.
     Localizes all errors and fallbacks.
     """
     import traceback
     from app.i18n import get_message
+    from app.output import AttachmentTooLarge, CSV, PDF, XLSX, choose_format, table_to_csv, table_to_xlsx
 
-    if isinstance(result, pd.DataFrame):
-        out_str = result.to_string() if not result.empty else get_message('no_such_column_or_value', lang)
+    table = None
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        if result.empty:
+            out_str = get_message('no_such_column_or_value', lang)
+        elif len(result) > line_limit:
+            # Long tables skip to_string() altogether
+            table = result
+        else:
+            out_str = result.to_string()
+            if len(out_str) > char_limit:
+                table = result
     elif isinstance(result, str):
         out_str = result.strip() if result.strip() else get_message('no_such_column_or_value', lang)
     elif isinstance(result, Exception):
@@ -105,17 +434,23 @@ def sanitize_and_send(bot, chat_id: int, result: Any, lang: str = 'en',
         out_str = str(result)
 
     # Enforce both char and line count limits for all outputs
-    if len(out_str) > char_limit or out_str.count('\n') > line_limit:
-        pdf = make_pdf(out_str, filename=filename)
-        pdf.seek(0, os.SEEK_END)
-        pdf_size = pdf.tell()
-        pdf.seek(0)
-        if pdf_size > PDF_MAX_SIZE:
-            msg = get_message('error', lang) + " PDF output too large to send. Please narrow your query."
+    if table is not None or len(out_str) > char_limit or out_str.count('\n') > line_limit:
+        base = os.path.splitext(filename)[0]
+        # No prev/next buttons here, so a table is never sent as pages
+        fmt = choose_format(table, table_mode=table_format, allow_pages=False) if table is not None else PDF
+        try:
+            if fmt == CSV:
+                doc = table_to_csv(table, f"{base}.csv")
+            elif fmt == XLSX:
+                doc = table_to_xlsx(table, f"{base}.xlsx")
+            else:
+                doc = make_pdf(table if table is not None else out_str, filename=f"{base}.pdf")
+        except (PDFTooLarge, AttachmentTooLarge):
+            msg = get_message('error', lang) + " Output too large to send. Please narrow your query."
             for part in split_message(msg):
                 bot.send_message(chat_id, part)
-        else:
-            bot.send_document(chat_id, pdf)
+            return
+        bot.send_document(chat_id, doc)
     else:
         for part in split_message(out_str):
             bot.send_message(chat_id, part)
@@ -0,0 +1,263 @@
+"""
+Webhook serving: an asyncio HTTP front receives Telegram updates and hands each one to
+one of several worker processes, always the same one for a given user. Each worker runs
+its own telegram Application, so a user's parsed files, sessions and user_data stay in
+the process that built them.
+
+python-telegram-bot's own run_webhook needs tornado, which is not a dependency; the front
+speaks just enough HTTP/1.1 (keep-alive, Content-Length bodies) for Telegram's webhook calls.
+"""
+import asyncio
+import hmac
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from typing import Callable, Optional
+
+from telegram import Bot, Update
+
+logger = logging.getLogger("AI_DATA_BOT")
+
+MAX_BODY_BYTES = 1024 * 1024
+IDLE_TIMEOUT = 75
+WATCH_INTERVAL = 5
+SHUTDOWN_TIMEOUT = 30
+_REASONS = {200: 'OK', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found', 413: 'Payload Too Large'}
+
+
+def route_key(update: dict) -> int:
+    """
+    The id updates are routed by: the sender's user id, else the chat id, else 0.
+    """
+    for value in update.values():
+        if isinstance(value, dict):
+            if isinstance(value.get('from'), dict):
+                return int(value['from'].get('id', 0))
+            if isinstance(value.get('chat'), dict):
+                return int(value['chat'].get('id', 0))
+    return 0
+
+
+def _worker_main(index: int, queue, factory: Callable) -> None:
+    # Ctrl+C reaches the whole process group; the front stops workers with a sentinel instead
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_serve_worker(factory(index), queue))
+
+
+async def _serve_worker(application, queue) -> None:
+    """
+    Feed updates from the front into the Application until the None sentinel arrives.
+    """
+    loop = asyncio.get_running_loop()
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+    try:
+        while True:
+            body = await loop.run_in_executor(None, queue.get)
+            if body is None:
+                break
+            try:
+                update = Update.de_json(json.loads(body), application.bot)
+            except Exception:
+                logger.exception("Dropping malformed update")
+                continue
+            await application.update_queue.put(update)
+    finally:
+        await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+class WebhookFront:
+    """
+    HTTP front for Telegram's webhook. factory(index) builds the Application of worker
+    index (it runs in the worker process, so it must be importable). Updates for one
+    user always go to worker route_key(update) % workers; a worker that dies is restarted.
+    worker_env(index) gives environment overrides for a worker, in place before its
+    process imports anything, so settings read at import (paths, ports) can differ per worker.
+    """
+
+    def __init__(self, factory: Callable, workers: int, path: str = '/telegram', secret: Optional[str] = None,
+                 worker_env: Optional[Callable[[int], dict]] = None):
+        self.factory = factory
+        self.worker_env = worker_env
+        self.workers = max(1, workers)
+        self.path = path
+        self.secret = secret or None
+        self._context = multiprocessing.get_context("spawn")
+        self._processes = [None] * self.workers
+        self._queues = [None] * self.workers
+        self.routed = [0] * self.workers
+        self.rejected = 0
+        self.restarts = 0
+        self.started = time.time()
+
+    def _start_worker(self, index: int) -> None:
+        queue = self._context.Queue()
+        process = self._context.Process(target=_worker_main, args=(index, queue, self.factory),
+                                        name=f"bot-worker-{index}")
+        # A spawned process inherits the environment as it is at start()
+        env = self.worker_env(index) if self.worker_env else {}
+        saved = {name: os.environ.get(name) for name in env}
+        os.environ.update(env)
+        try:
+            process.start()
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+        self._queues[index] = queue
+        self._processes[index] = process
+        logger.info(f"Started webhook worker {index} (pid {process.pid})")
+
+    def start_workers(self) -> None:
+        for index in range(self.workers):
+            self._start_worker(index)
+
+    def stop_workers(self, timeout: float = SHUTDOWN_TIMEOUT) -> None:
+        for queue in self._queues:
+            if queue is not None:
+                queue.put(None)
+        deadline = time.monotonic() + timeout
+        for process in self._processes:
+            if process is not None:
+                process.join(max(0.0, deadline - time.monotonic()))
+                if process.is_alive():
+                    process.terminate()
+                    process.join(5)
+
+    def dispatch(self, body: bytes) -> int:
+        """
+        Queue one update for its worker. Returns the HTTP status for Telegram.
+        """
+        try:
+            update = json.loads(body)
+        except ValueError:
+            return 400
+        if not isinstance(update, dict):
+            return 400
+        index = route_key(update) % self.workers
+        self._queues[index].put(body)
+        self.routed[index] += 1
+        return 200
+
+    def _respond(self, method: str, target: str, headers: dict, body: bytes) -> tuple:
+        path = target.split('?', 1)[0]
+        if method == 'GET' and path == '/healthz':
+            return 200, json.dumps(self.stats()).encode()
+        if method != 'POST' or path != self.path:
+            return 404, b''
+        token = headers.get('x-telegram-bot-api-secret-token', '')
+        if self.secret and not hmac.compare_digest(token.encode(), self.secret.encode()):
+            self.rejected += 1
+            return 403, b''
+        return self.dispatch(body), b''
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode('latin1').split()
+                except ValueError:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length') or 0)
+                if length > MAX_BODY_BYTES:
+                    status, payload, keep_alive = 413, b'', False
+                else:
+                    body = await reader.readexactly(length) if length else b''
+                    status, payload = self._respond(method, target, headers, body)
+                    keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                writer.write(
+                    f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + payload
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(WATCH_INTERVAL)
+            for index, process in enumerate(self._processes):
+                if process is not None and not process.is_alive():
+                    logger.error(f"Webhook worker {index} exited with {process.exitcode}, restarting")
+                    self.restarts += 1
+                    self._start_worker(index)
+
+    async def serve(self, host: str, port: int, stop: Optional[asyncio.Event] = None) -> None:
+        """
+        Start the workers and serve until stop is set (or SIGTERM/SIGINT), then shut down.
+        """
+        stop = stop or asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+        self.start_workers()
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        watcher = asyncio.create_task(self._watch())
+        logger.info(f"Webhook front on {host}:{port}{self.path}, {self.workers} workers")
+        try:
+            await stop.wait()
+        finally:
+            watcher.cancel()
+            server.close()
+            await server.wait_closed()
+            await asyncio.to_thread(self.stop_workers)
+
+    def stats(self) -> dict:
+        return {
+            'workers': self.workers,
+            'alive': sum(1 for p in self._processes if p is not None and p.is_alive()),
+            'routed': list(self.routed),
+            'rejected': self.rejected,
+            'restarts': self.restarts,
+            'uptime': round(time.time() - self.started),
+        }
+
+
+async def set_webhook(token: str, url: str, secret: Optional[str], max_connections: int) -> None:
+    """
+    Register the webhook URL with Telegram; updates queued while the bot was down are kept.
+    """
+    async with Bot(token) as bot:
+        await bot.set_webhook(url, secret_token=secret, max_connections=max_connections,
+                              allowed_updates=Update.ALL_TYPES)
+
+
+def run_webhook(factory: Callable, token: str, url: str, listen: str, port: int, path: str,
+                workers: int, secret: Optional[str] = None, max_connections: int = 40,
+                worker_env: Optional[Callable[[int], dict]] = None) -> None:
+    """
+    Serve the bot in webhook mode: register url with Telegram, then run the front.
+    """
+    async def main():
+        await set_webhook(token, url, secret, max_connections)
+        await WebhookFront(factory, workers, path, secret, worker_env).serve(listen, port)
+
+    asyncio.run(main())
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger("AI_DATA_BOT")
+
+
+class JobTimeout(Exception):
+    """
+    Raised when a worker job runs longer than its timeout.
+    """
+
+
+class WorkerPool:
+    """
+    Runs CPU-heavy jobs (parsing, analytics, expert code) in worker processes
+    so the asyncio event loop keeps serving other chats.
+
+    A job that times out or is cancelled while running cannot be interrupted
+    inside its process, so the pool it runs on is retired: new jobs go to a
+    fresh pool and the old processes are killed once their other jobs finish.
+    With max_workers=0 jobs run in a thread instead (useful for tests/dev).
+    """
+    def __init__(self, max_workers: int, timeout: Optional[float] = None):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending: dict = {}
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.failed = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                self._pending[self._executor] = set()
+            return self._executor
+
+    def _submit(self, fn: Callable, args: tuple):
+        executor = self._get_executor()
+        future = executor.submit(fn, *args)
+        pending = self._pending[executor]
+        pending.add(future)
+        future.add_done_callback(pending.discard)
+        return executor, future
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None) -> Any:
+        """
+        Run fn(*args) in a worker and await its result.
+        Raises JobTimeout after timeout seconds (defaults to the pool timeout).
+        """
+        timeout = self.timeout if timeout is None else timeout
+        if self.max_workers <= 0:
+            return await asyncio.wait_for(asyncio.to_thread(fn, *args), timeout)
+
+        executor, future = self._submit(fn, args)
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self._abandon(executor, future)
+            raise JobTimeout(f"Job {getattr(fn, '__name__', fn)} exceeded {timeout}s")
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            self._abandon(executor, future)
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        self.completed += 1
+        return result
+
+    def _abandon(self, executor: ProcessPoolExecutor, future: Future) -> None:
+        """
+        Drop a job we no longer wait for; retire its pool if it is already running.
+        """
+        if future.cancel():
+            return
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        logger.warning("Retiring worker pool after a stuck job")
+        threading.Thread(target=self._retire, args=(executor, future), daemon=True).start()
+
+    def _retire(self, executor: ProcessPoolExecutor, stuck: Future) -> None:
+        others = [f for f in list(self._pending.get(executor, ())) if f is not stuck]
+        wait(others, timeout=self.timeout)
+        for process in list((executor._processes or {}).values()):
+            if process.is_alive():
+                process.kill()
+        executor.shutdown(wait=False, cancel_futures=True)
+        self._pending.pop(executor, None)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executors = list(self._pending)
+            self._executor = None
+        for executor in executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+        self._pending.clear()
+
+    def stats(self) -> dict:
+        return {
+            'workers': self.max_workers,
+            'running': sum(len(p) for p in self._pending.values()),
+            'completed': self.completed,
+            'failed': self.failed,
+            'timeouts': self.timeouts,
+            'cancelled': self.cancelled,
+        }
@@ -0,0 +1,153 @@
+"""
+Benchmark: deterministic fast path vs the LLM round trip for every prompt in prompts.txt.
+
+The LLM path is what text_handler does on a miss: a chat completion, then the returned
+code runs in a sandbox worker. By default the completion goes to the local OpenAI stub
+(app/llm_stub.py) with --delay seconds of simulated model latency; set OPENAI_BASE_URL
+and OPENAI_API_KEY and pass --real to time a real endpoint instead.
+
+Usage: python bench_fastpath.py [--rows N] [--delay S] [--real] [--model M]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.columns import ColumnIndex
+from app.fastpath import answer_from_frame, answer_from_summary, parse_question
+from app.llm import LLMClient
+from app.profile import profile_dataframe
+from app.summary import build_summary
+from app.sandbox import Sandbox
+
+
+def make_frame(rows: int) -> pd.DataFrame:
+    """
+    Synthetic upload with the columns prompts.txt asks about.
+    """
+    rng = np.random.default_rng(0)
+
+    def pick(values, nulls=0.05):
+        out = np.array(values, dtype=object)[rng.integers(0, len(values), rows)]
+        out[rng.random(rows) < nulls] = None
+        return out
+
+    words = ['location', 'price', 'layout', 'view', 'дорого', 'школа', 'парк', 'метро']
+    texts = [' '.join(rng.choice(words, 3)) for _ in range(200)]
+    return pd.DataFrame({
+        'client_age_parsed': rng.integers(18, 80, rows),
+        'income_parsed': pick([f"до {i}" for i in range(50, 500, 50)] + ['не указано', '120 000', '80-100']),
+        'cost_target_budget_parsed': rng.integers(3_000_000, 40_000_000, rows),
+        'cost_initial_payment': rng.integers(0, 10_000_000, rows).astype(float),
+        'cost_mortgage_conditions': pick(['6%', '8%', '12%', 'нет', 'семейная 6%']),
+        'apartment_floor': rng.integers(1, 30, rows),
+        'region': pick(['Central', 'North', 'South', 'East', 'West']),
+        'client_city_norm': pick(['Москва', 'Санкт-Петербург', 'Казань', 'Сочи', 'Тверь', 'Moscow']),
+        'apartment_type': pick(['studio', 'однушка', 'двушка', 'трешка']),
+        'apartment_layout': pick(['Евро-двушка', 'Евро-трешка', 'Студия', 'Классика']),
+        'apartment_view_category': pick(['Премиум', 'Комфорт', 'Стандарт']),
+        'apartment_view_final': pick(['Успешно', 'Неуспешно']),
+        'result_doubts_parsed': pick(['price', 'location', 'unknown', 'timing', None], nulls=0.2),
+        'result_booked_parsed': pick([True, False]),
+        'realty_status': pick(['sold', 'booked', 'free', 'reserved']),
+        'cost_deal_status_parsed': pick(['Закрыта', 'Открыта', 'Отменена']),
+        'cost_own_property_sale_parsed': pick([True, False]),
+        'channel_communication_method': pick(['Телефон', 'Видеозвонок', 'Офис', 'Мессенджер']),
+        'client_purchase_purpose': pick(['Для себя', 'Покупка квартиры для инвестиций', 'Для детей']),
+        'meeting_manager_highlights_parsed': pick(texts),
+        'meeting_objections_parsed': pick(texts),
+        'meeting_next_steps_parsed': pick(['звонок', 'встреча', 'бронь']),
+        'competitive_pros_parsed': pick(texts),
+        'competitive_cons_parsed': pick(texts),
+        'project_brand_knowledge_parsed': pick(['знает', 'не знает', 'слышал']),
+        'project_impression_parsed': pick(['положительное', 'негативное', 'нейтральное']),
+        'gender': pick(['М', 'Ж']),
+        'manager': pick([f"Менеджер {i}" for i in range(25)]),
+    })
+
+
+async def llm_answer(llm, sandbox, typed, question):
+    system_prompt = (
+        "You are a Python code generator for a Telegram data analytics bot. "
+        "ALWAYS create a string variable named 'result' with the answer. "
+        "File columns: " + ', '.join(str(c) for c in typed.columns)
+    )
+    code = await llm.complete(
+        [{"role": "system", "content": system_prompt}, {"role": "user", "content": question}],
+        temperature=0.0, max_tokens=2048,
+    )
+    if code.startswith("```"):
+        code = code.split('```')[1].replace('python', '', 1).strip()
+    try:
+        return await sandbox.run('bench', typed, code)
+    except Exception as e:
+        return f"error: {e}"
+
+
+async def main(args):
+    df = make_frame(args.rows)
+    profile = profile_dataframe(df)
+    typed = profile.typed_frame(df)
+    summary = build_summary(df, profile)
+    index = ColumnIndex(df.columns)
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'prompts.txt'), encoding='utf-8') as f:
+        prompts = [line.strip() for line in f if line.strip()]
+
+    if args.real:
+        llm = LLMClient(os.getenv('OPENAI_API_KEY'), model=args.model, base_url=os.getenv('OPENAI_BASE_URL'))
+    else:
+        from app.llm_stub import start_in_thread
+        start_in_thread(args.port, args.delay)
+        llm = LLMClient('stub', model=args.model, base_url=f"http://127.0.0.1:{args.port}/v1")
+    sandbox = Sandbox(1, wall_limit=60)
+    sandbox.start()
+    await llm_answer(llm, sandbox, typed, "warm-up")
+
+    print(f"{args.rows} rows, {len(prompts)} prompts, "
+          f"LLM: {'real endpoint' if args.real else f'stub with {args.delay}s delay'}")
+    print(f"{'fast, ms':>9} {'source':>8} {'llm, ms':>9}  prompt")
+    fast_times, llm_times = [], []
+    for question in prompts:
+        started = time.perf_counter()
+        intent = parse_question(question, index)
+        answer, source = None, '-'
+        if intent is not None:
+            answer, source = answer_from_summary(intent, summary), 'summary'
+            if answer is None:
+                answer, source = answer_from_frame(intent, df, typed), 'frame'
+        fast_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        await llm_answer(llm, sandbox, typed, question)
+        llm_ms = (time.perf_counter() - started) * 1000
+        llm_times.append(llm_ms)
+        if answer is None:
+            source = '-'
+            print(f"{'':>9} {source:>8} {llm_ms:>9.1f}  {question[:70]}")
+        else:
+            fast_times.append((fast_ms, llm_ms))
+            print(f"{fast_ms:>9.2f} {source:>8} {llm_ms:>9.1f}  {question[:70]}")
+
+    sandbox.shutdown()
+    await llm.aclose()
+    print()
+    print(f"fast path answered {len(fast_times)}/{len(prompts)} prompts")
+    if fast_times:
+        fast_median = statistics.median(t for t, _ in fast_times)
+        llm_median = statistics.median(t for _, t in fast_times)
+        print(f"on those prompts: median fast {fast_median:.2f} ms vs LLM {llm_median:.1f} ms "
+              f"({llm_median / fast_median:.0f}x)")
+    print(f"median LLM round trip over all prompts: {statistics.median(llm_times):.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--delay', type=float, default=0.0, help="simulated model latency of the stub, seconds")
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--model', default='gpt-4o')
+    parser.add_argument('--real', action='store_true', help="use OPENAI_BASE_URL / OPENAI_API_KEY")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,76 @@
+"""
+Benchmark: vectorized app.utils.safe_numeric vs the previous per-cell apply version.
+
+Usage: python bench_safe_numeric.py [rows]
+"""
+import re
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.utils import safe_numeric
+
+
+def safe_numeric_legacy(series: pd.Series) -> pd.Series:
+    """
+    Previous implementation: a Python function with up to four regex matches per cell.
+    """
+    def to_num(x):
+        if pd.isnull(x):
+            return np.nan
+        s = str(x).strip().replace(',', '.')
+        if re.match(r'^до\s*(\d+)', s, re.IGNORECASE):
+            return float(re.findall(r'\d+', s)[0])
+        if re.match(r'^\d+\s*-\s*\d+', s):
+            a, b = re.findall(r'\d+', s)
+            return (float(a) + float(b)) / 2
+        if re.match(r'^\d+(\.\d+)?$', s):
+            return float(s)
+        if s.lower() in ['не указано', 'зависит от продажи', 'нет информации', '-', '', 'nan']:
+            return np.nan
+        nums = re.findall(r'\d+', s)
+        return float(nums[0]) if nums else np.nan
+    return series.apply(to_num)
+
+
+def make_column(rows: int, distinct: int) -> pd.Series:
+    rng = np.random.default_rng(0)
+    pool = []
+    for i in range(distinct):
+        kind = i % 6
+        if kind == 0:
+            pool.append(f"до {i}")
+        elif kind == 1:
+            pool.append(f"{i} - {i + 10}")
+        elif kind == 2:
+            pool.append(f"{i},5")
+        elif kind == 3:
+            pool.append(str(i))
+        elif kind == 4:
+            pool.append("не указано")
+        else:
+            pool.append(f"около {i} руб.")
+    values = np.array(pool + [None], dtype=object)
+    return pd.Series(values[rng.integers(0, len(values), rows)])
+
+
+def timeit(fn, series, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        out = fn(series)
+        best = min(best, time.perf_counter() - started)
+    return best, out
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    print(f"{'distinct':>10} {'legacy, s':>10} {'vectorized, s':>14} {'speedup':>8}  same")
+    for distinct in (50, 5_000, rows // 10):
+        series = make_column(rows, distinct)
+        legacy_t, legacy_out = timeit(safe_numeric_legacy, series, repeat=1)
+        fast_t, fast_out = timeit(safe_numeric, series)
+        same = np.allclose(legacy_out.to_numpy(float), fast_out.to_numpy(float), equal_nan=True)
+        print(f"{distinct:>10} {legacy_t:>10.3f} {fast_t:>14.3f} {legacy_t / fast_t:>7.1f}x  {same}")
@@ -0,0 +1,212 @@
+"""
+Load test: N simulated users drive the bot's handlers concurrently against a local fake
+Telegram Bot API (app/telegram_stub.py) and the OpenAI stub (app/llm_stub.py).
+
+Each user uploads the test file, then replays prompts.txt: click "Expert mode", send the
+prompt, wait for the answer. With --taps N each round starts with N simultaneous taps of
+"Count by city" on the same menu, like an impatient user. Updates are real telegram.Update objects and every reply goes
+over HTTP to the fake API, so the send pipeline and its pacing are part of the measurement.
+Reports p50/p95/p99 latency per user action and per bot stage (the bot_stage_seconds
+metric: download, parse, llm, code, render_*, send, ...) and overall throughput.
+
+Usage: python qa_load.py [--users N] [--prompts K] [--rows R] [--llm-delay S] [--api-delay S]
+                         [--format xlsx|csv] [--taps N] [--max-p95 MS]
+With --max-p95 the exit status is 1 if the p95 answer latency exceeds MS (for CI).
+"""
+import argparse
+import asyncio
+import io
+import itertools
+import os
+import socket
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+
+PROMPTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'prompts.txt')
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, q: float) -> float:
+    """
+    q-th percentile with linear interpolation between closest ranks.
+    """
+    values = sorted(values)
+    if not values:
+        return float('nan')
+    k = (len(values) - 1) * q / 100
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def configure(args, workdir: str) -> None:
+    """
+    Settings for the bot module, applied before it is imported (app.config reads them at import).
+    """
+    os.environ.update({
+        'LLM_STUB': '1',
+        'LLM_STUB_PORT': str(free_port()),
+        'LLM_STUB_DELAY': str(args.llm_delay),
+        'UPLOAD_STORE_DIR': os.path.join(workdir, 'uploads'),
+        'CODE_CACHE_PATH': os.path.join(workdir, 'code_cache.json'),
+        'SANDBOX_DATA_DIR': os.path.join(workdir, 'sandbox'),
+        'METRICS_PORT': '0',
+    })
+    if args.sandbox_workers is not None:
+        os.environ['SANDBOX_WORKERS'] = str(args.sandbox_workers)
+    if args.workers is not None:
+        os.environ['WORKER_COUNT'] = str(args.workers)
+
+
+def make_upload(rows: int, fmt: str) -> tuple:
+    from bench_fastpath import make_frame
+    df = make_frame(rows)
+    out = io.BytesIO()
+    if fmt == 'csv':
+        df.to_csv(out, index=False)
+        return out.getvalue(), 'load.csv', 'text/csv'
+    df.to_excel(out, index=False)
+    return out.getvalue(), 'load.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+class SimulatedUser:
+    """
+    One chat: builds updates the way Telegram would deliver them and awaits each handler.
+    """
+    update_ids = itertools.count(1)
+
+    def __init__(self, bot, tg, user_id: int, upload: tuple, samples: dict):
+        self.bot = bot
+        self.tg = tg
+        self.user_id = user_id
+        self.upload = upload
+        self.samples = samples
+        self.context = SimpleNamespace(bot=tg, user_data={})
+        self.message_ids = itertools.count(1)
+        self.user = {"id": user_id, "is_bot": False, "first_name": f"user{user_id}", "language_code": "en"}
+
+    def _message(self, **fields) -> dict:
+        message = {"message_id": next(self.message_ids), "date": int(time.time()),
+                   "chat": {"id": self.user_id, "type": "private"}, "from": self.user}
+        message.update(fields)
+        return message
+
+    def _update(self, **fields):
+        from telegram import Update
+        return Update.de_json(dict(fields, update_id=next(self.update_ids)), self.tg)
+
+    async def _timed(self, action: str, handler, update) -> None:
+        started = time.perf_counter()
+        try:
+            await handler(update, self.context)
+        except Exception as e:
+            self.samples['failed'][action] += 1
+            print(f"[user {self.user_id}] {action} failed: {e!r}", file=sys.stderr)
+        self.samples['actions'][action].append(time.perf_counter() - started)
+
+    def _click(self, data: str, message: dict):
+        query = {"id": str(next(self.message_ids)), "from": self.user, "chat_instance": str(self.user_id),
+                 "data": data, "message": message}
+        return self._update(callback_query=query)
+
+    async def run(self, prompts, start_delay: float, taps: int = 0) -> None:
+        await asyncio.sleep(start_delay)
+        data, name, mime = self.upload
+        document = {"file_id": f"load-{self.user_id}", "file_unique_id": f"load-{self.user_id}",
+                    "file_name": name, "mime_type": mime, "file_size": len(data)}
+        await self._timed('upload', self.bot.handle_file, self._update(message=self._message(document=document)))
+        for prompt in prompts:
+            if taps:
+                menu = self._message(text="menu")
+                await asyncio.gather(*(self._timed('tap_count_city', self.bot.menu_handler, self._click('count_city', menu))
+                                       for _ in range(taps)))
+            await self._timed('click_expert', self.bot.menu_handler, self._click('expert', self._message(text="menu")))
+            await self._timed('answer', self.bot.text_handler, self._update(message=self._message(text=prompt)))
+
+
+def report(samples: dict, elapsed: float, users: int) -> None:
+    def table(title, groups):
+        print(f"\n{title:<22} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+        for name, values in sorted(groups.items()):
+            ms = [v * 1000 for v in values]
+            print(f"{name:<22} {len(ms):>6} {percentile(ms, 50):>9.1f} {percentile(ms, 95):>9.1f} "
+                  f"{percentile(ms, 99):>9.1f} {max(ms):>9.1f}")
+
+    table("action", samples['actions'])
+    table("stage", samples['stages'])
+    answers = len(samples['actions']['answer'])
+    updates = sum(len(v) for v in samples['actions'].values())
+    print(f"\n{users} users, {elapsed:.1f} s: {answers / elapsed:.2f} answers/s, {updates / elapsed:.2f} updates/s")
+    failed = {k: v for k, v in samples['failed'].items() if v}
+    if failed:
+        print(f"failed actions: {failed}")
+
+
+async def main(args) -> int:
+    import ai_data_bot as bot
+    from app import telegram_stub
+
+    with open(PROMPTS_PATH, encoding='utf-8') as f:
+        prompts = [line.strip() for line in f if line.strip()]
+    if args.prompts:
+        prompts = prompts[:args.prompts]
+    upload = make_upload(args.rows, args.format)
+    server = telegram_stub.start_in_thread(upload[0], delay=args.api_delay)
+    tg = telegram_stub.bot_for(server)
+    await tg.initialize()
+    bot.sandbox.start()
+
+    samples = {'actions': defaultdict(list), 'stages': defaultdict(list), 'failed': defaultdict(int)}
+    bot.STAGE_SECONDS.listeners.append(lambda value, labels: samples['stages'][labels['stage']].append(value))
+    # Users start spread over the ramp-up so uploads do not all land in the same instant
+    users = [SimulatedUser(bot, tg, 10_000 + i, upload, samples) for i in range(args.users)]
+    print(f"{args.users} users x {len(prompts)} prompts, {args.rows} rows ({args.format}, "
+          f"{len(upload[0]) / 1024:.0f} KB), LLM stub delay {args.llm_delay}s, API delay {args.api_delay}s")
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(u.run(prompts, args.ramp * i / args.users, args.taps) for i, u in enumerate(users)))
+    finally:
+        elapsed = time.perf_counter() - started
+        bot.worker_pool.shutdown()
+        bot.sandbox.shutdown()
+        await bot.llm.aclose()
+        await tg.shutdown()
+        server.shutdown()
+    report(samples, elapsed, args.users)
+    errors = [line for line in bot.ERRORS.render() if not line.startswith('#')]
+    if errors:
+        print("bot errors:\n  " + "\n  ".join(errors))
+    print(f"fake API calls: {dict(sorted(server.calls.items()))}, user jobs {bot.user_jobs.stats()}")
+    if args.max_p95 is not None:
+        p95 = percentile([v * 1000 for v in samples['actions']['answer']], 95)
+        if not p95 <= args.max_p95:
+            print(f"FAIL: answer p95 {p95:.1f} ms > {args.max_p95} ms")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent load test against fake Telegram and LLM APIs")
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--prompts', type=int, default=10, help="prompts per user from prompts.txt (0 = all)")
+    parser.add_argument('--rows', type=int, default=5_000)
+    parser.add_argument('--format', choices=('xlsx', 'csv'), default='xlsx')
+    parser.add_argument('--llm-delay', type=float, default=0.5, help="simulated model latency, seconds")
+    parser.add_argument('--api-delay', type=float, default=0.02, help="simulated Bot API latency, seconds")
+    parser.add_argument('--taps', type=int, default=0, help="simultaneous 'Count by city' taps per round")
+    parser.add_argument('--ramp', type=float, default=2.0, help="seconds over which users start")
+    parser.add_argument('--workers', type=int, default=None, help="parse/analytics worker processes")
+    parser.add_argument('--sandbox-workers', type=int, default=None, help="expert code sandbox processes")
+    parser.add_argument('--max-p95', type=float, default=None, help="fail if answer p95 exceeds this, ms")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory(prefix="qa_load-") as workdir:
+        configure(args, workdir)
+        sys.exit(asyncio.run(main(args)))